@@ -0,0 +1,141 @@
+import random
+from collections import Counter
+import numpy as np
+
+
+def bitboard_to_array(mask, size):
+    # Converte uma máscara de bits do Bitboard numa matriz booleana size x size.
+    cells = size * size
+    data = np.frombuffer(mask.to_bytes((cells + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(data, bitorder="little")[:cells].reshape(size, size).astype(bool)
+
+
+def board_to_array(board, cells):
+    # `cells` é board.hits ou board.misses: máscara num Bitboard, set de
+    # índices num SparseBoard.
+    if isinstance(cells, int):
+        return bitboard_to_array(cells, board.size)
+    grid = np.zeros(board.size * board.size, dtype=bool)
+    grid[list(cells)] = True
+    return grid.reshape(board.size, board.size)
+
+
+def along(axis, start, stop, ndim):
+    index = [slice(None)] * ndim
+    index[axis] = slice(start, stop)
+    return tuple(index)
+
+
+def window_sums(grid, length, axis):
+    # Soma de cada janela de `length` casas ao longo de axis (todas as posições
+    # possíveis de um navio naquela direção): `length` fatias deslocadas somadas
+    # de uma vez. Funciona para um tabuleiro (n, n) ou para uma pilha de
+    # tabuleiros (..., n, n).
+    windows = grid.shape[axis] - length + 1
+    total = grid[along(axis, 0, windows, grid.ndim)].copy()
+    for shift in range(1, length):
+        total += grid[along(axis, shift, shift + windows, grid.ndim)]
+    return total
+
+
+def spread(weights, length, axis):
+    # Distribui o peso de cada janela pelas `length` casas que ela cobre.
+    shape = list(weights.shape)
+    shape[axis] = length - 1
+    padding = np.zeros(shape, dtype=weights.dtype)
+    return window_sums(np.concatenate([padding, weights, padding], axis=axis), length, axis)
+
+
+def pending_hits(hits, misses):
+    # Acertos que ainda têm alguma casa vizinha desconhecida.
+    unknown = ~(hits | misses)
+    neighbours = np.zeros_like(unknown)
+    neighbours[..., 1:, :] |= unknown[..., :-1, :]
+    neighbours[..., :-1, :] |= unknown[..., 1:, :]
+    neighbours[..., :, 1:] |= unknown[..., :, :-1]
+    neighbours[..., :, :-1] |= unknown[..., :, 1:]
+    return hits & neighbours
+
+
+def placement_density(hits, misses, ships, afloat=None):
+    # Para cada casa, quantas posições dos navios em `ships` passam por ela.
+    # hits e misses são booleanos com formato (..., n, n); cada tabuleiro da
+    # pilha escolhe seu modo de forma independente. afloat, com formato
+    # (..., len(ships)), diz quais navios de cada tabuleiro ainda contam; sem
+    # ele, todos contam.
+    #
+    # Modo caça: sem acertos pendentes, só contam posições sem acertos nem erros.
+    # Modo alvo: com algum acerto ainda cercado de casas desconhecidas, só
+    # contam posições que passam por acertos, pesadas pelo número de acertos.
+    size = hits.shape[-1]
+    hit_counts = hits.astype(np.int16)
+    miss_counts = misses.astype(np.int16)
+    target = pending_hits(hits, misses).any(axis=(-2, -1))[..., None, None]
+    density = np.zeros(hits.shape, dtype=np.int32)
+
+    lengths = np.asarray(ships)
+    for length, count in Counter(ships).items():
+        if length > size:
+            continue
+        if afloat is not None:
+            count = afloat[..., lengths == length].sum(axis=-1)[..., None, None]
+            if not count.any():
+                continue
+        for axis in (-2, -1):
+            blocked = window_sums(miss_counts, length, axis) > 0
+            covered_hits = window_sums(hit_counts, length, axis)
+            weights = np.where(
+                target,
+                np.where(blocked, 0, covered_hits),
+                ~blocked & (covered_hits == 0),
+            )
+            density += count * spread(weights, length, axis)
+
+    density[hits | misses] = 0
+    return density
+
+
+class ProbabilityAI:
+    # Oponente controlado pelo servidor. Para cada navio ainda em jogo conta,
+    # com janelas deslizantes do NumPy, quantas posições possíveis passam por
+    # cada casa (placement_density) e atira na casa de maior densidade.
+    def __init__(self, board_size, ships, rng=None):
+        self.board_size = board_size
+        self.ships = list(ships)  # Navios ainda à tona
+        self.rng = rng or random.Random()
+        self.sunk = np.zeros((board_size, board_size), dtype=bool)
+
+    def ship_sunk(self, row, col, length, direction):
+        # O navio sai da contagem e suas casas passam a bloquear como erros, sem
+        # puxar o modo alvo para acertos já resolvidos.
+        self.ships.remove(length)
+        if direction == "H":
+            self.sunk[row, col:col + length] = True
+        else:
+            self.sunk[row:row + length, col] = True
+
+    def density(self, hits, misses):
+        return placement_density(hits, misses, self.ships)
+
+    def choose_shot(self, hits, misses):
+        hits = hits & ~self.sunk
+        misses = misses | self.sunk
+        density = self.density(hits, misses)
+        best = density.max()
+        if best > 0:
+            candidates = np.flatnonzero(density == best)
+        else:
+            candidates = np.flatnonzero(~(hits | misses).ravel())
+        cell = int(candidates[self.rng.randrange(len(candidates))])
+        return divmod(cell, self.board_size)
+
+    def choose_salvo(self, hits, misses, count):
+        # Modo salvo: as `count` casas de maior densidade numa única contagem,
+        # com empates sorteados.
+        hits = hits & ~self.sunk
+        misses = misses | self.sunk
+        density = self.density(hits, misses).ravel()
+        free = np.flatnonzero(~(hits | misses).ravel())
+        ties = [self.rng.random() for _ in range(len(free))]
+        order = free[np.lexsort((ties, -density[free]))]
+        return [divmod(int(cell), self.board_size) for cell in order[:count]]
@@ -0,0 +1,664 @@
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import time
+from eventlog import EventLog, recover
+from game import BattleshipGame, fleet_template
+from lobby import HELLO_TIMEOUT, IDLE_TIMEOUT, REAP_INTERVAL, SETUP_TIMEOUT, Lobby
+from metrics import metrics, start_http_server, start_periodic_dump
+from protocol import ENCODINGS, FrameReader, encode_message, is_encoding_switch
+from room import PLAYER_WRITE_LIMIT
+
+# Acima deste volume pendente no buffer de escrita, um espectador deixa de
+# receber atualizações até o buffer esvaziar; então recebe um estado completo.
+SPECTATOR_WRITE_LIMIT = 64 * 1024
+
+
+class PlayerProtocol(asyncio.BufferedProtocol):
+    # Uma conexão de jogador. O event loop lê direto para o buffer do
+    # FrameReader (get_buffer/buffer_updated), sem cópias intermediárias.
+    # As mensagens geradas por uma jogada (shot_result, state_delta...) vão
+    # para self.outbox e saem num único write no fim da iteração do loop.
+    # `resume` é o token de uma conexão que outro worker repassou para
+    # retomar uma vaga deste. As demais só sentam com a primeira mensagem (a
+    # escolha do oponente) ou depois de HELLO_TIMEOUT.
+    def __init__(self, server, resume=None):
+        self.server = server
+        self.resume = resume
+        self.reader = FrameReader()
+        self.transport = None
+        self.room = None
+        self.player_id = None
+        self.stats = None
+        self.hello_timer = None  # Aguardando a escolha do oponente
+        self.outbox = bytearray()
+        self.last_seen = time.monotonic()  # Último dado recebido (ver Lobby.check_heartbeats)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.stats = metrics.open_connection(f"novo/{id(self):x}")
+        if self.resume is not None:
+            if not self.server.resume_player(self, self.resume):
+                error = {"type": "error", "message": "Sessão inválida ou expirada."}
+                transport.write(encode_message(error))
+                transport.close()
+            return
+        self.hello_timer = asyncio.get_running_loop().call_later(HELLO_TIMEOUT, self.take_seat)
+
+    def take_seat(self, opponent="human"):
+        self.hello_timer.cancel()
+        self.hello_timer = None
+        self.room, self.player_id = self.server.seat_player(self, opponent)
+        addr = self.transport.get_extra_info("peername")
+        print(f"Sala {self.room.room_id}: jogador {self.player_id} conectado de {addr}.")
+        self.server.report_waiting(settled=True)
+
+    def seat(self, room, player_id):
+        # Chamado pelo lobby ao escolher a vaga, antes do welcome (e de novo
+        # quando a conexão retoma outra vaga com um reconnect).
+        self.stats.label = f"{room.room_id}/{player_id}"
+        return self
+
+    def get_buffer(self, sizehint):
+        return self.reader.writable()
+
+    def buffer_updated(self, nbytes):
+        self.stats.received(nbytes)
+        self.last_seen = time.monotonic()
+        try:
+            for message in self.reader.commit(nbytes):
+                msg_type = message.get("type")
+                if self.hello_timer is not None:
+                    if msg_type == "opponent":
+                        self.take_seat(message.get("opponent"))
+                        continue
+                    if msg_type == "reconnect":
+                        # Retomada já na primeira mensagem: sem vaga nova.
+                        self.hello_timer.cancel()
+                        self.hello_timer = None
+                        self.server.report_waiting(settled=True)
+                        self.server.reconnect_player(self, message.get("session", ""))
+                        if self.room is None:
+                            return  # Sessão inválida ou conexão repassada a outro worker
+                        continue
+                    self.take_seat()
+                if msg_type == "pong":
+                    continue  # Só atualiza last_seen; não conta como atividade na sala
+                if msg_type == "reconnect":
+                    self.server.reconnect_player(self, message.get("session", ""))
+                    if self.room is None:
+                        return  # Conexão repassada a outro worker
+                    continue
+                self.room.process_message(message, self.player_id)
+        except Exception:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        if self.hello_timer is not None:
+            self.hello_timer.cancel()
+            self.server.report_waiting(settled=True)
+        if self.room is not None:
+            print(f"Sala {self.room.room_id}: jogador {self.player_id} desconectado.")
+            self.server.release_player(self.room, self.player_id, self)
+        if self.stats is not None:
+            metrics.close_connection(self.stats)
+
+    def send(self, data):
+        if self.transport.is_closing():
+            raise ConnectionError("Conexão fechada")
+        pending = len(self.outbox) + self.transport.get_write_buffer_size()
+        if pending + len(data) > PLAYER_WRITE_LIMIT:
+            # O cliente parou de ler: derruba a conexão em vez de acumular.
+            metrics.increment("slow_disconnects_total")
+            self.outbox.clear()
+            self.transport.abort()
+            raise ConnectionError("Cliente lento demais")
+        if not self.outbox:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.outbox += data
+
+    def flush(self):
+        if self.outbox and not self.transport.is_closing():
+            self.transport.write(bytes(self.outbox))
+            self.stats.sent(len(self.outbox))
+        self.outbox.clear()
+
+    def disconnect(self):
+        self.flush()
+        self.transport.close()
+
+    def abort(self):
+        self.outbox.clear()
+        self.transport.abort()
+
+
+class SpectatorProtocol(asyncio.BufferedProtocol):
+    # Conexão da porta de espectadores: não ocupa vaga em sala nenhuma. Depois
+    # do welcome o cliente pode negociar o binário e envia {"type": "spectate"},
+    # com "room" opcional (sem sala, assiste à partida em destaque). Um novo
+    # "spectate" troca de sala.
+    def __init__(self, server):
+        self.server = server
+        self.reader = FrameReader()
+        self.transport = None
+        self.room = None
+        self.binary = False
+        self.stats = None
+        self.paused = False  # Buffer de escrita acima do limite (pause_writing)
+        self.missed_updates = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=SPECTATOR_WRITE_LIMIT)
+        self.stats = metrics.open_connection(f"espectador/{id(self):x}")
+        welcome = {
+            "type": "welcome",
+            "spectator": True,
+            "message": "Bem-vindo! Você está assistindo.",
+            "encodings": ENCODINGS,
+        }
+        self.send(encode_message(welcome))
+        self.server.spectator_count += 1
+        self.server.update_gauges()
+
+    def get_buffer(self, sizehint):
+        return self.reader.writable()
+
+    def buffer_updated(self, nbytes):
+        self.stats.received(nbytes)
+        try:
+            for message in self.reader.commit(nbytes):
+                if is_encoding_switch(message) and not self.binary:
+                    self.send(encode_message(message))
+                    self.binary = True
+                    if self.room is not None:
+                        self.room.spectators[self] = True
+                elif message.get("type") == "spectate":
+                    self.server.spectate(self, message.get("room"))
+        except Exception:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.server.release_spectator(self)
+        metrics.close_connection(self.stats)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        if self.missed_updates and self.room is not None:
+            self.missed_updates = False
+            with self.room.lock:
+                self.room.send_spectator_state(self)
+
+    def send_update(self, data):
+        # Envio para espectadores: um espectador lento perde as atualizações
+        # em vez de acumular bytes no servidor e atrasar os jogadores.
+        if self.transport.is_closing():
+            return
+        if self.paused:
+            self.missed_updates = True
+            return
+        self.send(data)
+
+    def send(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+            self.stats.sent(len(data))
+
+
+class AsyncBattleshipServer:
+    # Servidor com um único event loop: aceita conexões indefinidamente e
+    # agrupa os jogadores em salas de dois, cada uma com seu BattleshipGame.
+    def __init__(
+        self, host="localhost", port=12345, worker_id=None, board_size=10, ships=None,
+        event_log=None, spectator_port=None, setup_timeout=SETUP_TIMEOUT,
+        idle_timeout=IDLE_TIMEOUT, salvo=False,
+    ):
+        self.host = host
+        self.port = port
+        self.spectator_port = spectator_port
+        self.worker_id = worker_id
+        if worker_id is None:
+            room_ids = itertools.count(1)
+        else:
+            # Ids únicos entre os workers: "<worker>.<sala>".
+            room_ids = (f"{worker_id}.{n}" for n in itertools.count(1))
+        self.lobby = Lobby(
+            board_size, ships, event_log, room_ids, setup_timeout, idle_timeout, salvo
+        )
+        self.channel = None  # Socket Unix até o processo aceitador, no modo worker
+        self.reported_waiting = False  # Último estado da fila avisado ao aceitador
+        self.spectator_count = 0
+        self.idle_spectators = set()  # Sem partida para assistir; entram na próxima que lotar
+
+    def resume_rooms(self, recovered):
+        self.lobby.resume(recovered)
+        if recovered:
+            print(f"{len(recovered)} partidas recuperadas do log de eventos.")
+        self.update_gauges()
+
+    def seat_player(self, protocol, opponent="human"):
+        room, player_id = self.lobby.join(protocol.seat, opponent)
+        if len(room.clients) == 2:
+            for spectator in list(self.idle_spectators):
+                self.spectate(spectator, room.room_id)
+        self.update_gauges()
+        return room, player_id
+
+    def update_gauges(self):
+        metrics.set_gauge("active_rooms", len(self.lobby.rooms))
+        metrics.set_gauge("active_players", self.lobby.players)
+        metrics.set_gauge("active_spectators", self.spectator_count)
+        self.report_waiting()
+
+    def report_waiting(self, settled=False):
+        # Modo worker: avisa o aceitador, com b"w" + (conexão assentada?) +
+        # (jogador à espera?), quando uma conexão repassada saiu da espera
+        # pela escolha do oponente ou quando a fila mudou.
+        if self.channel is None:
+            return
+        waiting = self.lobby.has_waiting()
+        if not settled and waiting == self.reported_waiting:
+            return
+        self.reported_waiting = waiting
+        try:
+            self.channel.send(b"w" + bytes([settled, waiting]))
+        except OSError:
+            pass  # Aceitador encerrando
+
+    def featured_room(self):
+        # Sem sala escolhida: a partida em andamento com mais espectadores.
+        rooms = list(self.lobby.rooms.values())
+        playing = [room for room in rooms if room.game.game_phase == "playing"]
+        if playing:
+            return max(playing, key=lambda room: len(room.spectators))
+        return next((room for room in rooms if room.clients), None)
+
+    def spectate(self, protocol, room_id=None):
+        # Com workers, só as salas do processo que recebeu a conexão estão disponíveis.
+        if room_id is None:
+            room = self.featured_room()
+        else:
+            room = self.lobby.rooms.get(room_id)
+            if room is None and isinstance(room_id, str) and room_id.isdigit():
+                room = self.lobby.rooms.get(int(room_id))
+        if room is None:
+            error = {"type": "error", "message": "Nenhuma partida para assistir."}
+            protocol.send(encode_message(error, protocol.binary))
+            self.idle_spectators.add(protocol)
+            return
+
+        self.idle_spectators.discard(protocol)
+        if protocol.room is not None:
+            protocol.room.remove_spectator(protocol)
+        protocol.room = room
+        with room.lock:
+            room.add_spectator(protocol, protocol.binary)
+        print(f"Sala {room.room_id}: novo espectador ({len(room.spectators)} no total).")
+
+    def release_spectator(self, protocol):
+        self.idle_spectators.discard(protocol)
+        if protocol.room is not None:
+            protocol.room.remove_spectator(protocol)
+        self.spectator_count -= 1
+        self.update_gauges()
+
+    def release_player(self, room, player_id, protocol):
+        self.rehome(self.lobby.leave(room, player_id, protocol))
+        self.update_gauges()
+
+    def reconnect_player(self, protocol, token):
+        # {"type": "reconnect"} numa conexão recém-sentada, ou ainda sem vaga
+        # (primeira mensagem): retoma a vaga do token. Com workers, um token de
+        # sala de outro worker ("worker.sala/...") faz a conexão voltar ao
+        # aceitador, que a entrega ao worker certo. Como em Lobby.reconnect,
+        # qualquer valor vira texto: um token inválido só leva um erro.
+        token = str(token)
+        room_id = token.rpartition("/")[0]
+        worker, dot, _ = room_id.partition(".")
+        other = dot and worker.isdigit() and int(worker) != self.worker_id
+        if self.channel is not None and other:
+            if protocol.room is not None:
+                self.rehome(self.lobby.vacate(protocol.room, protocol.player_id))
+                protocol.room = None
+            fd = os.dup(protocol.transport.get_extra_info("socket").fileno())
+            try:
+                socket.send_fds(self.channel, [b"r" + token.encode()], [fd])
+            finally:
+                os.close(fd)
+            protocol.transport.abort()
+            self.update_gauges()
+            return
+        seat, spectators = self.lobby.reconnect(
+            token, protocol.seat, protocol.room, protocol.player_id
+        )
+        self.rehome(spectators)
+        if seat is None and protocol.room is None:
+            error = {"type": "error", "message": "Sessão inválida ou expirada."}
+            protocol.transport.write(encode_message(error))
+            protocol.transport.close()
+            return
+        if seat is None:
+            with protocol.room.lock:
+                protocol.room.send_error(protocol.player_id, "Sessão inválida ou expirada.")
+            return
+        protocol.room, protocol.player_id = seat
+        print(f"Sala {protocol.room.room_id}: jogador {protocol.player_id} reconectado.")
+        self.update_gauges()
+
+    def resume_player(self, protocol, token):
+        # Conexão repassada por outro worker já com o token.
+        seat, _ = self.lobby.reconnect(token, protocol.seat)
+        if seat is None:
+            return False
+        protocol.room, protocol.player_id = seat
+        print(f"Sala {protocol.room.room_id}: jogador {protocol.player_id} reconectado.")
+        self.update_gauges()
+        return True
+
+    def rehome(self, spectators):
+        # Quem assistia a uma sala encerrada passa para a partida em destaque.
+        for spectator in spectators:
+            spectator.room = None
+            self.spectate(spectator)
+
+    async def reap_periodically(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            self.rehome(self.lobby.reap())
+            self.lobby.check_heartbeats()
+            self.update_gauges()
+
+    async def serve_from_channel(self, channel):
+        # Modo worker: não escuta a porta; recebe do processo aceitador, pelo
+        # socket Unix `channel`, os descritores das conexões já aceitas. O byte
+        # que acompanha cada descritor diz se é um jogador (b"c") ou um
+        # espectador (b"s"); b"r" seguido de um token é um jogador que
+        # reconectou por outro worker e vem retomar uma vaga deste. Pelo mesmo
+        # canal o worker devolve ao aceitador as reconexões de outros workers
+        # e avisa se tem um jogador à espera (report_waiting).
+        loop = asyncio.get_running_loop()
+        channel.setblocking(False)
+        self.channel = channel
+        closed = loop.create_future()
+
+        def receive():
+            try:
+                # O canal é SOCK_SEQPACKET: uma mensagem por leitura.
+                data, fds, _, _ = socket.recv_fds(channel, 1024, 16)
+            except BlockingIOError:
+                return
+            if not data:
+                loop.remove_reader(channel.fileno())
+                closed.set_result(None)
+                return
+            if data[:1] == b"r":
+                token = data[1:].decode()
+                factory = lambda: PlayerProtocol(self, resume=token)
+            elif data == b"s":
+                factory = lambda: SpectatorProtocol(self)
+            else:
+                factory = lambda: PlayerProtocol(self)
+            for fd in fds:
+                client_socket = socket.socket(fileno=fd)
+                client_socket.setblocking(False)
+                loop.create_task(loop.connect_accepted_socket(factory, client_socket))
+
+        loop.add_reader(channel.fileno(), receive)
+        reaper = loop.create_task(self.reap_periodically())
+        await closed
+        reaper.cancel()
+
+    async def serve_forever(self):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(
+            lambda: PlayerProtocol(self), self.host, self.port, backlog=1024
+        )
+        print(f"Servidor Batalha Naval (asyncio) iniciado em {self.host}:{self.port}")
+        if self.spectator_port:
+            await loop.create_server(
+                lambda: SpectatorProtocol(self), self.host, self.spectator_port, backlog=1024
+            )
+            print(f"Espectadores na porta {self.spectator_port}")
+        print("Aguardando jogadores...")
+        loop.create_task(self.reap_periodically())
+        async with server:
+            await server.serve_forever()
+
+
+def start_metrics(metrics_port, metrics_interval):
+    if metrics_port:
+        start_http_server(metrics_port)
+    if metrics_interval:
+        start_periodic_dump(metrics_interval)
+
+
+def open_event_log(server, path):
+    recovered = recover(path)
+    server.lobby.event_log = EventLog(path)
+    server.resume_rooms(recovered)
+
+
+def run_worker(
+    channel, worker_id, metrics_port=None, metrics_interval=None, board_size=10, ships=None,
+    event_log_path=None, setup_timeout=SETUP_TIMEOUT, idle_timeout=IDLE_TIMEOUT, salvo=False,
+):
+    # O Ctrl+C é tratado pelo processo aceitador, que encerra os workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Cada worker tem suas próprias métricas, na porta metrics_port + worker_id.
+    start_metrics(metrics_port and metrics_port + worker_id, metrics_interval)
+    server = AsyncBattleshipServer(
+        worker_id=worker_id, board_size=board_size, ships=ships,
+        setup_timeout=setup_timeout, idle_timeout=idle_timeout, salvo=salvo,
+    )
+    if event_log_path:
+        # Um arquivo por worker: "<caminho>.<worker>".
+        open_event_log(server, f"{event_log_path}.{worker_id}")
+    asyncio.run(server.serve_from_channel(channel))
+
+
+class Dispatcher:
+    # Escolhe, no processo aceitador, o worker de cada jogador novo. Os
+    # workers avisam cada conexão que assentaram e se ficaram com um jogador
+    # à espera de oponente (AsyncBattleshipServer.report_waiting). Um jogador
+    # vai para um worker com alguém à espera; na falta dele, para um com
+    # conexões ainda não assentadas (que podem virar espera); só então para o
+    # próximo worker em rodízio. Assim um par não se desfaz quando alguém sai
+    # no posicionamento, joga contra a IA, reconecta ou é só uma sonda.
+    def __init__(self, processes):
+        self.processes = processes
+        self.waiting = [False] * len(processes)
+        self.unsettled = [0] * len(processes)
+        self.rotation = 0
+
+    def pick(self):
+        alive = [worker for worker, process in enumerate(self.processes) if process.is_alive()]
+        if not alive:
+            return 0
+        for worker in alive:
+            if self.waiting[worker]:
+                break
+        else:
+            for worker in alive:
+                if self.unsettled[worker]:
+                    break
+            else:
+                worker = alive[self.rotation % len(alive)]
+                self.rotation += 1
+        self.unsettled[worker] += 1
+        return worker
+
+    def report(self, worker, settled, waiting):
+        if settled:
+            self.unsettled[worker] = max(self.unsettled[worker] - 1, 0)
+        self.waiting[worker] = bool(waiting)
+
+
+def worker_message(selector, channel, worker, channels, dispatcher):
+    try:
+        data, fds, _, _ = socket.recv_fds(channel, 1024, 16)
+    except OSError:
+        data, fds = b"", []
+    if not data:
+        selector.unregister(channel)  # Worker morreu
+        dispatcher.report(worker, False, False)
+        return
+    if data[:1] == b"w" and len(data) == 3:
+        dispatcher.report(worker, data[1], data[2])
+        return
+    forward_reconnect(data, fds, channels)
+
+
+def forward_reconnect(data, fds, channels):
+    try:
+        worker = int(data[1:].split(b".", 1)[0])
+        socket.send_fds(channels[worker], [data], fds)
+    except (ValueError, IndexError, OSError):
+        print("Reconexão para um worker indisponível recusada.")
+        # O cliente recebe o mesmo erro de um token inválido.
+        error = encode_message({"type": "error", "message": "Sessão inválida ou expirada."})
+        for fd in fds:
+            try:
+                os.write(fd, error)
+            except OSError:
+                pass
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def serve_with_workers(
+    host, port, workers, metrics_port=None, metrics_interval=None, board_size=10, ships=None,
+    event_log_path=None, spectator_port=None, setup_timeout=SETUP_TIMEOUT,
+    idle_timeout=IDLE_TIMEOUT, salvo=False,
+):
+    # Um processo aceitador e `workers` processos com um event loop cada. O
+    # Dispatcher escolhe o worker de cada jogador pelo que os workers avisam
+    # da sua fila, e as salas são montadas dentro do worker, então os dois
+    # jogadores de um BattleshipGame sempre ficam no mesmo processo. Espectadores são
+    # distribuídos em rodízio e só veem as salas do worker que os recebeu. Um
+    # reconnect que chega ao worker errado volta por este processo, que o
+    # entrega ao worker dono da sala (o número antes do ponto no token).
+    listener = socket.create_server((host, port), backlog=1024)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, b"c")
+    if spectator_port:
+        spectator_listener = socket.create_server((host, spectator_port), backlog=1024)
+        selector.register(spectator_listener, selectors.EVENT_READ, b"s")
+    channels = []
+    processes = []
+    for worker_id in range(workers):
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(
+                child_end, worker_id, metrics_port, metrics_interval, board_size, ships,
+                event_log_path, setup_timeout, idle_timeout, salvo,
+            ),
+            daemon=True,
+        )
+        process.start()
+        child_end.close()
+        selector.register(parent_end, selectors.EVENT_READ, worker_id)
+        channels.append(parent_end)
+        processes.append(process)
+
+    print(f"Servidor Batalha Naval iniciado em {host}:{port} com {workers} workers")
+    print("Aguardando jogadores...")
+
+    dispatcher = Dispatcher(processes)
+    spectators = 0
+    with listener:
+        while True:
+            for key, _ in selector.select():
+                if isinstance(key.data, int):
+                    worker_message(selector, key.fileobj, key.data, channels, dispatcher)
+                    continue
+                client_socket, addr = key.fileobj.accept()
+                if key.data == b"c":
+                    worker = dispatcher.pick()
+                else:
+                    worker = spectators % workers
+                    spectators += 1
+                    # Pula workers que morreram.
+                    for _ in range(workers):
+                        if processes[worker].is_alive():
+                            break
+                        worker = (worker + 1) % workers
+                try:
+                    socket.send_fds(channels[worker], [key.data], [client_socket.fileno()])
+                except OSError:
+                    print(f"Worker {worker} indisponível; conexão de {addr} recusada.")
+                finally:
+                    client_socket.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de Batalha Naval com várias salas")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="processos com salas; acima de 1, um processo aceitador distribui as conexões",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None,
+        help="porta HTTP local para /metrics e /connections (com workers, uma por worker)",
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=None,
+        help="imprime um resumo das métricas a cada N segundos",
+    )
+    parser.add_argument("--board-size", type=int, default=10)
+    parser.add_argument("--ships", type=int, nargs="+", default=None, help="tamanhos dos navios")
+    parser.add_argument(
+        "--spectator-port", type=int, default=None,
+        help="porta para espectadores (client.py --spectate)",
+    )
+    parser.add_argument(
+        "--event-log", default=None,
+        help="arquivo do log de eventos; partidas em andamento nele são recuperadas ao iniciar",
+    )
+    parser.add_argument(
+        "--setup-timeout", type=float, default=SETUP_TIMEOUT,
+        help="segundos sem atividade no posicionamento antes de encerrar a sala",
+    )
+    parser.add_argument(
+        "--idle-timeout", type=float, default=IDLE_TIMEOUT,
+        help="segundos sem jogadas antes de encerrar uma partida",
+    )
+    parser.add_argument(
+        "--salvo", action="store_true",
+        help="modo salvo: a cada turno, um tiro por navio ainda à tona",
+    )
+    args = parser.parse_args()
+    try:
+        ships = BattleshipGame(args.board_size, args.ships).ships
+        # Uma vez aqui, e não no meio de uma partida com a sala travada.
+        fleet_template(args.board_size, tuple(ships))
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.workers > 1:
+        serve_with_workers(
+            args.host, args.port, args.workers, args.metrics_port, args.metrics_interval,
+            args.board_size, args.ships, args.event_log, args.spectator_port,
+            args.setup_timeout, args.idle_timeout, args.salvo,
+        )
+    else:
+        start_metrics(args.metrics_port, args.metrics_interval)
+        server = AsyncBattleshipServer(
+            args.host, args.port, board_size=args.board_size, ships=args.ships,
+            spectator_port=args.spectator_port, setup_timeout=args.setup_timeout,
+            idle_timeout=args.idle_timeout, salvo=args.salvo,
+        )
+        if args.event_log:
+            open_event_log(server, args.event_log)
+        asyncio.run(server.serve_forever())
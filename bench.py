@@ -0,0 +1,443 @@
+import argparse
+import functools
+import gc
+import json
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import deque
+from game import BattleshipGame
+from protocol import FrameReader, encode_message
+
+# Microbenchmarks do motor do jogo e do protocolo, mais a ida e volta de uma
+# mensagem por um servidor de verdade em loopback. Cada benchmark cronometra só
+# o trecho quente (a preparação fica de fora) e é repetido até somar
+# --min-time segundos; das --repeat rodadas fica o melhor tempo por operação,
+# o menos sensível a ruído da máquina. --save grava os resultados em JSON e
+# --compare aponta o que ficou mais lento que a referência além de
+# --threshold (mais a dispersão da própria referência); nesse caso o processo
+# sai com código 1, para uso em CI.
+
+SEED = 1234
+CHUNK = 1000  # Tabuleiros ou partidas preparados por vez fora do cronômetro
+
+
+def placed_game(rng, board_size=10, salvo=False):
+    # Partida já em andamento, com as duas frotas posicionadas ao acaso.
+    game = BattleshipGame(board_size, salvo=salvo)
+    for player_id in ("player_1", "player_2"):
+        game.add_player(player_id)
+        player = game.players[player_id]
+        game.auto_place_ships(player["board"], rng)
+        player["ships_to_place"] = []
+        player["ready"] = True
+    game.game_phase = "playing"
+    game.current_turn = "player_1"
+    return game
+
+
+def shot_orders(board_size, player_ids, rng):
+    # Todas as casas, em ordem aleatória, para cada jogador.
+    orders = {}
+    for player_id in player_ids:
+        cells = [(row, col) for row in range(board_size) for col in range(board_size)]
+        rng.shuffle(cells)
+        orders[player_id] = cells
+    return orders
+
+
+def play_shots(game, orders, count):
+    # Avança a partida `count` tiros (ou até o fim), sempre com quem tem a vez.
+    for _ in range(count):
+        if game.game_over:
+            break
+        shooter = game.current_turn
+        game.make_shot(shooter, *orders[shooter].pop())
+
+
+def bench_is_valid_placement(loops):
+    rng = random.Random(SEED)
+    game = placed_game(rng)
+    board = game.players["player_1"]["board"]
+    size = game.board_size
+    candidates = [
+        (rng.randrange(size), rng.randrange(size), rng.choice(game.ships), rng.choice("HV"))
+        for _ in range(256)
+    ]
+    is_valid = game.is_valid_placement
+    start = time.perf_counter()
+    for _ in range(loops):
+        for row, col, length, direction in candidates:
+            is_valid(board, row, col, length, direction)
+    return time.perf_counter() - start, loops * len(candidates)
+
+
+def bench_place_ship(loops):
+    # Uma operação é um place_ship; cada tabuleiro recebe uma frota inteira.
+    rng = random.Random(SEED)
+    game = BattleshipGame()
+    layouts = []
+    for _ in range(64):
+        board = game.create_empty_board()
+        game.auto_place_ships(board, rng)
+        layouts.append(board.placements)
+    elapsed = 0.0
+    for first in range(0, loops, CHUNK):
+        boards = [game.create_empty_board() for _ in range(min(CHUNK, loops - first))]
+        start = time.perf_counter()
+        for index, board in enumerate(boards):
+            for row, col, length, direction in layouts[index % len(layouts)]:
+                game.place_ship(board, row, col, length, direction)
+        elapsed += time.perf_counter() - start
+    return elapsed, loops * len(game.ships)
+
+
+def bench_auto_place_ships(loops):
+    # Uma operação é a frota inteira de um tabuleiro.
+    rng = random.Random(SEED)
+    game = BattleshipGame()
+    elapsed = 0.0
+    for first in range(0, loops, CHUNK):
+        boards = [game.create_empty_board() for _ in range(min(CHUNK, loops - first))]
+        start = time.perf_counter()
+        for board in boards:
+            game.auto_place_ships(board, rng)
+        elapsed += time.perf_counter() - start
+    return elapsed, loops
+
+
+def bench_make_shot(loops):
+    # Partidas completas; uma operação é um tiro.
+    rng = random.Random(SEED)
+    elapsed = 0.0
+    shots = 0
+    for first in range(0, loops, CHUNK // 10):
+        games = []
+        for _ in range(min(CHUNK // 10, loops - first)):
+            game = placed_game(rng)
+            games.append((game, shot_orders(game.board_size, game.players, rng)))
+        start = time.perf_counter()
+        for game, orders in games:
+            while not game.game_over:
+                shooter = game.current_turn
+                game.make_shot(shooter, *orders[shooter].pop())
+                shots += 1
+        elapsed += time.perf_counter() - start
+    return elapsed, shots
+
+
+def bench_make_salvo(loops):
+    # Partidas completas no modo salvo; uma operação é um tiro, para comparar
+    # com make_shot o custo por tiro de resolver a salva inteira de uma vez.
+    rng = random.Random(SEED)
+    elapsed = 0.0
+    shots = 0
+    for first in range(0, loops, CHUNK // 10):
+        games = []
+        for _ in range(min(CHUNK // 10, loops - first)):
+            game = placed_game(rng, salvo=True)
+            games.append((game, shot_orders(game.board_size, game.players, rng)))
+        start = time.perf_counter()
+        for game, orders in games:
+            while not game.game_over:
+                shooter = game.current_turn
+                cells = orders[shooter][-game.salvo_size(shooter):]
+                del orders[shooter][-len(cells):]
+                game.make_salvo(shooter, cells)
+                shots += len(cells)
+        elapsed += time.perf_counter() - start
+    return elapsed, shots
+
+
+def bench_check_win(loops):
+    rng = random.Random(SEED)
+    game = placed_game(rng)
+    play_shots(game, shot_orders(game.board_size, game.players, rng), 60)
+    boards = [player["board"] for player in game.players.values()] * 128
+    check_win = game.check_win
+    start = time.perf_counter()
+    for _ in range(loops):
+        for board in boards:
+            check_win(board)
+    return time.perf_counter() - start, loops * len(boards)
+
+
+def bench_game_state(binary, board_size, loops):
+    # get_game_state mais a serialização da mensagem, no meio de uma partida.
+    rng = random.Random(SEED)
+    game = placed_game(rng, board_size)
+    play_shots(game, shot_orders(game.board_size, game.players, rng), 60)
+    start = time.perf_counter()
+    for _ in range(loops):
+        encode_message({"type": "game_state", "state": game.get_game_state("player_1")}, binary)
+    return time.perf_counter() - start, loops
+
+
+class LoopbackServer:
+    # Servidor de verdade num subprocesso, iniciado só se algum benchmark de
+    # ida e volta for rodar.
+    def __init__(self, script):
+        self.script = script
+        self.process = None
+        self.port = None
+
+    def address(self):
+        if self.process is None:
+            with socket.socket() as probe:
+                probe.bind(("localhost", 0))
+                self.port = probe.getsockname()[1]
+            self.process = subprocess.Popen(
+                [sys.executable, self.script, "--port", str(self.port)],
+                stdout=subprocess.DEVNULL,
+            )
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    socket.create_connection(("localhost", self.port)).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+        return "localhost", self.port
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+
+class Peer:
+    # Cliente mínimo e bloqueante, só com o protocolo.
+    def __init__(self, address, binary):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = FrameReader()
+        self.messages = deque()
+        self.binary = False
+        self.send({"type": "opponent", "opponent": "human"})  # Senta sem esperar (ver lobby.py)
+        welcome = self.receive("welcome")
+        self.player_id = welcome["player_id"]
+        if binary:
+            self.send({"type": "encoding", "encoding": "binary"})
+            self.binary = True
+
+    def send(self, message):
+        self.sock.sendall(encode_message(message, self.binary))
+
+    def receive(self, msg_type):
+        # Descarta as mensagens de outros tipos até chegar uma `msg_type`.
+        while True:
+            while self.messages:
+                message = self.messages.popleft()
+                if message.get("type") == msg_type:
+                    return message
+            messages = self.reader.recv_from(self.sock)
+            if messages is None:
+                raise ConnectionError("O servidor fechou a conexão")
+            self.messages.extend(messages)
+
+    def close(self):
+        self.sock.close()
+
+
+def start_match(loopback, binary):
+    # Duas conexões seguidas formam uma sala; devolve os jogadores por id.
+    peers = [Peer(loopback.address(), binary) for _ in range(2)]
+    for peer in peers:
+        peer.send({"type": "placement_choice", "choice": "auto"})
+    for peer in peers:
+        peer.receive("game_start")
+    return {peer.player_id: peer for peer in peers}
+
+
+def bench_roundtrip_resync(binary, loopback, loops):
+    # Pedido de resync até o game_state completo voltar.
+    peers = start_match(loopback, binary)
+    peer = peers["player_1"]
+    start = time.perf_counter()
+    for _ in range(loops):
+        peer.send({"type": "resync"})
+        peer.receive("game_state")
+    elapsed = time.perf_counter() - start
+    for peer in peers.values():
+        peer.close()
+    return elapsed, loops
+
+
+def bench_roundtrip_shot(loopback, loops):
+    # Partidas completas; cada operação vai do envio do tiro até o
+    # shot_result chegar ao atirador.
+    rng = random.Random(SEED)
+    elapsed = 0.0
+    shots = 0
+    for _ in range(loops):
+        peers = start_match(loopback, True)
+        orders = shot_orders(10, peers, rng)
+        turn, other = "player_1", "player_2"
+        result = None
+        while result != "hit_win":
+            row, col = orders[turn].pop()
+            start = time.perf_counter()
+            peers[turn].send({"type": "shot", "row": row, "col": col})
+            result = peers[turn].receive("shot_result")["result"]
+            elapsed += time.perf_counter() - start
+            shots += 1
+            peers[other].receive("shot_result")
+            if result == "miss":
+                turn, other = other, turn
+        for peer in peers.values():
+            peer.close()
+    return elapsed, shots
+
+
+ENGINE_BENCHMARKS = {
+    "is_valid_placement": bench_is_valid_placement,
+    "place_ship": bench_place_ship,
+    "auto_place_ships": bench_auto_place_ships,
+    "make_shot": bench_make_shot,
+    "make_salvo": bench_make_salvo,
+    "check_win": bench_check_win,
+    "game_state_json": functools.partial(bench_game_state, False, 10),
+    "game_state_binary": functools.partial(bench_game_state, True, 10),
+    "game_state_json_1000": functools.partial(bench_game_state, False, 1000),
+    "game_state_binary_1000": functools.partial(bench_game_state, True, 1000),
+}
+
+# Recebem o LoopbackServer antes de `loops`.
+ROUNDTRIP_BENCHMARKS = {
+    "roundtrip_resync_json": functools.partial(bench_roundtrip_resync, False),
+    "roundtrip_resync_binary": functools.partial(bench_roundtrip_resync, True),
+    "roundtrip_shot": bench_roundtrip_shot,
+}
+
+
+def timed_round(function, loops):
+    # Como o timeit: sem coletas de lixo no meio da medição.
+    gc.collect()
+    gc.disable()
+    try:
+        return function(loops)
+    finally:
+        gc.enable()
+
+
+def measure(function, min_time, repeat):
+    # Aumenta `loops` até uma rodada durar min_time; devolve segundos por operação.
+    loops = 1
+    while True:
+        elapsed, ops = timed_round(function, loops)
+        if elapsed >= min_time:
+            break
+        growth = min(10, 1.2 * min_time / max(elapsed, 1e-9))
+        loops = max(loops + 1, int(loops * growth))
+    samples = [elapsed / ops]
+    for _ in range(repeat - 1):
+        elapsed, ops = timed_round(function, loops)
+        samples.append(elapsed / ops)
+    return {
+        "best": min(samples),
+        "median": statistics.median(samples),
+        "ops": ops,
+        "loops": loops,
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(results, baseline, threshold):
+    # Imprime a comparação e devolve os nomes que pioraram além do limite. A
+    # tolerância de cada benchmark soma ao limite a dispersão que ele teve na
+    # referência (mediana / melhor), para que os de ida e volta pela rede, mais
+    # ruidosos, não acusem regressões falsas.
+    regressions = []
+    print(f"\n{'benchmark':<26} {'referência':>12} {'atual':>12} {'variação':>9}")
+    for name, result in results.items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:<26} {'-':>12} {format_time(result['best']):>12} {'novo':>9}")
+            continue
+        change = result["best"] / reference["best"] - 1
+        tolerance = threshold + reference["median"] / reference["best"] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSÃO"
+            regressions.append(name)
+        elif change < -tolerance:
+            flag = "  melhora"
+        print(
+            f"{name:<26} {format_time(reference['best']):>12} "
+            f"{format_time(result['best']):>12} {change:>+9.1%}{flag}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    names = list(ENGINE_BENCHMARKS) + list(ROUNDTRIP_BENCHMARKS)
+    parser = argparse.ArgumentParser(description="Benchmarks do motor do jogo e do protocolo")
+    parser.add_argument(
+        "benchmarks", nargs="*", default=names, metavar="BENCHMARK",
+        help=f"quais rodar (padrão: todos): {', '.join(names)}",
+    )
+    parser.add_argument("--min-time", type=float, default=0.2, help="segundos por rodada")
+    parser.add_argument("--repeat", type=int, default=5, help="rodadas por benchmark")
+    parser.add_argument("--save", default=None, help="grava os resultados neste JSON")
+    parser.add_argument("--compare", default=None, help="JSON de referência gravado com --save")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10,
+        help="piora relativa acima da qual um benchmark conta como regressão",
+    )
+    parser.add_argument(
+        "--server", default="async_server.py", choices=["async_server.py", "server.py"],
+        help="servidor usado nos benchmarks de ida e volta",
+    )
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in names]
+    if unknown:
+        parser.error(f"Benchmarks desconhecidos: {', '.join(unknown)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("python") != platform.python_version():
+            print(f"Aviso: referência gravada com Python {baseline.get('python')}.")
+
+    loopback = LoopbackServer(args.server)
+    results = {}
+    try:
+        for name in args.benchmarks:
+            function = ENGINE_BENCHMARKS.get(name)
+            if function is None:
+                function = functools.partial(ROUNDTRIP_BENCHMARKS[name], loopback)
+            result = results[name] = measure(function, args.min_time, args.repeat)
+            print(
+                f"{name:<26} {format_time(result['best']):>12} por operação "
+                f"(mediana {format_time(result['median'])}, "
+                f"{result['ops']} operações por rodada)",
+                flush=True,
+            )
+    finally:
+        loopback.close()
+
+    if args.save:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": args.server,
+            "results": results,
+        }
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    if baseline is not None and compare(results, baseline, args.threshold):
+        sys.exit(1)
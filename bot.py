@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import random
+import time
+from client_core import ClientCore
+from protocol import FrameReader
+
+
+class OpponentMismatch(Exception):
+    pass
+
+
+class BotClient(ClientCore):
+    # Jogador automático: usa o mesmo ClientCore do client.py, posiciona a
+    # frota automaticamente e atira em casas aleatórias ainda não atingidas.
+    # Com `batch` acima de 1 (ou no modo salvo) manda vários tiros numa única
+    # mensagem "salvo"; fora do modo salvo o servidor para no primeiro erro e
+    # as casas que sobraram voltam para a lista.
+    def __init__(
+        self, host="localhost", port=12345, encoding="binary", rng=random, opponent="human",
+        batch=1,
+    ):
+        super().__init__(encoding, opponent)
+        self.host = host
+        self.port = port
+        self.rng = rng
+        self.batch = batch
+        self.pending = []  # Casas da última salva enviada
+        self.writer = None
+        self.targets = []
+        self.game_over = False
+        self.won = False
+        self.shot_sent_at = None
+        self.shot_latencies = []  # Tempo de ida e volta de cada envio, em segundos
+        self.shots_fired = 0
+        self.messages_in = 0
+        self.messages_out = 0
+
+    async def run(self):
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.hello()
+        frames = FrameReader()
+        try:
+            while not self.game_over:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for message in frames.feed(data):
+                    self.messages_in += 1
+                    self.handle_server_message(message)
+        finally:
+            self.writer.close()
+        return self.won
+
+    def write(self, data):
+        self.messages_out += 1
+        self.writer.write(data)
+
+    def on_welcome(self, message):
+        self.send_message({"type": "placement_choice", "choice": "auto"})
+
+    def on_game_start(self, message):
+        faced_ai = any(pid != self.player_id for pid in message.get("ai_players", []))
+        if (self.opponent == "ai") != faced_ai:
+            raise OpponentMismatch(f"{self.player_id} pediu {self.opponent} e não o recebeu")
+
+    def on_shot_result(self, message):
+        if message["shooter"] == self.player_id and self.shot_sent_at is not None:
+            self.shot_latencies.append(time.perf_counter() - self.shot_sent_at)
+            self.shot_sent_at = None
+            self.shots_fired += 1
+        if message["result"] == "hit_win":
+            self.won = message["shooter"] == self.player_id
+
+    def on_salvo_result(self, message):
+        if message["shooter"] == self.player_id and self.shot_sent_at is not None:
+            self.shot_latencies.append(time.perf_counter() - self.shot_sent_at)
+            self.shot_sent_at = None
+            self.shots_fired += len(message["shots"])
+            fired = {(row, col) for row, col, _, _ in message["shots"]}
+            self.targets.extend(cell for cell in self.pending if cell not in fired)
+            self.pending = []
+        if any(shot[2] == "hit_win" for shot in message["shots"]):
+            self.won = message["shooter"] == self.player_id
+
+    def on_state_changed(self):
+        state = self.game_state
+        if state["game_phase"] == "playing" and not self.targets and "your_shots" in state:
+            self.targets = [
+                (row, col)
+                for row in range(self.board_size)
+                for col in range(self.board_size)
+                if state["your_shots"][row][col] == "~"
+            ]
+            self.rng.shuffle(self.targets)
+        if state["game_over"]:
+            self.game_over = True
+        elif state["game_phase"] == "playing" and state["current_turn"]:
+            self.shoot()
+
+    def on_error(self, message):
+        # Tiro recusado (ex.: o oponente desconectou); não conta na latência.
+        self.shot_sent_at = None
+        self.targets.extend(self.pending)
+        self.pending = []
+
+    def shoot(self):
+        if not self.targets or self.shot_sent_at is not None:
+            return
+        count = self.game_state.get("shots_per_turn", 1) if self.salvo else self.batch
+        self.shot_sent_at = time.perf_counter()
+        if count == 1 and not self.salvo:
+            row, col = self.targets.pop()
+            self.send_message({"type": "shot", "row": row, "col": col})
+            return
+        self.pending = self.targets[-count:]
+        del self.targets[-count:]
+        self.send_message({"type": "salvo", "shots": [list(cell) for cell in self.pending]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Jogador automático de Batalha Naval")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--encoding", choices=["json", "binary"], default="binary")
+    parser.add_argument("--ai", action="store_true", help="jogar contra a IA do servidor")
+    parser.add_argument("--batch", type=int, default=1, help="tiros por mensagem")
+    args = parser.parse_args()
+
+    bot = BotClient(
+        args.host, args.port, args.encoding, opponent="ai" if args.ai else "human",
+        batch=args.batch,
+    )
+    won = asyncio.run(bot.run())
+    print(f"{bot.player_id}: {'vitória' if won else 'derrota'} em {bot.shots_fired} tiros.")
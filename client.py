@@ -1,30 +1,39 @@
+import argparse
 import socket
-import json
 import threading
 import time
-import os
+from client_core import ClientCore
+from protocol import FrameReader
+from renderer import TerminalRenderer
 
+RECONNECT_WINDOW = 30  # Segundos tentando voltar à partida depois de uma queda
 
-class BattleshipClient:
-    def __init__(self, host="localhost", port=12345):
+
+class BattleshipClient(ClientCore):
+    # Cliente de terminal. Uma thread lê o socket e aplica as mensagens no
+    # ClientCore; a thread principal lê o teclado e espera pelas mudanças de
+    # estado na condição self.changed, acordando assim que a mensagem chega.
+    def __init__(
+        self, host="localhost", port=12345, encoding="binary", opponent="human", spectate=None
+    ):
+        super().__init__(encoding, opponent, spectate)
         self.host = host
         self.port = port
         self.socket = None
-        self.player_id = None
-        self.game_state = None
         self.running = True
+        self.welcomed = False
+        self.placement_pending = False  # place_ship enviado, aguardando placement_ok ou erro
         self.lock = threading.Lock()
-        self.connection_established = threading.Event()
-        self.placement_update_received = threading.Event()
+        self.changed = threading.Condition(self.lock)
         self.last_shot_result = ""
-
-    def clear_screen(self):
-        os.system("cls" if os.name == "nt" else "clear")
+        self.notice = ""  # Aviso exibido no próximo quadro de posicionamento
+        self.renderer = TerminalRenderer()
 
     def connect_to_server(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
+            self.hello()
             print("Conectado ao servidor!")
             threading.Thread(target=self.listen_to_server, daemon=True).start()
             return True
@@ -33,142 +42,253 @@ class BattleshipClient:
             return False
 
     def listen_to_server(self):
-        buffer = ""
+        reader = FrameReader()
         while self.running:
             try:
-                data = self.socket.recv(4096).decode()
-                if not data:
-                    self.running = False
-                    break
-                buffer += data
-                while "\n" in buffer:
-                    message_str, buffer = buffer.split("\n", 1)
-                    if message_str:
-                        message = json.loads(message_str)
-                        self.handle_server_message(message)
+                messages = reader.recv_from(self.socket)
+                if messages is None:
+                    raise ConnectionError("Conexão encerrada pelo servidor")
+                for message in messages:
+                    self.handle_server_message(message)
             except Exception:
-                if self.running:
+                if self.running and self.reconnect():
+                    reader = FrameReader()
+                    continue
+                if self.running and self.game_state and not self.game_state.get("game_over"):
                     print("\nConexão com o servidor perdida.")
-                    self.running = False
                 break
+        self.stop()
 
-    def handle_server_message(self, message):
+    def reconnect(self):
+        # Queda no meio da partida: abre outra conexão e retoma a vaga com o
+        # token de sessão; o servidor a guarda por alguns segundos.
         with self.lock:
-            msg_type = message.get("type")
-
-            if msg_type == "welcome":
-                self.player_id = message["player_id"]
-                if self.game_state is None:
-                    self.game_state = {
-                        "your_board": [["~"] * 10 for _ in range(10)],
-                        "ships_to_place": message.get("ships_to_place", []),
-                        "game_phase": "setup",
-                    }
-                print(f"\n{message['message']}")
-                print("\n=======================================================")
-                print(">>> Você está conectado. Configure sua frota. <<<")
-                print(">>> Preste atenção nesta janela para as instruções. <<<")
-                print("=======================================================")
-                self.connection_established.set()
-
-            elif msg_type == "placement_ok":
-                self.game_state["your_board"] = message["board"]
-                self.game_state["ships_to_place"] = message["ships_left"]
-                self.display_placement_board()
-                print(">>> Navio posicionado com sucesso!")
-                self.placement_update_received.set()
-
-            elif msg_type == "game_start":
-                print(f"\n\n>>> {message['message']} <<<\n")
-
-            elif msg_type == "shot_result":
-                result, row, col = message["result"], message["row"], message["col"]
-                if message["shooter"] == self.player_id:
-                    if result == "hit":
-                        self.last_shot_result = (
-                            f"🎯 ACERTOU! Você atingiu um navio em ({row}, {col})"
-                        )
-                    elif result == "hit_win":
-                        self.last_shot_result = (
-                            "🏆 VITÓRIA! Você afundou todos os navios inimigos!"
-                        )
-                    elif result == "miss":
-                        self.last_shot_result = (
-                            f"💧 ERROU! Nenhum navio em ({row}, {col})"
-                        )
-                else:
-                    if result == "hit":
-                        self.last_shot_result = (
-                            f"💥 ALERTA! Inimigo atingiu seu navio em ({row}, {col})"
-                        )
-                    elif result == "hit_win":
-                        self.last_shot_result = (
-                            "💀 DERROTA! Inimigo afundou todos os seus navios!"
-                        )
-                    elif result == "miss":
-                        self.last_shot_result = (
-                            f"🌊 Sorte! Inimigo errou o tiro em ({row}, {col})"
-                        )
-
-            elif msg_type == "game_state":
-                self.game_state.update(message["state"])
-                if self.game_state["game_phase"] == "playing":
-                    self.display_game_boards()
-
-            elif msg_type == "error":
-                print(f"\n❌ Erro do Servidor: {message['message']}")
-                if self.game_state.get("game_phase") == "setup":
-                    self.placement_update_received.set()
+            if not self.can_resume() or self.game_state.get("game_over"):
+                return False
+        print("\nConexão perdida. Tentando reconectar...")
+        deadline = time.monotonic() + RECONNECT_WINDOW
+        while self.running and time.monotonic() < deadline:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError:
+                time.sleep(1)
+                continue
+            sock.settimeout(None)
+            with self.lock:
+                self.socket.close()
+                self.socket = sock
+                self.start_resume()
+                self.hello()
+            return True
+        return False
+
+    def stop(self):
+        with self.changed:
+            self.running = False
+            self.changed.notify_all()
+
+    def wait_until(self, predicate, timeout=None):
+        # Bloqueia até predicate() ou o fim da conexão; devolve predicate().
+        with self.changed:
+            self.changed.wait_for(lambda: not self.running or predicate(), timeout)
+            return predicate()
+
+    def handle_server_message(self, message):
+        with self.changed:
+            super().handle_server_message(message)
+            self.changed.notify_all()
+
+    def write(self, data):
+        try:
+            self.socket.sendall(data)
+        except Exception:
+            if not self.can_resume():  # Senão a thread de leitura reconecta
+                self.running = False
+
+    def on_welcome(self, message):
+        self.welcomed = True
+        if self.spectate is not None:
+            return
+        print(f"\n{message['message']}")
+        print("\n=======================================================")
+        print(">>> Você está conectado. Configure sua frota. <<<")
+        print(">>> Preste atenção nesta janela para as instruções. <<<")
+        print("=======================================================")
+
+    def on_resumed(self, message):
+        self.last_shot_result = "Reconectado! Partida retomada."
+
+    def on_resume_failed(self, message):
+        print(f"\n❌ Não foi possível retomar a partida: {message['message']}")
+        self.running = False
+
+    def on_opponent_status(self, message):
+        if message["connected"]:
+            self.last_shot_result = "O oponente voltou."
+        else:
+            self.last_shot_result = (
+                f"O oponente perdeu a conexão; aguardando até {message['grace']}s pela volta."
+            )
+        if self.game_state.get("game_phase") == "playing":
+            self.display_game_boards()
+
+    def on_placement(self):
+        self.placement_pending = False
+        self.notice = ">>> Navio posicionado com sucesso!"
+
+    def on_game_start(self, message):
+        print(f"\n\n>>> {message['message']} <<<\n")
+
+    def on_shot_result(self, message):
+        result, row, col = message["result"], message["row"], message["col"]
+        if message["shooter"] == self.player_id:
+            if result == "hit":
+                self.last_shot_result = (
+                    f"🎯 ACERTOU! Você atingiu um navio em ({row}, {col})"
+                )
+            elif result == "sunk":
+                self.last_shot_result = (
+                    f"🔥 AFUNDOU! Você afundou um navio de tamanho {message['sunk']} em ({row}, {col})"
+                )
+            elif result == "hit_win":
+                self.last_shot_result = (
+                    "🏆 VITÓRIA! Você afundou todos os navios inimigos!"
+                )
+            elif result == "miss":
+                self.last_shot_result = (
+                    f"💧 ERROU! Nenhum navio em ({row}, {col})"
+                )
+        else:
+            if result == "hit":
+                self.last_shot_result = (
+                    f"💥 ALERTA! Inimigo atingiu seu navio em ({row}, {col})"
+                )
+            elif result == "sunk":
+                self.last_shot_result = (
+                    f"⚓ Inimigo afundou seu navio de tamanho {message['sunk']} em ({row}, {col})"
+                )
+            elif result == "hit_win":
+                self.last_shot_result = (
+                    "💀 DERROTA! Inimigo afundou todos os seus navios!"
+                )
+            elif result == "miss":
+                self.last_shot_result = (
+                    f"🌊 Sorte! Inimigo errou o tiro em ({row}, {col})"
+                )
+
+    def on_salvo_result(self, message):
+        # Um resumo por salva: casas atingidas, navios afundados e o desfecho.
+        hits = [(row, col) for row, col, result, _ in message["shots"] if result != "miss"]
+        sunk = [size for _, _, _, size in message["shots"] if size]
+        won = any(shot[2] == "hit_win" for shot in message["shots"])
+        mine = message["shooter"] == self.player_id
+        if won:
+            self.last_shot_result = (
+                "🏆 VITÓRIA! Você afundou todos os navios inimigos!" if mine
+                else "💀 DERROTA! Inimigo afundou todos os seus navios!"
+            )
+            return
+        who = "Você acertou" if mine else "O inimigo acertou"
+        self.last_shot_result = (
+            f"{who} {len(hits)} de {len(message['shots'])} tiros"
+            + (f" em {', '.join(f'({r}, {c})' for r, c in hits)}" if hits else "")
+        )
+        if sunk:
+            self.last_shot_result += f"; navios afundados: {', '.join(map(str, sunk))}"
+
+    def on_state_changed(self):
+        if self.game_state["game_phase"] == "playing":
+            self.display_game_boards()
+
+    def on_spectator_update(self, shot):
+        if shot is not None and "shots" in shot:
+            hits = sum(1 for _, _, result, _ in shot["shots"] if result != "miss")
+            self.last_shot_result = (
+                f"{shot['shooter']} disparou uma salva: {hits} de {len(shot['shots'])} acertos"
+            )
+        elif shot is not None:
+            self.last_shot_result = (
+                f"{shot['shooter']} atirou em ({shot['row']}, {shot['col']}): {shot['result']}"
+            )
+            if "sunk" in shot:
+                self.last_shot_result += f" (navio de tamanho {shot['sunk']} afundado)"
+        self.display_spectator_view()
+
+    def on_error(self, message):
+        if self.game_state and self.game_state.get("game_phase") == "setup":
+            # Resposta a um place_ship: o aviso aparece no quadro de posicionamento.
+            self.placement_pending = False
+            self.notice = f"❌ Erro do Servidor: {message['message']}"
+        else:
+            print(f"\n❌ Erro do Servidor: {message['message']}")
+
+    def display_spectator_view(self):
+        state = self.spectator_state
+        lines = ["", f"      BATALHA NAVAL - ASSISTINDO A SALA {state['room']}", ""]
+        for player_id, board in state["boards"].items():
+            lines.append(f"🚢 FROTA DO {player_id.upper()}:")
+            lines.extend(self.board_lines(board))
+        lines.append("")
+        if self.last_shot_result:
+            lines.append(f">>> {self.last_shot_result} <<<")
+            self.last_shot_result = ""
+        if state["game_over"]:
+            lines.append("JOGO TERMINADO!")
+        elif state["game_phase"] == "playing":
+            lines.append(f"Vez do {state['current_turn']}.")
+        else:
+            lines.append("Os jogadores estão posicionando a frota...")
+        lines.extend(["", "Legenda: ~ = Desconhecido, X = Acerto, O = Erro (Ctrl+C para sair)"])
+        self.renderer.render(lines)
 
     def display_placement_board(self):
-        self.clear_screen()
-        print("=" * 50)
-        print("      POSICIONE SUA FROTA")
-        print("=" * 50)
-        self.print_board(self.game_state["your_board"])
-        print("\nLegenda: ~ = Água, S = Navio")
+        lines = ["=" * 50, "      POSICIONE SUA FROTA", "=" * 50]
+        lines.extend(self.board_lines(self.game_state["your_board"]))
+        lines.extend(["", "Legenda: ~ = Água, S = Navio", self.notice])
+        self.notice = ""
+        self.renderer.render(lines)
 
     def display_game_boards(self):
         if not self.game_state:
             return
-        self.clear_screen()
 
-        print(f"\n      BATALHA NAVAL - {self.player_id.upper()}\n")
-        print("🚢 SUA FROTA (Ataques Inimigos):")
-        self.print_board(self.game_state["your_board"])
-        print("🎯 SEUS TIROS (Frota Inimiga):")
-        self.print_board(self.game_state["your_shots"])
+        lines = ["", f"      BATALHA NAVAL - {self.player_id.upper()}", ""]
+        lines.append("🚢 SUA FROTA (Ataques Inimigos):")
+        lines.extend(self.board_lines(self.game_state["your_board"]))
+        lines.append("🎯 SEUS TIROS (Frota Inimiga):")
+        lines.extend(self.board_lines(self.game_state["your_shots"]))
 
-        if self.last_shot_result:
-            print("\n", "=" * 50)
-            print(f">>> {self.last_shot_result} <<<")
-            print("=" * 50)
-            self.last_shot_result = ""
+        # Linhas fixas mesmo sem resultado novo: o quadro não muda de altura.
+        lines.append("")
+        lines.append("=" * 50)
+        lines.append(f">>> {self.last_shot_result} <<<" if self.last_shot_result else "")
+        lines.append("=" * 50)
+        self.last_shot_result = ""
 
+        lines.append("")
         if self.game_state.get("game_over"):
-            print("\nJOGO TERMINADO!")
+            lines.append("JOGO TERMINADO!")
+        elif self.game_state.get("current_turn") and self.salvo:
+            shots = self.game_state.get("shots_per_turn", 1)
+            lines.append(f">>> SUA VEZ! Salva de {shots} tiros.")
         elif self.game_state.get("current_turn"):
-            print("\n>>> SUA VEZ! Digite as coordenadas para atirar.")
+            lines.append(">>> SUA VEZ! Digite as coordenadas para atirar.")
         else:
-            print("\n⏳ Aguardando jogada do oponente...")
-        print("\nLegenda: ~ = Água/Desconhecido, S = Navio, X = Acerto, O = Erro")
+            lines.append("⏳ Aguardando jogada do oponente...")
+        lines.extend(["", "Legenda: ~ = Água/Desconhecido, S = Navio, X = Acerto, O = Erro"])
+        self.renderer.render(lines)
 
-    def print_board(self, board):
-        print("   " + " ".join([f"{i}" for i in range(len(board))]))
-        print("  " + "-" * (len(board) * 2 + 1))
+    def board_lines(self, board):
+        lines = ["   " + " ".join([f"{i}" for i in range(len(board))])]
+        lines.append("  " + "-" * (len(board) * 2 + 1))
         for i, row in enumerate(board):
-            print(f"{i}| " + " ".join(row))
-
-    def send_message(self, message):
-        try:
-            self.socket.send((json.dumps(message) + "\n").encode())
-        except Exception:
-            self.running = False
+            lines.append(f"{i}| " + " ".join(row))
+        return lines
 
     def handle_placement_phase(self):
         choice = ""
         while choice not in ["1", "2"]:
-            self.clear_screen()
+            self.renderer.clear()
             print("Como você deseja posicionar seus navios?")
             print("1. Automaticamente")
             print("2. Manualmente")
@@ -180,14 +300,14 @@ class BattleshipClient:
             self.manual_placement_loop()
 
         print("\nPosicionamento finalizado. Aguardando o outro jogador...")
-        while self.running and self.game_state.get("game_phase") == "setup":
-            time.sleep(0.5)
+        self.wait_until(lambda: self.game_state.get("game_phase") != "setup")
 
     def manual_placement_loop(self):
         while (
             self.running and self.game_state and self.game_state.get("ships_to_place")
         ):
-            self.display_placement_board()
+            with self.lock:
+                self.display_placement_board()
             ship_to_place = self.game_state["ships_to_place"][0]
             print(f"\nPosicione o navio de tamanho {ship_to_place}.")
 
@@ -204,7 +324,8 @@ class BattleshipClient:
                         ">>> Orientação (H para horizontal, V para vertical): "
                     ).strip()
 
-                self.placement_update_received.clear()
+                with self.lock:
+                    self.placement_pending = True
                 self.send_message(
                     {
                         "type": "place_ship",
@@ -214,44 +335,77 @@ class BattleshipClient:
                         "direction": direction.upper(),
                     }
                 )
-                if not self.placement_update_received.wait(timeout=5):
-                    print("O servidor não respondeu. Verifique a conexão.")
+                if not self.wait_until(lambda: not self.placement_pending, timeout=5):
+                    self.notice = "O servidor não respondeu. Verifique a conexão."
             except (ValueError, IndexError):
-                print("Entrada inválida. Tente novamente.")
-                time.sleep(2)
+                self.notice = "Entrada inválida. Tente novamente."
 
     def handle_shooting_phase(self):
-        while self.running and self.game_state and not self.game_state.get("game_over"):
-            if self.game_state.get("current_turn"):
-                try:
-                    user_input = (
-                        input(
-                            "\n>>> Digite as coordenadas para atirar (linha coluna) ou 'sair': "
-                        )
-                        .strip()
-                        .lower()
+        while True:
+            # Acorda quando o turno chega ou o jogo acaba, sem consultar periodicamente.
+            self.wait_until(
+                lambda: self.game_state.get("current_turn") or self.game_state.get("game_over")
+            )
+            if not self.running or self.game_state.get("game_over"):
+                break
+            if self.salvo:
+                if not self.fire_salvo():
+                    break
+                continue
+            try:
+                user_input = (
+                    input(
+                        "\n>>> Digite as coordenadas para atirar (linha coluna) ou 'sair': "
                     )
-                    if user_input == "sair":
-                        break
-                    coords = user_input.split()
-                    row, col = int(coords[0]), int(coords[1])
-                    if 0 <= row < 10 and 0 <= col < 10:
-                        self.send_message({"type": "shot", "row": row, "col": col})
-                        with self.lock:
-                            self.game_state["current_turn"] = False
-                    else:
-                        print("Coordenadas devem estar entre 0 e 9.")
-                except (ValueError, IndexError):
-                    print("Entrada inválida. Use o formato: linha coluna (ex: '3 4')")
-            else:
-                time.sleep(0.1)
+                    .strip()
+                    .lower()
+                )
+                if user_input == "sair":
+                    break
+                coords = user_input.split()
+                row, col = int(coords[0]), int(coords[1])
+                if 0 <= row < self.board_size and 0 <= col < self.board_size:
+                    with self.lock:
+                        self.game_state["current_turn"] = False
+                    self.send_message({"type": "shot", "row": row, "col": col})
+                else:
+                    print(f"Coordenadas devem estar entre 0 e {self.board_size - 1}.")
+            except (ValueError, IndexError):
+                print("Entrada inválida. Use o formato: linha coluna (ex: '3 4')")
+
+    def fire_salvo(self):
+        # Todos os tiros do turno numa linha só: "linha coluna linha coluna ...".
+        count = self.game_state.get("shots_per_turn", 1)
+        user_input = input(
+            f"\n>>> Digite {count} coordenadas (linha coluna ...) ou 'sair': "
+        ).strip().lower()
+        if user_input == "sair":
+            return False
+        try:
+            values = [int(value) for value in user_input.split()]
+        except ValueError:
+            values = []
+        shots = [values[i:i + 2] for i in range(0, len(values), 2)]
+        if not shots or len(values) % 2 or len(shots) > count:
+            print(f"Entrada inválida. Informe até {count} pares linha coluna (ex: '3 4 5 6').")
+        elif not all(0 <= v < self.board_size for v in values):
+            print(f"Coordenadas devem estar entre 0 e {self.board_size - 1}.")
+        else:
+            with self.lock:
+                self.game_state["current_turn"] = False
+            self.send_message({"type": "salvo", "shots": shots})
+        return True
 
     def play_game(self):
         if not self.connect_to_server():
             return
-        if not self.connection_established.wait(timeout=10):
+        if not self.wait_until(lambda: self.welcomed, timeout=10):
             print("Não foi possível estabelecer a comunicação com o servidor.")
-            self.running = False
+        elif self.spectate is not None:
+            try:
+                self.wait_until(lambda: False)
+            except KeyboardInterrupt:
+                pass
         else:
             self.handle_placement_phase()
             if self.running:
@@ -263,5 +417,17 @@ class BattleshipClient:
 
 
 if __name__ == "__main__":
-    client = BattleshipClient()
+    parser = argparse.ArgumentParser(description="Cliente de Batalha Naval")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--ai", action="store_true", help="jogar contra a IA do servidor")
+    parser.add_argument(
+        "--spectate", nargs="?", const="", default=None, metavar="SALA",
+        help="assistir a uma partida (sem SALA, a partida em destaque)",
+    )
+    args = parser.parse_args()
+
+    client = BattleshipClient(
+        args.host, args.port, opponent="ai" if args.ai else "human", spectate=args.spectate
+    )
     client.play_game()
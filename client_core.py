@@ -0,0 +1,218 @@
+from protocol import board_from_snapshot, encode_message
+
+
+class ClientCore:
+    # Lado do cliente do protocolo, sem rede nem interface: negocia a
+    # codificação, mantém o estado da partida (snapshots, deltas com resync e
+    # a vista de espectador) e avisa a subclasse pelos métodos on_*, assim que
+    # cada mensagem chega. BattleshipClient (terminal) e BotClient (asyncio,
+    # sem interface) só implementam write() e as reações. Logo depois de
+    # conectar, a subclasse chama hello(), que envia antes do welcome a
+    # escolha do oponente (o servidor a usa para decidir a sala) ou, ao
+    # retomar a partida, o reconnect.
+    #
+    # O welcome traz um token de sessão. Se a conexão cair no meio da
+    # partida, a subclasse abre outra e chama start_resume() e hello(): o
+    # servidor devolve a vaga antiga com um welcome "resumed" e um único
+    # game_state. Um welcome comum (servidor que sentou a conexão antes) é
+    # respondido com outro reconnect.
+    #
+    # No modo salvo (anunciado no welcome) os tiros de um turno vão num único
+    # {"type": "salvo"} e voltam num único salvo_result; game_state traz
+    # shots_per_turn, descontado aqui a cada navio nosso afundado.
+    def __init__(self, encoding="binary", opponent="human", spectate=None):
+        self.encoding = encoding  # Preferência; só vale se o servidor anunciar suporte
+        self.opponent = opponent  # "human" ou "ai" (jogar contra a IA do servidor)
+        # Assistir em vez de jogar: "" para a partida em destaque ou o id de uma sala.
+        self.spectate = spectate
+        self.binary = False
+        self.player_id = None
+        self.board_size = 10
+        self.salvo = False
+        self.game_state = None
+        self.spectator_state = None
+        self.resync_requested = False
+        self.session = None  # Token de sessão do último welcome
+        self.resuming = False
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def send_message(self, message):
+        self.write(encode_message(message, self.binary))
+
+    def hello(self):
+        if self.resuming:
+            self.send_message({"type": "reconnect", "session": self.session})
+        elif self.spectate is None:
+            self.send_message({"type": "opponent", "opponent": self.opponent})
+
+    def can_resume(self):
+        return (
+            self.session is not None and self.spectate is None and self.game_state is not None
+            and self.game_state.get("game_phase") == "playing"
+        )
+
+    def start_resume(self):
+        # Chamado com a conexão nova já aberta, antes de ler dela.
+        self.resuming = True
+        self.binary = False
+        self.resync_requested = False
+
+    def handle_server_message(self, message):
+        msg_type = message.get("type")
+
+        if msg_type == "welcome":
+            if self.resuming and not message.get("resumed"):
+                self.send_message({"type": "reconnect", "session": self.session})
+                return
+            self.player_id = message.get("player_id")  # Espectadores não têm id
+            self.session = message.get("session")
+            self.board_size = message.get("board_size", self.board_size)
+            self.salvo = message.get("salvo", False)
+            if self.game_state is None:
+                self.game_state = {
+                    "your_board": [["~"] * self.board_size for _ in range(self.board_size)],
+                    "ships_to_place": message.get("ships_to_place", []),
+                    "game_phase": "setup",
+                }
+            if self.encoding == "binary" and "binary" in message.get("encodings", []):
+                self.send_message({"type": "encoding", "encoding": "binary"})
+                self.binary = True
+            if self.resuming:
+                self.resuming = False
+                self.on_resumed(message)
+                return
+            if self.spectate is not None:
+                request = {"type": "spectate"}
+                if self.spectate:
+                    request["room"] = self.spectate
+                self.send_message(request)
+            self.on_welcome(message)
+
+        elif msg_type == "placement_ok":
+            self.game_state["your_board"] = board_from_snapshot(message["board"], self.board_size)
+            self.game_state["ships_to_place"] = message["ships_left"]
+            self.on_placement()
+
+        elif msg_type == "game_start":
+            self.on_game_start(message)
+
+        elif msg_type == "spectator_state":
+            state = message["state"]
+            for player_id, board in state["boards"].items():
+                state["boards"][player_id] = board_from_snapshot(board, state["board_size"])
+            state["room"] = message["room"]
+            self.spectator_state = state
+            self.on_spectator_update(None)
+
+        elif msg_type == "shot_result" and self.spectate is not None:
+            if self.spectator_state is not None:
+                self.apply_spectated_shot(message)
+                self.on_spectator_update(message)
+
+        elif msg_type == "shot_result":
+            self.on_shot_result(message)
+
+        elif msg_type == "salvo_result" and self.spectate is not None:
+            if self.spectator_state is not None:
+                state = self.spectator_state
+                for row, col, result, _ in message["shots"]:
+                    shot = {"shooter": message["shooter"], "row": row, "col": col, "result": result}
+                    self.apply_spectated_shot(shot)
+                if state.get("salvo") and not state["game_over"]:
+                    # No modo salvo a vez sempre passa, com ou sem erro.
+                    state["current_turn"] = "player_2" if (
+                        message["shooter"] == "player_1"
+                    ) else "player_1"
+                self.on_spectator_update(message)
+
+        elif msg_type == "salvo_result":
+            if message["shooter"] != self.player_id and "shots_per_turn" in self.game_state:
+                sunk = sum(1 for shot in message["shots"] if shot[3])
+                self.game_state["shots_per_turn"] -= sunk
+            self.on_salvo_result(message)
+
+        elif msg_type == "game_state":
+            state = message["state"]
+            for field in ("your_board", "your_shots"):
+                state[field] = board_from_snapshot(state[field], self.board_size)
+            self.game_state.update(state)
+            self.resync_requested = False
+            self.on_state_changed()
+
+        elif msg_type == "state_delta":
+            delta = message["delta"]
+            if delta["seq"] != self.game_state.get("seq", 0) + 1:
+                # Perdemos uma versão: pede o estado completo uma única vez.
+                if not self.resync_requested:
+                    self.resync_requested = True
+                    self.send_message({"type": "resync"})
+                return
+            for row, col, value in delta.get("board", []):
+                self.game_state["your_board"][row][col] = value
+            for row, col, value in delta.get("shots", []):
+                self.game_state["your_shots"][row][col] = value
+            self.game_state["seq"] = delta["seq"]
+            self.game_state["current_turn"] = delta["current_turn"]
+            self.game_state["game_phase"] = delta["game_phase"]
+            self.game_state["game_over"] = delta["game_over"]
+            self.on_state_changed()
+
+        elif msg_type == "ping":
+            self.send_message({"type": "pong"})
+
+        elif msg_type == "opponent_status":
+            self.on_opponent_status(message)
+
+        elif msg_type == "error":
+            if self.resuming:
+                self.resuming = False
+                self.on_resume_failed(message)
+                return
+            self.on_error(message)
+
+    def apply_spectated_shot(self, message):
+        # Entre dois spectator_state, o espectador atualiza a vista com os tiros.
+        state = self.spectator_state
+        shooter, result = message["shooter"], message["result"]
+        target = "player_2" if shooter == "player_1" else "player_1"
+        state["boards"][target][message["row"]][message["col"]] = "O" if result == "miss" else "X"
+        if result == "miss":
+            state["current_turn"] = target
+        elif result == "hit_win":
+            state["game_phase"] = "game_over"
+            state["game_over"] = True
+
+    def on_welcome(self, message):
+        pass
+
+    def on_resumed(self, message):
+        pass
+
+    def on_resume_failed(self, message):
+        pass
+
+    def on_opponent_status(self, message):
+        pass
+
+    def on_placement(self):
+        pass
+
+    def on_game_start(self, message):
+        pass
+
+    def on_shot_result(self, message):
+        pass
+
+    def on_salvo_result(self, message):
+        pass
+
+    def on_state_changed(self):
+        pass
+
+    def on_spectator_update(self, shot):
+        pass
+
+    def on_error(self, message):
+        pass
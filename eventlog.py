@@ -0,0 +1,346 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from game import BattleshipGame
+from protocol import PHASES, RESULTS
+
+# Registro binário só de acréscimo com os eventos de cada sala. Cada registro
+# tem um cabeçalho fixo, o id da sala em UTF-8 e um corpo que depende do tipo.
+# Um processo que morre no meio de uma escrita deixa no máximo um registro
+# truncado no final, que a leitura ignora.
+#
+# A cada SNAPSHOT_EVERY tiros a sala grava um snapshot compacto (posições dos
+# navios e tiros de cada jogador); ao recuperar, um snapshot substitui todo o
+# histórico anterior daquela sala. O snapshot também leva os tokens de sessão
+# dos jogadores, para que só eles retomem as vagas depois de um reinício.
+
+RECORD_HEADER = struct.Struct(">BHI")  # tipo, tamanho do id da sala, tamanho do corpo
+
+EVENT_ROOM = 1  # Sala criada: tamanho do tabuleiro e frota
+EVENT_JOIN = 2
+EVENT_LEAVE = 3
+EVENT_PLACE = 4
+EVENT_PHASE = 5
+EVENT_SHOT = 6
+EVENT_SNAPSHOT = 7
+EVENT_CLOSE = 8  # Sala encerrada pelo servidor
+EVENT_SALVO = 9  # Vários tiros de uma mensagem "salvo"
+
+EVENT_STRUCTS = {
+    EVENT_JOIN: struct.Struct(">BB"),  # número do jogador, 1 se for a IA
+    EVENT_LEAVE: struct.Struct(">B"),  # número do jogador
+    EVENT_PLACE: struct.Struct(">BHHHB"),  # jogador, linha, coluna, tamanho, direção (ASCII)
+    EVENT_PHASE: struct.Struct(">BB"),  # fase, jogador da vez (0 = nenhum)
+    EVENT_SHOT: struct.Struct(">BHHB"),  # atirador, linha, coluna, resultado
+    EVENT_CLOSE: struct.Struct(""),
+}
+
+ROOM_HEADER = struct.Struct(">HH")  # tamanho do tabuleiro, número de navios
+ROOM_FLAGS = struct.Struct(">B")  # Depois dos navios; ausente em logs antigos
+ROOM_SALVO = 1
+SNAPSHOT_HEADER = struct.Struct(">BBB")  # fase, jogador da vez, número de jogadores
+SNAPSHOT_PLAYER = struct.Struct(">BBBHII")  # número, IA, pronto, navios a posicionar, navios, tiros
+PLACEMENT = struct.Struct(">HHHB")
+SHOT_CELL = struct.Struct(">HHB")  # linha, coluna, 1 se acertou
+# Depois dos jogadores, um token de sessão (tamanho + UTF-8, vazio se não há)
+# por jogador, na mesma ordem; ausentes em logs antigos.
+SALVO_HEADER = struct.Struct(">BH")  # atirador, número de tiros
+SALVO_SHOT = struct.Struct(">HHB")  # linha, coluna, resultado
+LENGTH = struct.Struct(">H")
+
+SNAPSHOT_EVERY = 128
+
+
+def player_number(player_id):
+    return int(player_id.rsplit("_", 1)[1]) if player_id else 0
+
+
+def player_name(number):
+    return f"player_{number}" if number else None
+
+
+class EventLog:
+    # Os registros se acumulam num buffer e vão para o arquivo num único
+    # write() quando o buffer passa de batch_size ou, no máximo, a cada
+    # flush_interval segundos (thread em segundo plano). Uma queda do processo
+    # perde só o que ainda estava no buffer.
+    def __init__(self, path, batch_size=64 * 1024, flush_interval=0.2, fsync=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.closed = False
+        if flush_interval:
+            threading.Thread(target=self.flush_periodically, args=(flush_interval,), daemon=True).start()
+
+    def append(self, kind, room_id, *fields):
+        self.write_record(kind, room_id, EVENT_STRUCTS[kind].pack(*fields))
+
+    def write_record(self, kind, room_id, body):
+        room = str(room_id).encode()
+        with self.lock:
+            self.buffer += RECORD_HEADER.pack(kind, len(room), len(body))
+            self.buffer += room
+            self.buffer += body
+            if len(self.buffer) >= self.batch_size:
+                self.flush_locked()
+
+    def room_created(self, room_id, game):
+        body = ROOM_HEADER.pack(game.board_size, len(game.ships))
+        body += b"".join(LENGTH.pack(length) for length in game.ships)
+        body += ROOM_FLAGS.pack(ROOM_SALVO if game.salvo else 0)
+        self.write_record(EVENT_ROOM, room_id, body)
+
+    def salvo(self, room_id, player_number, results):
+        body = [SALVO_HEADER.pack(player_number, len(results))]
+        body.extend(
+            SALVO_SHOT.pack(row, col, RESULTS.index(result)) for row, col, result in results
+        )
+        self.write_record(EVENT_SALVO, room_id, b"".join(body))
+
+    def snapshot(self, room_id, game, ai_players=(), sessions=None):
+        self.write_record(EVENT_SNAPSHOT, room_id, encode_snapshot(game, ai_players, sessions))
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self.buffer and not self.closed:
+            os.write(self.fd, self.buffer)
+            if self.fsync:
+                os.fsync(self.fd)
+            self.buffer.clear()
+
+    def flush_periodically(self, interval):
+        while not self.closed:
+            time.sleep(interval)
+            self.flush()
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            self.closed = True
+            os.close(self.fd)
+
+
+def encode_snapshot(game, ai_players=(), sessions=None):
+    parts = [
+        SNAPSHOT_HEADER.pack(
+            PHASES.index(game.game_phase), player_number(game.current_turn), len(game.players)
+        )
+    ]
+    for player_id, player in game.players.items():
+        shots = player["shots_made"]
+        cells = [(cell, 1) for cell in shots.hit_cells()] + [(cell, 0) for cell in shots.miss_cells()]
+        parts.append(
+            SNAPSHOT_PLAYER.pack(
+                player_number(player_id),
+                player_id in ai_players,
+                player["ready"],
+                len(player["ships_to_place"]),
+                len(player["board"].placements),
+                len(cells),
+            )
+        )
+        parts.extend(LENGTH.pack(length) for length in player["ships_to_place"])
+        for row, col, length, direction in player["board"].placements:
+            parts.append(PLACEMENT.pack(row, col, length, ord(direction)))
+        for (row, col), hit in cells:
+            parts.append(SHOT_CELL.pack(row, col, hit))
+    for player_id in game.players:
+        token = (sessions or {}).get(player_id, "").encode()
+        parts.append(LENGTH.pack(len(token)) + token)
+    return b"".join(parts)
+
+
+def decode_snapshot(body, game):
+    # Recria o estado da partida em `game` (recém-criado) e devolve os ids da IA
+    # e os tokens de sessão por player_id.
+    phase, turn, count = SNAPSHOT_HEADER.unpack_from(body, 0)
+    offset = SNAPSHOT_HEADER.size
+    ai_players = set()
+    shots = []
+    for _ in range(count):
+        number, ai, ready, to_place, placed, shot_count = SNAPSHOT_PLAYER.unpack_from(body, offset)
+        offset += SNAPSHOT_PLAYER.size
+        player_id = player_name(number)
+        game.add_player(player_id)
+        player = game.players[player_id]
+        player["ready"] = bool(ready)
+        if ai:
+            ai_players.add(player_id)
+        player["ships_to_place"] = [
+            LENGTH.unpack_from(body, offset + i * LENGTH.size)[0] for i in range(to_place)
+        ]
+        offset += to_place * LENGTH.size
+        for _ in range(placed):
+            row, col, length, direction = PLACEMENT.unpack_from(body, offset)
+            offset += PLACEMENT.size
+            game.place_ship(player["board"], row, col, length, chr(direction))
+        for _ in range(shot_count):
+            shots.append((player_id, *SHOT_CELL.unpack_from(body, offset)))
+            offset += SHOT_CELL.size
+
+    # Os tiros só podem ser aplicados depois que as duas frotas existem.
+    for player_id, row, col, hit in shots:
+        target_id = game.opponents[player_id]
+        game.players[player_id]["shots_made"].record_shot(row, col, bool(hit))
+        if hit:
+            game.players[target_id]["board"].receive_shot(row, col)
+    game.game_phase = PHASES[phase]
+    game.game_over = game.game_phase == "game_over"
+    game.current_turn = player_name(turn)
+
+    sessions = {}
+    if offset < len(body):
+        for player_id in game.players:
+            (length,) = LENGTH.unpack_from(body, offset)
+            offset += LENGTH.size
+            if length:
+                sessions[player_id] = bytes(body[offset:offset + length]).decode()
+            offset += length
+    return ai_players, sessions
+
+
+def read_events(path):
+    # Percorre o arquivo mapeado em memória sem carregá-lo inteiro. Gera
+    # (tipo, id da sala, campos); para snapshots e criação de sala, os campos
+    # são o corpo em bytes.
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            end = len(data)
+            while offset + RECORD_HEADER.size <= end:
+                kind, room_length, body_length = RECORD_HEADER.unpack_from(data, offset)
+                start = offset + RECORD_HEADER.size
+                body_start = start + room_length
+                next_offset = body_start + body_length
+                if next_offset > end:
+                    break  # Registro truncado por uma queda durante a escrita
+                room_id = data[start:body_start].decode()
+                if kind in EVENT_STRUCTS:
+                    fields = EVENT_STRUCTS[kind].unpack_from(data, body_start)
+                else:
+                    fields = data[body_start:next_offset]
+                yield kind, room_id, fields
+                offset = next_offset
+
+
+class LogReplayer:
+    # Reconstrói as partidas aplicando os eventos em ordem. Os tiros passam por
+    # BattleshipGame.make_shot, e um resultado diferente do registrado conta
+    # como divergência.
+    def __init__(self, use_snapshots=True):
+        self.use_snapshots = use_snapshots
+        self.rooms = {}  # (arquivo, id da sala) -> {"game", "ai_players", "sessions"}
+        self.finished = []  # Salas encerradas, na ordem em que terminaram
+        self.shots = 0
+        self.mismatches = 0
+
+    def replay(self, path):
+        # Os ids de sala recomeçam a cada execução do servidor.
+        for kind, room_id, fields in read_events(path):
+            self.apply(kind, (path, room_id), fields)
+        return self
+
+    def apply(self, kind, room_id, fields):
+        if kind == EVENT_ROOM:
+            board_size, count = ROOM_HEADER.unpack_from(fields, 0)
+            ships = [
+                LENGTH.unpack_from(fields, ROOM_HEADER.size + i * LENGTH.size)[0]
+                for i in range(count)
+            ]
+            flags_offset = ROOM_HEADER.size + count * LENGTH.size
+            flags = 0
+            if len(fields) > flags_offset:
+                flags = ROOM_FLAGS.unpack_from(fields, flags_offset)[0]
+            game = BattleshipGame(board_size, ships, salvo=bool(flags & ROOM_SALVO))
+            self.rooms[room_id] = {"game": game, "ai_players": set(), "sessions": {}}
+            return
+
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        game = room["game"]
+
+        if kind == EVENT_SNAPSHOT:
+            # Uma sala recuperada começa o log novo por um snapshot. Os tokens
+            # de sessão valem mesmo quando o estado vem dos eventos.
+            fresh = BattleshipGame(game.board_size, game.ships, salvo=game.salvo)
+            ai_players, room["sessions"] = decode_snapshot(fields, fresh)
+            if self.use_snapshots or not game.players:
+                room["ai_players"] = ai_players
+                room["game"] = fresh
+        elif kind == EVENT_JOIN:
+            number, ai = fields
+            game.add_player(player_name(number))
+            if ai:
+                room["ai_players"].add(player_name(number))
+        elif kind == EVENT_LEAVE:
+            # Depois do início a partida termina (um EVENT_PHASE vem em
+            # seguida); o jogador fica para que a partida possa ser analisada.
+            if game.game_phase == "setup":
+                player_id = player_name(fields[0])
+                if player_id in game.players:
+                    game.remove_player(player_id)
+                room["ai_players"].discard(player_id)
+                room["sessions"].pop(player_id, None)
+        elif kind == EVENT_PLACE:
+            number, row, col, length, direction = fields
+            player = game.players[player_name(number)]
+            game.place_ship(player["board"], row, col, length, chr(direction))
+            player["ships_to_place"].remove(length)
+            player["ready"] = not player["ships_to_place"]
+        elif kind == EVENT_PHASE:
+            phase, turn = fields
+            game.game_phase = PHASES[phase]
+            game.game_over = game.game_phase == "game_over"
+            game.current_turn = player_name(turn)
+        elif kind == EVENT_SHOT:
+            number, row, col, result = fields
+            success, outcome = game.make_shot(player_name(number), row, col)
+            self.shots += 1
+            if not success or outcome != RESULTS[result]:
+                self.mismatches += 1
+        elif kind == EVENT_SALVO:
+            number, count = SALVO_HEADER.unpack_from(fields, 0)
+            recorded = [
+                (row, col, RESULTS[result])
+                for row, col, result in SALVO_SHOT.iter_unpack(fields[SALVO_HEADER.size:])
+            ]
+            success, outcome = game.make_salvo(
+                player_name(number), [(row, col) for row, col, _ in recorded]
+            )
+            self.shots += count
+            if not success or outcome != recorded:
+                self.mismatches += 1
+        elif kind == EVENT_CLOSE:
+            self.finished.append(self.rooms.pop(room_id))
+
+    def in_progress(self):
+        # Salas que estavam na fase de tiros quando o log parou. As que ainda
+        # estavam no posicionamento ficam de fora: quem cai nessa fase já sai
+        # da sala, e a sala recuperada só esperaria o SETUP_TIMEOUT.
+        return {
+            room_id: room
+            for room_id, room in self.rooms.items()
+            if room["game"].game_phase == "playing"
+        }
+
+
+def recover(path):
+    # Lê o log deixado por uma execução anterior e o arquiva com a data no
+    # nome; o servidor começa um log novo com um snapshot de cada sala
+    # recuperada. Devolve as salas com partida em andamento.
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+    replayer = LogReplayer().replay(path)
+    os.rename(path, path + time.strftime(".%Y%m%d-%H%M%S"))
+    return list(replayer.in_progress().values())
@@ -1,103 +1,693 @@
 import random
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def ship_mask(board_size, row, col, length, direction) -> int:
+    # Máscara de bits das casas ocupadas por um navio; 0 se ele não cabe no tabuleiro.
+    # A casa (linha, coluna) corresponde ao bit linha * board_size + coluna.
+    direction = direction.upper()
+    if row < 0 or col < 0 or length <= 0:
+        return 0
+    if direction == "H":
+        if row >= board_size or col + length > board_size:
+            return 0
+        return ((1 << length) - 1) << (row * board_size + col)
+    if direction == "V":
+        if col >= board_size or row + length > board_size:
+            return 0
+        column = 0
+        for i in range(length):
+            column |= 1 << (i * board_size)
+        return column << (row * board_size + col)
+    return 0
+
+
+@lru_cache(maxsize=64)
+def ship_segments(board_size, length) -> tuple[int, ...]:
+    # Todas as posições possíveis de um navio num tabuleiro vazio, como máscaras.
+    return tuple(
+        mask
+        for direction in ("H", "V")
+        for row in range(board_size)
+        for col in range(board_size)
+        if (mask := ship_mask(board_size, row, col, length, direction))
+    )
+
+
+def mask_placement(board_size, mask):
+    # (linha, coluna, tamanho, direção) do navio de uma máscara de ship_mask.
+    start = (mask & -mask).bit_length() - 1
+    length = mask.bit_count()
+    row, col = divmod(start, board_size)
+    direction = "H" if length == 1 or mask >> (start + 1) & 1 else "V"
+    return row, col, length, direction
+
+
+def ship_cells(board_size, row, col, length, direction):
+    # Índices (linha * board_size + coluna) das casas de um navio que cabe no tabuleiro.
+    start = row * board_size + col
+    step = 1 if direction.upper() == "H" else board_size
+    return range(start, start + length * step, step)
+
+
+class ShipRegistry:
+    # Os navios de um tabuleiro: casa -> id do navio (índice em placements),
+    # acertos que ainda faltam para afundar cada um e quantos seguem à tona.
+    # Um tiro sabe na hora se afundou um navio, e a vitória é um contador.
+    def __init__(self, size):
+        self.size = size
+        self.placements = []  # (linha, coluna, tamanho, direção) de cada navio
+        self.ship_at = {}
+        self.hits_left = []
+        self.ships_left = 0
+
+    def register(self, row, col, length, direction):
+        ship = len(self.placements)
+        self.placements.append((row, col, length, direction))
+        for cell in ship_cells(self.size, row, col, length, direction):
+            self.ship_at[cell] = ship
+        self.hits_left.append(length)
+        self.ships_left += 1
+
+    def hit_ship(self, ship):
+        # Só no primeiro acerto de cada casa.
+        self.hits_left[ship] -= 1
+        if not self.hits_left[ship]:
+            self.ships_left -= 1
+
+    def is_sunk(self, ship) -> bool:
+        return self.hits_left[ship] == 0
+
+    def all_sunk(self) -> bool:
+        return self.ships_left == 0
+
+
+class Bitboard(ShipRegistry):
+    # Tabuleiro como inteiros: um bit por casa para navios, acertos e erros.
+    # A forma em lista de strings só é montada em to_grid(), quando um cliente precisa.
+    def __init__(self, size):
+        super().__init__(size)
+        self.ships = 0
+        self.hits = 0
+        self.misses = 0
+
+    def to_grid(self) -> list[list[str]]:
+        grid = []
+        bit = 1
+        for _ in range(self.size):
+            row = []
+            for _ in range(self.size):
+                if self.hits & bit:
+                    row.append("X")
+                elif self.misses & bit:
+                    row.append("O")
+                elif self.ships & bit:
+                    row.append("S")
+                else:
+                    row.append("~")
+                bit <<= 1
+            grid.append(row)
+        return grid
+
+    def snapshot(self):
+        return self.to_grid()
+
+    def can_place(self, row, col, length, direction) -> bool:
+        mask = ship_mask(self.size, row, col, length, direction)
+        return mask != 0 and not self.ships & mask
+
+    def place(self, row, col, length, direction):
+        self.ships |= ship_mask(self.size, row, col, length, direction)
+        self.register(row, col, length, direction.upper())
+
+    def place_mask(self, mask):
+        # Posiciona um navio dado pela máscara, como as de generate_fleet.
+        self.ships |= mask
+        self.register(*mask_placement(self.size, mask))
+
+    def cells_of(self, mask):
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(divmod(low.bit_length() - 1, self.size))
+            mask ^= low
+        return cells
+
+    def hit_cells(self):
+        return self.cells_of(self.hits)
+
+    def miss_cells(self):
+        return self.cells_of(self.misses)
+
+    def is_shot(self, row, col) -> bool:
+        return bool((self.hits | self.misses) >> (row * self.size + col) & 1)
+
+    def receive_shot(self, row, col):
+        # Marca o acerto no tabuleiro do alvo (erros ficam só no do atirador) e
+        # devolve o id do navio atingido, ou None na água.
+        cell = row * self.size + col
+        ship = self.ship_at.get(cell)
+        if ship is not None and not self.hits >> cell & 1:
+            self.hits |= 1 << cell
+            self.hit_ship(ship)
+        return ship
+
+    def record_shot(self, row, col, hit):
+        bit = 1 << (row * self.size + col)
+        if hit:
+            self.hits |= bit
+        else:
+            self.misses |= bit
+
+
+class SparseBoard(ShipRegistry):
+    # Tabuleiro para partidas grandes (ex.: 1000x1000): só as casas com navio,
+    # acerto ou erro são guardadas, como índices linha * size + coluna em sets.
+    def __init__(self, size):
+        super().__init__(size)
+        self.ships = set()
+        self.hits = set()
+        self.misses = set()
+
+    def cells(self, row, col, length, direction):
+        direction = direction.upper()
+        if row < 0 or col < 0 or length <= 0:
+            return None
+        if direction == "H" and row < self.size and col + length <= self.size:
+            return ship_cells(self.size, row, col, length, direction)
+        if direction == "V" and col < self.size and row + length <= self.size:
+            return ship_cells(self.size, row, col, length, direction)
+        return None
+
+    def can_place(self, row, col, length, direction) -> bool:
+        cells = self.cells(row, col, length, direction)
+        return cells is not None and self.ships.isdisjoint(cells)
+
+    def place(self, row, col, length, direction):
+        self.ships.update(self.cells(row, col, length, direction))
+        self.register(row, col, length, direction.upper())
+
+    def is_shot(self, row, col) -> bool:
+        cell = row * self.size + col
+        return cell in self.hits or cell in self.misses
+
+    def receive_shot(self, row, col):
+        cell = row * self.size + col
+        ship = self.ship_at.get(cell)
+        if ship is not None and cell not in self.hits:
+            self.hits.add(cell)
+            self.hit_ship(ship)
+        return ship
+
+    def record_shot(self, row, col, hit):
+        (self.hits if hit else self.misses).add(row * self.size + col)
+
+    def hit_cells(self):
+        return [divmod(cell, self.size) for cell in self.hits]
+
+    def miss_cells(self):
+        return [divmod(cell, self.size) for cell in self.misses]
+
+    def snapshot(self):
+        # Em vez da grade completa, só as casas marcadas: {"S"|"X"|"O": [[linha, coluna], ...]}.
+        return {
+            value: [list(divmod(cell, self.size)) for cell in sorted(cells)]
+            for value, cells in (
+                ("S", self.ships - self.hits),
+                ("X", self.hits),
+                ("O", self.misses),
+            )
+        }
+
+    def to_grid(self) -> list[list[str]]:
+        grid = [["~"] * self.size for _ in range(self.size)]
+        for value, cells in self.snapshot().items():
+            for row, col in cells:
+                grid[row][col] = value
+        return grid
+
+
+# A partir deste tamanho os tabuleiros são SparseBoard em vez de Bitboard.
+SPARSE_BOARD_SIZE = 64
+# Até este tamanho um SparseBoard ainda recorre à busca completa de generate_fleet.
+FLEET_SEARCH_SIZE = 100
+# Chamadas de place(), além de uma por navio, que uma frota de generate_fleet
+# pode gastar antes de desistir.
+FLEET_SEARCH_BUDGET = 2000
+
+
+class SearchExhausted(Exception):
+    # A busca de fleet_sampler gastou o orçamento sem achar nem descartar a frota.
+    pass
+
+
+def packed_fleet(board_size, ships):
+    # Disposição fixa para frotas densas, sem busca: em ordem decrescente, cada
+    # navio vai deitado na primeira linha com espaço; os que sobram vão em pé
+    # nas casas livres à direita, da última coluna para a primeira. Devolve
+    # (linha, coluna, tamanho, direção) por navio, na ordem de ships, ou None.
+    order = sorted(range(len(ships)), key=lambda i: -ships[i])
+    fill = [0] * board_size  # Casas ocupadas no começo de cada linha
+    placements = [None] * len(ships)
+    left = []
+    for ship in order:
+        length = ships[ship]
+        row = next((row for row in range(board_size) if fill[row] + length <= board_size), None)
+        if row is None:
+            left.append(ship)
+            continue
+        placements[ship] = (row, fill[row], length, "H")
+        fill[row] += length
+
+    for col in range(board_size - 1, -1, -1):
+        row = 0
+        while left and row < board_size:
+            if fill[row] > col:
+                row += 1
+                continue
+            end = row
+            while end < board_size and fill[end] <= col:
+                end += 1
+            index = 0
+            while index < len(left) and row < end:
+                ship = left[index]
+                if ships[ship] <= end - row:
+                    placements[ship] = (row, col, ships[ship], "V")
+                    row += ships[ship]
+                    del left[index]
+                else:
+                    index += 1
+            row = end
+    if left:
+        return None
+    return placements
+
+
+@lru_cache(maxsize=16)
+def fleet_template(board_size, ships):
+    # Uma disposição da frota (tupla de tamanhos) no tabuleiro vazio, para
+    # quando o sorteio não acha nenhuma: packed_fleet, ou a busca de
+    # generate_fleet até FLEET_SEARCH_SIZE. Os servidores chamam na
+    # inicialização para recusar uma frota sem disposição conhecida.
+    placements = packed_fleet(board_size, ships)
+    if placements is None and board_size <= FLEET_SEARCH_SIZE:
+        game = BattleshipGame(board_size, ships, sparse=False)
+        fleet = game.generate_fleet(rng=random.Random(0))
+        if fleet is not None:
+            placements = [mask_placement(board_size, mask) for mask in fleet]
+    if placements is None:
+        raise ValueError("Não foi encontrada nenhuma disposição para a frota.")
+    return tuple(placements)
+
+
+def transform_fleet(board_size, placements, rng=random):
+    # Aplica às posições uma das 8 simetrias do tabuleiro, sorteada.
+    transpose, flip_rows, flip_cols = (rng.random() < 0.5 for _ in range(3))
+    result = []
+    for row, col, length, direction in placements:
+        if transpose:
+            row, col, direction = col, row, "V" if direction == "H" else "H"
+        if flip_rows:
+            row = board_size - 1 - row if direction == "H" else board_size - row - length
+        if flip_cols:
+            col = board_size - col - length if direction == "H" else board_size - 1 - col
+        result.append((row, col, length, direction))
+    return result
 
 
 class BattleshipGame:
-    def __init__(self):
-        self.board_size = 10
-        self.ships = [5, 4, 3, 3, 2]  # Tamanho dos navios
+    # Com salvo=True, cada turno é uma salva de até um tiro por navio ainda à
+    # tona do atirador, e o turno passa depois dela mesmo com acertos.
+    def __init__(self, board_size=10, ships=None, sparse=None, salvo=False):
+        if ships is None:
+            ships = [5, 4, 3, 3, 2]
+        if board_size <= 0 or board_size > 65535:
+            raise ValueError("O tabuleiro deve ter entre 1 e 65535 casas de lado.")
+        if not ships or min(ships) <= 0 or max(ships) > board_size:
+            raise ValueError("Cada navio deve caber no tabuleiro.")
+        if sum(ships) > board_size * board_size:
+            raise ValueError("A frota não cabe no tabuleiro.")
+        self.board_size = board_size
+        self.ships = list(ships)  # Tamanho dos navios
+        self.sparse = board_size >= SPARSE_BOARD_SIZE if sparse is None else sparse
+        self.salvo = salvo
         self.players = {}
+        self.opponents = {}  # player_id -> player_id do oponente
         self.current_turn = None
         self.game_phase = "setup"  # Fases: 'setup', 'playing', 'game_over'
         self.game_over = False
 
-    def create_empty_board(self) -> list[list[str]]:
-        return [["~" for _ in range(self.board_size)] for _ in range(self.board_size)]
+    def add_player(self, player_id):
+        self.players[player_id] = {
+            "board": self.create_empty_board(),
+            "shots_made": self.create_empty_board(),
+            "ready": False,
+            "ships_to_place": list(self.ships),
+            "seq": 0,  # Versão do estado enviado ao jogador
+            "changes": [],  # Casas alteradas desde o último envio: (campo, linha, coluna, valor)
+        }
+        for other in self.players:
+            if other != player_id:
+                self.opponents[player_id] = other
+                self.opponents[other] = player_id
+
+    def remove_player(self, player_id):
+        del self.players[player_id]
+        other = self.opponents.pop(player_id, None)
+        if other is not None:
+            del self.opponents[other]
+
+    def create_empty_board(self):
+        if self.sparse:
+            return SparseBoard(self.board_size)
+        return Bitboard(self.board_size)
 
     def is_valid_placement(self, board, row, col, length, direction) -> bool:
-        if direction.upper() == "H":
-            if col + length > self.board_size:
+        return board.can_place(row, col, length, direction)
+
+    def place_ship(self, board, row, col, length, direction):
+        board.place(row, col, length, direction)
+
+    def auto_place_ships(self, board, rng=random):
+        # Num tabuleiro vazio a frota sempre entra: se o sorteio falhar, usa
+        # fleet_template numa simetria sorteada.
+        if isinstance(board, SparseBoard):
+            return self.auto_place_sparse(board, rng)
+        fleet = self.generate_fleet(board.ships, rng)
+        if fleet is not None:
+            for mask in fleet:
+                board.place_mask(mask)
+            return True
+        return self.place_template(board, rng)
+
+    def place_template(self, board, rng=random):
+        # fleet_template só vale para o tabuleiro vazio.
+        if board.placements:
+            return False
+        try:
+            template = fleet_template(self.board_size, tuple(self.ships))
+        except ValueError:
+            return False
+        for row, col, length, direction in transform_fleet(self.board_size, template, rng):
+            board.place(row, col, length, direction)
+        return True
+
+    def auto_place_sparse(self, board, rng=random, restarts=3):
+        # Em tabuleiros grandes a frota ocupa uma fração pequena das casas e o
+        # sorteio simples de sparse_fleet quase sempre basta. Se ele falhar
+        # algumas vezes, tabuleiros até FLEET_SEARCH_SIZE usam a busca de
+        # generate_fleet, e por fim place_template. A frota entra inteira no
+        # tabuleiro ou não entra.
+        for _ in range(restarts):
+            placements = self.sparse_fleet(board.ships, rng)
+            if placements is not None:
+                break
+        else:
+            fleet = None
+            if self.board_size <= FLEET_SEARCH_SIZE:
+                occupied = sum(1 << cell for cell in board.ships)
+                fleet = self.generate_fleet(occupied, rng)
+            if fleet is None:
+                return self.place_template(board, rng)
+            placements = [mask_placement(self.board_size, mask) for mask in fleet]
+        for row, col, length, direction in placements:
+            board.place(row, col, length, direction)
+        return True
+
+    def sparse_fleet(self, occupied, rng=random, attempts=1000, scans=1):
+        # Sorteia posições e descarta as que colidem: uma escolha uniforme entre
+        # as livres sem enumerar o tabuleiro. Só um navio que esgota as
+        # tentativas percorre todas as posições livres, e uma frota que precisa
+        # de mais de scans percursos é densa demais para este sorteio. Sem
+        # retrocesso; devolve [(linha, coluna, tamanho, direção), ...] ou None.
+        size = self.board_size
+        taken = set(occupied)
+        placements = []
+        for length in sorted(self.ships, reverse=True):
+            for _ in range(attempts):
+                direction = rng.choice("HV")
+                if direction == "H":
+                    row, col = rng.randrange(size), rng.randrange(size - length + 1)
+                else:
+                    row, col = rng.randrange(size - length + 1), rng.randrange(size)
+                cells = ship_cells(size, row, col, length, direction)
+                if taken.isdisjoint(cells):
+                    break
+            else:
+                if not scans:
+                    return None
+                scans -= 1
+                free = [
+                    (row, col, direction)
+                    for direction in "HV"
+                    for row in range(size - (length - 1 if direction == "V" else 0))
+                    for col in range(size - (length - 1 if direction == "H" else 0))
+                    if taken.isdisjoint(ship_cells(size, row, col, length, direction))
+                ]
+                if not free:
+                    return None
+                row, col, direction = rng.choice(free)
+                cells = ship_cells(size, row, col, length, direction)
+            taken.update(cells)
+            placements.append((row, col, length, direction))
+        return placements
+
+    def generate_fleet(self, occupied=0, rng=random, budget=FLEET_SEARCH_BUDGET):
+        # Sorteia uma frota completa (uma máscara por navio, na ordem de
+        # self.ships) que não sobrepõe as casas em occupied. Cada navio é
+        # escolhido uniformemente entre as posições ainda livres; se um navio
+        # posterior ficar sem espaço, volta atrás e tenta outra posição. Retorna
+        # None quando não existe disposição válida ou a busca esgota budget.
+        # Usa máscaras de Bitboard; tabuleiros esparsos usam auto_place_sparse.
+        return self.fleet_sampler(occupied, budget=budget)(rng)
+
+    def generate_fleets(self, count, rng=random):
+        # Um só fleet_sampler para todas: a preparação e os estados sem saída
+        # já descobertos valem para as frotas seguintes.
+        sample = self.fleet_sampler(0)
+        return [sample(rng) for _ in range(count)]
+
+    def fleet_sampler(self, occupied=0, attempts=16, budget=FLEET_SEARCH_BUDGET, segments=None):
+        # Prepara a busca de generate_fleet e devolve uma função rng -> frota.
+        # segments ({tamanho: máscaras}) restringe as posições de cada navio.
+        #
+        # Navios maiores primeiro: têm menos posições e raramente forçam retrocesso.
+        order = sorted(range(len(self.ships)), key=lambda i: -self.ships[i])
+        lengths_left = [set(self.ships[i] for i in order[index:]) for index in range(len(order))]
+        cells_left = [sum(self.ships[i] for i in order[index:]) for index in range(len(order))]
+        # Navios do mesmo tamanho são intercambiáveis: o estado é só (índice,
+        # casas ocupadas), então um estado que já falhou não é explorado de novo.
+        dead_ends = set()
+        nodes = [0]  # Chamadas de place() na frota atual
+
+        def place(index, occupied, candidates, fleet, rng):
+            # candidates[tamanho] contém todas as posições livres, mas pode
+            # conter também posições que colidem com os navios já postos.
+            if index == len(order):
+                return True
+            nodes[0] += 1
+            if nodes[0] > budget + len(order):
+                # Exceção, e não False: os estados no caminho não viram dead_ends.
+                raise SearchExhausted
+            if (index, occupied) in dead_ends:
                 return False
-            for c in range(col, col + length):
-                if board[row][c] != "~":
+            ship = order[index]
+            options = candidates[self.ships[ship]]
+
+            # Caminho comum: sorteia até achar uma posição livre (uniforme entre
+            # as livres) sem filtrar nenhuma lista.
+            for _ in range(attempts):
+                mask = options[rng.randrange(len(options))]
+                if not mask & occupied:
+                    fleet[ship] = mask
+                    if place(index + 1, occupied | mask, candidates, fleet, rng):
+                        return True
+                    break
+
+            # Sem sorte ou sem saída: filtra as listas e tenta cada posição livre.
+            candidates = {
+                length: [mask for mask in candidates[length] if not mask & occupied]
+                for length in lengths_left[index]
+            }
+            for length in lengths_left[index]:
+                if not candidates[length]:
+                    dead_ends.add((index, occupied))
                     return False
-        elif direction.upper() == "V":
-            if row + length > self.board_size:
+            # Poda: as casas ainda cobertas por algum segmento livre precisam
+            # comportar todos os navios restantes.
+            usable = 0
+            for length in lengths_left[index]:
+                for mask in candidates[length]:
+                    usable |= mask
+            if usable.bit_count() < cells_left[index]:
+                dead_ends.add((index, occupied))
                 return False
-            for r in range(row, row + length):
-                if board[r][col] != "~":
-                    return False
-        else:
+
+            # Fisher-Yates preguiçoso sobre a lista recém-filtrada (já é uma
+            # cópia): o fim da lista guarda as posições já tentadas.
+            options = candidates[self.ships[ship]]
+            count = len(options)
+            while count:
+                pick = rng.randrange(count)
+                count -= 1
+                options[pick], options[count] = options[count], options[pick]
+                mask = options[count]
+                fleet[ship] = mask
+                if place(index + 1, occupied | mask, candidates, fleet, rng):
+                    return True
+
+            dead_ends.add((index, occupied))
             return False
-        return True
 
-    def place_ship(self, board, row, col, length, direction):
-        if direction.upper() == "H":
-            for c in range(col, col + length):
-                board[row][c] = "S"
-        else:
-            for r in range(row, row + length):
-                board[r][col] = "S"
-
-    def auto_place_ships(self, board):
-        for ship_length in self.ships:
-            placed = False
-            attempts = 0
-            while not placed and attempts < 100:
-                row = random.randint(0, self.board_size - 1)
-                col = random.randint(0, self.board_size - 1)
-                direction = random.choice(["H", "V"])
-
-                if self.is_valid_placement(board, row, col, ship_length, direction):
-                    self.place_ship(board, row, col, ship_length, direction)
-                    placed = True
-                attempts += 1
-        return placed
+        # As listas do tabuleiro vazio ficam em cache em ship_segments.
+        if segments is None:
+            segments = {
+                length: ship_segments(self.board_size, length) for length in set(self.ships)
+            }
+
+        def sample(rng=random):
+            fleet = [0] * len(self.ships)
+            nodes[0] = 0
+            try:
+                if place(0, occupied, segments, fleet, rng):
+                    return fleet
+            except (SearchExhausted, RecursionError):
+                # RecursionError: frotas com mais navios que o limite de recursão.
+                pass
+            return None
+
+        return sample
 
     def make_shot(self, player_id, target_row, target_col):
+        if self.salvo:
+            # No modo salvo, um tiro avulso é uma salva de um tiro só.
+            success, outcome = self.make_salvo(player_id, [(target_row, target_col)])
+            return success, outcome[0][2] if success else outcome
+
         if self.current_turn != player_id or self.game_phase != "playing":
             return False, "Não é seu turno ou o jogo não começou"
 
-        target_player_id = next(pid for pid in self.players if pid != player_id)
-        target_player = self.players[target_player_id]
+        target_player_id = self.opponents[player_id]
 
         if not (
             0 <= target_row < self.board_size and 0 <= target_col < self.board_size
         ):
             return False, "Coordenadas fora do tabuleiro."
 
-        if self.players[player_id]["shots_made"][target_row][target_col] != "~":
+        shots = self.players[player_id]["shots_made"]
+        if shots.is_shot(target_row, target_col):
             return False, "Já atirou nesta posição"
 
-        hit = target_player["board"][target_row][target_col] == "S"
+        result = self.fire(player_id, target_row, target_col)
+        if result == "miss":
+            self.current_turn = target_player_id
+        return True, result
 
-        if hit:
-            target_player["board"][target_row][target_col] = "X"
-            self.players[player_id]["shots_made"][target_row][target_col] = "X"
-            if self.check_win(target_player["board"]):
+    def make_salvo(self, player_id, cells):
+        # Vários tiros do mesmo jogador numa única chamada, todos validados
+        # antes do primeiro. No modo salvo são até salvo_size() tiros e o turno
+        # passa no fim; fora dele vale a regra normal: os tiros param no
+        # primeiro erro, que passa o turno, e os seguintes não são disparados.
+        # Devolve (True, [(linha, coluna, resultado), ...]) ou (False, erro).
+        if self.current_turn != player_id or self.game_phase != "playing":
+            return False, "Não é seu turno ou o jogo não começou"
+        if not cells:
+            return False, "A salva precisa de pelo menos um tiro."
+        if self.salvo and len(cells) > self.salvo_size(player_id):
+            return False, f"Neste turno você tem {self.salvo_size(player_id)} tiros."
+
+        shots = self.players[player_id]["shots_made"]
+        aimed = set()
+        for row, col in cells:
+            if not (0 <= row < self.board_size and 0 <= col < self.board_size):
+                return False, "Coordenadas fora do tabuleiro."
+            if shots.is_shot(row, col) or (row, col) in aimed:
+                return False, "Já atirou nesta posição"
+            aimed.add((row, col))
+
+        results = []
+        for row, col in cells:
+            result = self.fire(player_id, row, col)
+            results.append((row, col, result))
+            if result == "hit_win" or (result == "miss" and not self.salvo):
+                break
+        if (self.salvo or result == "miss") and not self.game_over:
+            self.current_turn = self.opponents[player_id]
+        return True, results
+
+    def salvo_size(self, player_id):
+        # Tiros por turno no modo salvo: um por navio ainda à tona.
+        return self.players[player_id]["board"].ships_left
+
+    def fire(self, player_id, target_row, target_col):
+        # Aplica um tiro já validado e devolve o resultado; não mexe no turno.
+        target_player = self.players[self.opponents[player_id]]
+        target_board = target_player["board"]
+        ship = target_board.receive_shot(target_row, target_col)
+        self.players[player_id]["shots_made"].record_shot(target_row, target_col, ship is not None)
+        if ship is not None:
+            target_player["changes"].append(("board", target_row, target_col, "X"))
+            self.players[player_id]["changes"].append(
+                ("shots", target_row, target_col, "X")
+            )
+            if self.check_win(target_board):
                 self.game_phase = "game_over"
                 self.game_over = True
-                return True, "hit_win"
-            return True, "hit"
-        else:
-            self.players[player_id]["shots_made"][target_row][target_col] = "O"
-            self.current_turn = target_player_id
-            return True, "miss"
+                return "hit_win"
+            if target_board.is_sunk(ship):
+                return "sunk"
+            return "hit"
+        self.players[player_id]["changes"].append(("shots", target_row, target_col, "O"))
+        return "miss"
 
     def check_win(self, board):
-        return not any("S" in row for row in board)
+        return board.all_sunk()
+
+    def sunk_ship(self, player_id, row, col):
+        # (linha, coluna, tamanho, direção) do navio inimigo na casa atingida.
+        board = self.players[self.opponents[player_id]]["board"]
+        return board.placements[board.ship_at[row * self.board_size + col]]
 
     def get_game_state(self, player_id):
         if player_id not in self.players:
             return None
 
-        return {
-            "your_board": self.players[player_id]["board"],
-            "your_shots": self.players[player_id]["shots_made"],
+        player = self.players[player_id]
+        player["seq"] += 1
+        player["changes"].clear()  # O snapshot já inclui as alterações pendentes
+        state = {
+            "seq": player["seq"],
+            "board_size": self.board_size,
+            "your_board": player["board"].snapshot(),
+            "your_shots": player["shots_made"].snapshot(),
+            "current_turn": self.current_turn == player_id,
+            "game_phase": self.game_phase,
+            "game_over": self.game_over,
+            "ships_to_place": player.get("ships_to_place", []),
+        }
+        if self.salvo:
+            state["shots_per_turn"] = self.salvo_size(player_id)
+        return state
+
+    def get_state_delta(self, player_id):
+        # Apenas as casas alteradas desde o último envio, mais os indicadores de
+        # turno e fase. O cliente aplica o delta se seq for a sua versão + 1.
+        if player_id not in self.players:
+            return None
+
+        player = self.players[player_id]
+        player["seq"] += 1
+        delta = {
+            "seq": player["seq"],
             "current_turn": self.current_turn == player_id,
             "game_phase": self.game_phase,
             "game_over": self.game_over,
-            "ships_to_place": self.players[player_id].get("ships_to_place", []),
         }
+        for field, row, col, value in player["changes"]:
+            delta.setdefault(field, []).append([row, col, value])
+        player["changes"].clear()
+        return delta
 
     def check_all_players_ready(self):
         if len(self.players) < 2:
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import sys
+import time
+from bot import BotClient, OpponentMismatch
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(host, port, games, concurrency, encoding, opponent="human", batch=1):
+    # Cada partida abre dois bots ao mesmo tempo; o servidor agrupa as conexões
+    # em salas pela ordem de chegada, então os bots de uma tarefa podem acabar
+    # em salas diferentes, mas o número total de partidas é o mesmo. Contra a
+    # IA cada partida tem um único bot; um bot que acaba diante do oponente
+    # errado conta em "mismatched".
+    players = 1 if opponent == "ai" else 2
+    slots = asyncio.Semaphore(concurrency)
+    bots = []
+    errors = 0
+    mismatched = 0
+
+    async def play():
+        nonlocal errors, mismatched
+        async with slots:
+            game_bots = [
+                BotClient(host, port, encoding, opponent=opponent, batch=batch)
+                for _ in range(players)
+            ]
+            bots.extend(game_bots)
+            results = await asyncio.gather(*(bot.run() for bot in game_bots), return_exceptions=True)
+            errors += sum(isinstance(result, Exception) for result in results)
+            mismatched += sum(isinstance(result, OpponentMismatch) for result in results)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play() for _ in range(games)))
+    elapsed = time.perf_counter() - start
+
+    finished = sum(bot.game_over for bot in bots) / players
+    messages = sum(bot.messages_in + bot.messages_out for bot in bots)
+    latencies = [latency for bot in bots for latency in bot.shot_latencies]
+    return {
+        "elapsed": elapsed,
+        "games": finished,
+        "errors": errors,
+        "mismatched": mismatched,
+        "games_per_sec": finished / elapsed,
+        "messages_per_sec": messages / elapsed,
+        "shots": len(latencies),  # Envios; com --batch, cada um leva vários tiros
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gerador de carga: N partidas de bots contra um servidor em execução"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--games", type=int, default=100, help="total de partidas")
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="partidas simultâneas"
+    )
+    parser.add_argument("--encoding", choices=["json", "binary"], default="binary")
+    parser.add_argument("--ai", action="store_true", help="cada bot joga contra a IA do servidor")
+    parser.add_argument(
+        "--batch", type=int, default=1, help="tiros por mensagem (salvas; ver bot.py)"
+    )
+    args = parser.parse_args()
+
+    stats = asyncio.run(
+        run_load(
+            args.host,
+            args.port,
+            args.games,
+            args.concurrency,
+            args.encoding,
+            "ai" if args.ai else "human",
+            args.batch,
+        )
+    )
+    print(f"Partidas concluídas: {stats['games']:.0f} em {stats['elapsed']:.2f}s ({stats['errors']} erros)")
+    print(f"Partidas/s:  {stats['games_per_sec']:.1f}")
+    print(f"Mensagens/s: {stats['messages_per_sec']:.0f}")
+    print(f"Latência do tiro ({stats['shots']} tiros): p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms")
+    if stats["mismatched"]:
+        sys.exit(f"ERRO: {stats['mismatched']} bots enfrentaram o oponente errado.")
@@ -0,0 +1,285 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from metrics import metrics
+from room import GameRoom, ProbabilityAI
+
+# Pareamento e ciclo de vida das salas, compartilhado pelos dois servidores.
+# Quem conecta ocupa a vaga da sala mais antiga à espera de um oponente ou abre
+# uma sala nova. A fila é um OrderedDict por id de sala: entrar, parear e sair
+# da fila (o jogador desistiu) custam O(1), sem varrer as salas.
+#
+# Cada sala tem uma única entrada num heap de prazos. reap() só olha as
+# entradas vencidas: se a sala teve atividade depois, a entrada volta para o
+# heap com o prazo novo; se não, a sala é encerrada. Salas descartadas saem de
+# todas as estruturas (a entrada no heap cai no próximo vencimento), então o
+# servidor pode ficar dias no ar sem acumular salas mortas.
+#
+# Quem cai no meio de uma partida não sai da sala: a vaga fica suspensa por
+# RECONNECT_GRACE segundos (um segundo heap guarda esses prazos) e pode ser
+# retomada com o token de sessão do welcome. check_heartbeats() manda pings aos
+# jogadores calados e derruba quem não responde, para que uma queda sem FIN
+# (cabo, NAT, notebook fechado) vire suspensão em segundos, não em minutos.
+#
+# As partidas recuperadas do log de eventos voltam com os tokens de sessão
+# gravados nos snapshots. As vagas delas só são retomadas por um reconnect com
+# o token do jogador; quem só conecta nunca cai numa partida alheia.
+#
+# O oponente é escolhido antes de sentar: o cliente manda
+# {"type": "opponent", "opponent": "ai" | "human"} logo ao conectar, antes do
+# welcome, e os servidores esperam essa mensagem por até HELLO_TIMEOUT
+# segundos (clientes que não a enviam jogam contra humanos). Quem pede a IA
+# ganha uma sala só sua, que nunca entra na fila de pareamento; se o servidor
+# não tem numpy, entra na fila como quem pediu um humano.
+
+SETUP_TIMEOUT = 300  # Segundos sem atividade no posicionamento
+IDLE_TIMEOUT = 600  # Segundos sem jogadas numa partida (ou depois do fim)
+REAP_INTERVAL = 5
+HEARTBEAT_INTERVAL = 10  # Segundos sem receber nada antes de um ping
+HEARTBEAT_TIMEOUT = 30  # Segundos sem receber nada antes de derrubar a conexão
+HELLO_TIMEOUT = 0.5  # Espera pela escolha do oponente antes de sentar o jogador
+
+
+class Lobby:
+    def __init__(
+        self, board_size=10, ships=None, event_log=None, room_ids=None,
+        setup_timeout=SETUP_TIMEOUT, idle_timeout=IDLE_TIMEOUT, salvo=False,
+    ):
+        self.board_size = board_size
+        self.ships = ships
+        self.salvo = salvo
+        self.event_log = event_log
+        self.room_ids = room_ids or itertools.count(1)
+        self.setup_timeout = setup_timeout
+        self.idle_timeout = idle_timeout
+        self.rooms = {}
+        self.waiting = OrderedDict()  # id -> sala em setup com uma vaga, por ordem de chegada
+        self.restored = {}  # Token de sessão -> sala recuperada do log (ids de sala novos)
+        self.deadlines = []  # Heap de (prazo, sequência, sala)
+        self.grace = []  # Heap de (prazo, sequência, sala, player_id) das vagas suspensas
+        self.sequence = itertools.count()  # Desempata prazos iguais sem comparar salas
+        self.players = 0
+        # Protege as estruturas acima. Pode ser tomado antes do lock de uma
+        # sala, nunca depois.
+        self.lock = threading.Lock()
+
+    def register(self, room):
+        self.rooms[room.room_id] = room
+        self.schedule(room, self.deadline(room))
+
+    def schedule(self, room, deadline):
+        heapq.heappush(self.deadlines, (deadline, next(self.sequence), room))
+
+    def deadline(self, room):
+        timeout = self.setup_timeout if room.game.game_phase == "setup" else self.idle_timeout
+        return room.last_activity + timeout
+
+    def resume(self, recovered):
+        # As partidas recuperadas recebem ids novos, então o id de sala dos
+        # tokens antigos não as acha mais: reconnect() procura esses tokens em
+        # self.restored.
+        with self.lock:
+            for saved in recovered:
+                room = GameRoom(
+                    next(self.room_ids), event_log=self.event_log,
+                    game=saved["game"], ai_players=saved["ai_players"], sessions=saved["sessions"],
+                )
+                self.register(room)
+                for token in room.sessions.values():
+                    self.restored[token] = room
+
+    def join(self, connect, opponent="human"):
+        # Senta um jogador e devolve (sala, player_id). `connect(sala, player_id)`
+        # devolve a conexão do jogador; ela entra na sala ainda sob o lock do
+        # lobby, para que a sala não seja descartada entre a escolha e a entrada.
+        # Sem numpy não há IA: o jogador vai para a fila de humanos e é avisado.
+        no_ai = opponent == "ai" and ProbabilityAI is None
+        if no_ai:
+            opponent = "human"
+        with self.lock:
+            if opponent == "ai":
+                room, player_id = self.new_room(), "player_1"
+            else:
+                room, player_id = self.find_seat()
+            room.last_activity = time.monotonic()
+            with room.lock:
+                room.add_player(player_id, connect(room, player_id))
+                if opponent == "ai":
+                    room.add_ai_player(player_id)
+                elif no_ai:
+                    room.send_error(
+                        player_id, "IA indisponível: o servidor precisa do numpy. "
+                        "Aguardando um oponente humano.",
+                    )
+            self.players += 1
+            return room, player_id
+
+    def has_waiting(self):
+        # Alguma sala da fila ainda espera um oponente? (Com workers, o
+        # aceitador manda os próximos jogadores para quem responde que sim.)
+        with self.lock:
+            return any(
+                room.game.game_phase == "setup" and len(room.game.players) < 2
+                for room in self.waiting.values()
+            )
+
+    def new_room(self):
+        room = GameRoom(
+            next(self.room_ids), self.board_size, self.ships, self.event_log, salvo=self.salvo
+        )
+        self.register(room)
+        return room
+
+    def find_seat(self):
+        while self.waiting:
+            # Uma sala da fila pode ter lotado com a IA enquanto esperava.
+            _, room = self.waiting.popitem(last=False)
+            if room.game.game_phase == "setup" and len(room.game.players) < 2:
+                break
+        else:
+            room = self.new_room()
+            self.waiting[room.room_id] = room
+
+        player_id = next(pid for pid in ("player_1", "player_2") if pid not in room.game.players)
+        return room, player_id
+
+    def leave(self, room, player_id, connection):
+        # A conexão de um jogador caiu. Na partida em andamento a vaga fica
+        # suspensa; fora dela o jogador sai. Se a sala ficou vazia, ela é
+        # descartada e encerrada; devolve os espectadores que estavam nela.
+        with self.lock:
+            self.players -= 1
+            with room.lock:
+                deadline = room.connection_lost(player_id, connection)
+            if deadline is not None:
+                heapq.heappush(self.grace, (deadline, next(self.sequence), room, player_id))
+            return self.release_locked(room)
+
+    def discard(self, room):
+        del self.rooms[room.room_id]
+        self.waiting.pop(room.room_id, None)
+        for token in room.sessions.values():
+            self.restored.pop(token, None)
+
+    def release_locked(self, room):
+        if self.rooms.get(room.room_id) is not room:
+            return []  # Já encerrada por reap()
+        if not room.clients and not room.suspended:
+            self.discard(room)
+            return room.close()
+        if room.game.game_phase == "setup" and not room.ai_players:
+            # O oponente saiu antes do jogo começar: a vaga volta para a fila.
+            self.waiting[room.room_id] = room
+        return []
+
+    def reconnect(self, token, connect, room=None, player_id=None):
+        # Move para a vaga suspensa do token uma conexão que acabou de ser
+        # sentada por join() em (room, player_id), ou que ainda não foi
+        # sentada. Uma conexão antiga da mesma vaga que ainda não caiu
+        # (meio aberta) é derrubada. Devolve (sala, player_id) e os
+        # espectadores a realocar, ou (None, espectadores) se o token não vale.
+        token = str(token)
+        room_id, _, _ = token.rpartition("/")
+        spectators = []
+        with self.lock:
+            old_id = None
+            for target in (
+                self.rooms.get(int(room_id) if room_id.isdigit() else room_id),
+                self.restored.get(token),
+            ):
+                if target is not None:
+                    with target.lock:
+                        old_id = target.session_player(token)
+                    if old_id is not None:
+                        break
+            if old_id is None:
+                return None, spectators
+            if room is not None:
+                self.players -= 1
+                spectators = self.unseat(room, player_id)
+            with target.lock:
+                old = target.clients.pop(old_id, None)
+                if old is not None:
+                    old.abort()  # A saída dela em leave() não mexe mais na vaga
+                target.last_activity = time.monotonic()
+                target.add_player(old_id, connect(target, old_id))
+            self.players += 1
+            return (target, old_id), spectators
+
+    def vacate(self, room, player_id):
+        # A conexão sentada por join() vai retomar uma vaga em outro processo.
+        with self.lock:
+            self.players -= 1
+            return self.unseat(room, player_id)
+
+    def unseat(self, room, player_id):
+        # Desfaz a vaga que join() deu à conexão ao chegar; a sala volta para
+        # o começo da fila de onde saiu.
+        with room.lock:
+            room.remove_player(player_id)
+        spectators = self.release_locked(room)
+        if room.room_id in self.waiting:
+            self.waiting.move_to_end(room.room_id, last=False)
+        return spectators
+
+    def reap(self, now=None):
+        # Encerra as salas sem atividade dentro do prazo: os jogadores são
+        # avisados e desconectados. Vagas suspensas que não voltaram a tempo
+        # saem da partida. Devolve os espectadores dessas salas.
+        now = time.monotonic() if now is None else now
+        expired = []
+        spectators = []
+        with self.lock:
+            while self.grace and self.grace[0][0] <= now:
+                deadline, _, room, player_id = heapq.heappop(self.grace)
+                with room.lock:
+                    # Outra entrada vale se o jogador voltou e caiu de novo.
+                    if room.suspended.get(player_id) != deadline:
+                        continue
+                    room.remove_player(player_id)
+                spectators.extend(self.release_locked(room))
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, _, room = heapq.heappop(self.deadlines)
+                if self.rooms.get(room.room_id) is not room:
+                    continue
+                if room.room_id in self.waiting and len(room.game.players) < 2:
+                    # Esperar por um oponente não é abandono.
+                    self.schedule(room, now + self.setup_timeout)
+                    continue
+                deadline = self.deadline(room)
+                if deadline > now:
+                    self.schedule(room, deadline)
+                    continue
+                self.discard(room)
+                expired.append(room)
+
+        for room in expired:
+            print(f"Sala {room.room_id}: encerrada por inatividade.")
+            with room.lock:
+                room.expire()
+                spectators.extend(room.close())
+        if expired:
+            metrics.increment("rooms_reaped_total", len(expired))
+        return spectators
+
+    def check_heartbeats(self, now=None):
+        # Pinga os jogadores calados há HEARTBEAT_INTERVAL segundos e derruba
+        # os que passaram de HEARTBEAT_TIMEOUT; a queda suspende a vaga como
+        # qualquer outra. As conexões precisam expor last_seen e abort().
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            rooms = list(self.rooms.values())
+        dead = 0
+        for room in rooms:
+            with room.lock:
+                for player_id, connection in list(room.clients.items()):
+                    silent = now - connection.last_seen
+                    if silent >= HEARTBEAT_TIMEOUT:
+                        connection.abort()
+                        dead += 1
+                    elif silent >= HEARTBEAT_INTERVAL:
+                        room.send_message(player_id, {"type": "ping"})
+        if dead:
+            metrics.increment("heartbeat_timeouts_total", dead)
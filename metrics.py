@@ -0,0 +1,256 @@
+import bisect
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas do servidor em memória, expostas no formato texto do Prometheus por
+# um endpoint HTTP local (/metrics e /connections) e/ou impressas periodicamente.
+#
+# Nada no caminho de cada mensagem toma um lock global: contadores e
+# histogramas vão para uma fatia (Shard) da thread que os atualiza, e os bytes
+# de cada conexão ficam no seu ConnectionStats. A leitura (render) soma as
+# fatias e as conexões abertas; as fatias de threads que terminaram e as
+# conexões fechadas são somadas de vez num acumulado.
+
+LATENCY_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def merge(self, other):
+        # `other` pode estar sendo atualizado por outra thread: o total de
+        # observações sai da mesma cópia dos buckets.
+        counts = list(other.counts)
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.total += other.total
+        self.count += sum(counts)
+
+    def quantile(self, fraction):
+        # Estimativa pelo limite superior do bucket onde cai o quantil.
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class ConnectionStats:
+    def __init__(self, metrics, label):
+        self.metrics = metrics
+        self.label = label
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    # Só a conexão escreve nestes campos; bytes_*_total são somados na leitura.
+    def received(self, nbytes):
+        self.bytes_in += nbytes
+
+    def sent(self, nbytes):
+        self.bytes_out += nbytes
+
+
+class Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Shard:
+    # Contadores e histogramas de uma thread; só ela escreve aqui.
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}  # (nome, rótulo) -> valor
+        self.histograms = {}
+
+    def add(self, key, amount):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def merge(self, other):
+        for key, value in other.counters.copy().items():
+            self.add(key, value)
+        for name, histogram in other.histograms.copy().items():
+            mine = self.histograms.get(name)
+            if mine is None:
+                mine = self.histograms[name] = Histogram(histogram.buckets)
+            mine.merge(histogram)
+
+
+class Metrics:
+    def __init__(self):
+        # Protege as estruturas abaixo; increment e observe não o tomam.
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.shards = []
+        self.retired = Shard()  # Threads que terminaram e conexões fechadas
+        self.gauges = {}
+        self.connections = set()
+
+    def shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = Shard(threading.current_thread())
+            with self.lock:
+                # Sem leituras, as fatias de threads mortas ainda não acumulam.
+                self.retire_dead()
+                self.shards.append(shard)
+        return shard
+
+    def retire_dead(self):
+        live = []
+        for shard in self.shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                self.retired.merge(shard)
+        self.shards = live
+
+    def increment(self, name, amount=1, label=None):
+        self.shard().add((name, label), amount)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        histograms = self.shard().histograms
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def open_connection(self, label):
+        stats = ConnectionStats(self, label)
+        with self.lock:
+            self.connections.add(stats)
+        return stats
+
+    def close_connection(self, stats):
+        with self.lock:
+            self.connections.discard(stats)
+            self.retired.add(("bytes_in_total", None), stats.bytes_in)
+            self.retired.add(("bytes_out_total", None), stats.bytes_out)
+        self.observe_size("connection_bytes_in", stats.bytes_in)
+        self.observe_size("connection_bytes_out", stats.bytes_out)
+
+    def observe_size(self, name, value):
+        self.increment(f"{name}_sum", value)
+        self.increment(f"{name}_count")
+
+    def collect(self):
+        # Soma as fatias das threads e os bytes das conexões abertas. Devolve
+        # (Shard com os totais, cópia dos gauges).
+        with self.lock:
+            self.retire_dead()
+            total = Shard()
+            total.merge(self.retired)
+            for shard in self.shards:
+                total.merge(shard)
+            for stats in self.connections:
+                total.add(("bytes_in_total", None), stats.bytes_in)
+                total.add(("bytes_out_total", None), stats.bytes_out)
+            return total, dict(self.gauges)
+
+    def render(self):
+        total, gauges = self.collect()
+        lines = []
+        for (name, label), value in sorted(total.counters.items(), key=str):
+            if label is None:
+                lines.append(f"battleship_{name} {value}")
+            else:
+                lines.append(f'battleship_{name}{{type="{label}"}} {value}')
+        for name, value in sorted(gauges.items()):
+            lines.append(f"battleship_{name} {value}")
+        for name, histogram in sorted(total.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'battleship_{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'battleship_{name}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"battleship_{name}_sum {histogram.total:.6f}")
+            lines.append(f"battleship_{name}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def render_connections(self):
+        with self.lock:
+            connections = sorted(self.connections, key=lambda stats: stats.label)
+        lines = ["conexão bytes_in bytes_out"]
+        for stats in connections:
+            lines.append(f"{stats.label} {stats.bytes_in} {stats.bytes_out}")
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self):
+        # Resumo curto para o despejo periódico.
+        total, gauges = self.collect()
+        parts = [f"{name}={value}" for name, value in sorted(gauges.items())]
+        for name, histogram in sorted(total.histograms.items()):
+            parts.append(
+                f"{name}: n={histogram.count} p50<={histogram.quantile(0.5)}s "
+                f"p99<={histogram.quantile(0.99)}s"
+            )
+        return " | ".join(parts)
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.render()
+        elif self.path == "/connections":
+            body = metrics.render_connections()
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="localhost"):
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"Métricas em http://{host}:{port}/metrics")
+    return httpd
+
+
+def start_periodic_dump(interval, stream=sys.stderr):
+    def dump():
+        while True:
+            time.sleep(interval)
+            print(f"[métricas] {metrics.render_summary()}", file=stream, flush=True)
+
+    threading.Thread(target=dump, daemon=True).start()
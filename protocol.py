@@ -0,0 +1,342 @@
+import json
+import struct
+
+# Codificação das mensagens trocadas entre cliente e servidor.
+#
+# Por padrão cada mensagem é um JSON terminado em "\n". O servidor anuncia no
+# "welcome" as codificações aceitas; um cliente que quiser o formato binário
+# envia {"type": "encoding", "encoding": "binary"} (ainda em JSON) e a partir
+# daí tudo o que ele envia é binário. O servidor responde com a mesma mensagem
+# e também passa a enviar em binário. A mensagem "encoding" é, portanto, a
+# última mensagem JSON de cada sentido da conexão.
+#
+# No formato binário cada quadro começa com um byte de tipo. As mensagens mais
+# frequentes têm layout fixo (salvo e salvo_result, um cabeçalho com o número
+# de tiros e uma entrada fixa por tiro); as demais vão como JSON com o tamanho
+# prefixado.
+
+ENCODINGS = ["json", "binary"]
+
+FRAME_JSON = 0
+FRAME_SHOT = 1
+FRAME_SHOT_RESULT = 2
+FRAME_STATE_DELTA = 3
+FRAME_PLACEMENT_OK = 4
+FRAME_SALVO = 5
+FRAME_SALVO_RESULT = 6
+
+PHASES = ("setup", "playing", "game_over")
+RESULTS = ("miss", "hit", "hit_win", "sunk")
+
+JSON_HEADER = struct.Struct(">BI")  # tipo, tamanho do JSON
+SHOT = struct.Struct(">BHH")  # tipo, linha, coluna
+SHOT_RESULT = struct.Struct(">BBHHBH")  # tipo, resultado, linha, coluna, atirador, navio afundado
+DELTA_HEADER = struct.Struct(">BIBBHH")  # tipo, seq, flags, fase, casas no tabuleiro, casas nos tiros
+DELTA_CELL = struct.Struct(">HHB")  # linha, coluna, valor (caractere ASCII)
+PLACEMENT_HEADER = struct.Struct(">BHB")  # tipo, tamanho do tabuleiro, navios restantes
+SHIP_LENGTH = struct.Struct(">H")
+SALVO_HEADER = struct.Struct(">BH")  # tipo, número de tiros
+SALVO_CELL = struct.Struct(">HH")  # linha, coluna
+SALVO_RESULT_HEADER = struct.Struct(">BBH")  # tipo, atirador, número de tiros
+SALVO_RESULT_CELL = struct.Struct(">HHBH")  # linha, coluna, resultado, navio afundado
+
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Quadros maiores derrubam a conexão
+
+FLAG_CURRENT_TURN = 1
+FLAG_GAME_OVER = 2
+
+
+def is_encoding_switch(message):
+    return message.get("type") == "encoding" and message.get("encoding") == "binary"
+
+
+def board_from_snapshot(board, size):
+    # Tabuleiros grandes chegam esparsos, {"S"|"X"|"O": [[linha, coluna], ...]};
+    # monta a grade de strings que os clientes usam para desenhar.
+    if isinstance(board, list):
+        return board
+    grid = [["~"] * size for _ in range(size)]
+    for value, cells in board.items():
+        for row, col in cells:
+            grid[row][col] = value
+    return grid
+
+
+def encode_message(message, binary=False) -> bytes:
+    if not binary:
+        return (json.dumps(message) + "\n").encode()
+
+    msg_type = message.get("type")
+    if msg_type == "shot":
+        return SHOT.pack(FRAME_SHOT, message["row"], message["col"])
+
+    if msg_type == "shot_result":
+        return SHOT_RESULT.pack(
+            FRAME_SHOT_RESULT,
+            RESULTS.index(message["result"]),
+            message["row"],
+            message["col"],
+            int(message["shooter"].rsplit("_", 1)[1]),
+            message.get("sunk", 0),
+        )
+
+    if msg_type == "salvo":
+        shots = message["shots"]
+        parts = [SALVO_HEADER.pack(FRAME_SALVO, len(shots))]
+        parts.extend(SALVO_CELL.pack(row, col) for row, col in shots)
+        return b"".join(parts)
+
+    if msg_type == "salvo_result":
+        shots = message["shots"]
+        parts = [
+            SALVO_RESULT_HEADER.pack(
+                FRAME_SALVO_RESULT, int(message["shooter"].rsplit("_", 1)[1]), len(shots)
+            )
+        ]
+        for row, col, result, sunk in shots:
+            parts.append(SALVO_RESULT_CELL.pack(row, col, RESULTS.index(result), sunk))
+        return b"".join(parts)
+
+    if msg_type == "state_delta":
+        delta = message["delta"]
+        board_cells = delta.get("board", [])
+        shot_cells = delta.get("shots", [])
+        flags = 0
+        if delta["current_turn"]:
+            flags |= FLAG_CURRENT_TURN
+        if delta["game_over"]:
+            flags |= FLAG_GAME_OVER
+        parts = [
+            DELTA_HEADER.pack(
+                FRAME_STATE_DELTA,
+                delta["seq"],
+                flags,
+                PHASES.index(delta["game_phase"]),
+                len(board_cells),
+                len(shot_cells),
+            )
+        ]
+        for row, col, value in board_cells + shot_cells:
+            parts.append(DELTA_CELL.pack(row, col, ord(value)))
+        return b"".join(parts)
+
+    if (
+        msg_type == "placement_ok"
+        and isinstance(message["board"], list)
+        and len(message["ships_left"]) < 256
+    ):
+        # Durante o posicionamento o tabuleiro só tem água e navios: um bit por casa.
+        # Tabuleiros esparsos (dict de casas marcadas) seguem como JSON.
+        board = message["board"]
+        ships = 0
+        bit = 1
+        for row in board:
+            for cell in row:
+                if cell == "S":
+                    ships |= bit
+                bit <<= 1
+        size = len(board)
+        parts = [PLACEMENT_HEADER.pack(FRAME_PLACEMENT_OK, size, len(message["ships_left"]))]
+        parts.extend(SHIP_LENGTH.pack(length) for length in message["ships_left"])
+        parts.append(ships.to_bytes((size * size + 7) // 8, "little"))
+        return b"".join(parts)
+
+    payload = json.dumps(message).encode()
+    return JSON_HEADER.pack(FRAME_JSON, len(payload)) + payload
+
+
+def decode_frame(buffer, offset, limit):
+    # Decodifica um quadro binário em buffer[offset:limit]. Retorna (mensagem,
+    # novo offset) ou (None, offset) se o quadro ainda não chegou completo.
+    available = limit - offset
+    if available < 1:
+        return None, offset
+    frame_type = buffer[offset]
+
+    if frame_type == FRAME_JSON:
+        if available < JSON_HEADER.size:
+            return None, offset
+        _, length = JSON_HEADER.unpack_from(buffer, offset)
+        if length > MAX_FRAME_SIZE:
+            raise ValueError("Quadro grande demais")
+        end = offset + JSON_HEADER.size + length
+        if limit < end:
+            return None, offset
+        return json.loads(bytes(buffer[offset + JSON_HEADER.size : end])), end
+
+    if frame_type == FRAME_SHOT:
+        if available < SHOT.size:
+            return None, offset
+        _, row, col = SHOT.unpack_from(buffer, offset)
+        return {"type": "shot", "row": row, "col": col}, offset + SHOT.size
+
+    if frame_type == FRAME_SHOT_RESULT:
+        if available < SHOT_RESULT.size:
+            return None, offset
+        _, result, row, col, shooter, sunk = SHOT_RESULT.unpack_from(buffer, offset)
+        message = {
+            "type": "shot_result",
+            "result": RESULTS[result],
+            "row": row,
+            "col": col,
+            "shooter": f"player_{shooter}",
+        }
+        if sunk:
+            message["sunk"] = sunk
+        return message, offset + SHOT_RESULT.size
+
+    if frame_type == FRAME_SALVO:
+        if available < SALVO_HEADER.size:
+            return None, offset
+        _, count = SALVO_HEADER.unpack_from(buffer, offset)
+        start = offset + SALVO_HEADER.size
+        end = start + count * SALVO_CELL.size
+        if limit < end:
+            return None, offset
+        shots = [[row, col] for row, col in SALVO_CELL.iter_unpack(buffer[start:end])]
+        return {"type": "salvo", "shots": shots}, end
+
+    if frame_type == FRAME_SALVO_RESULT:
+        if available < SALVO_RESULT_HEADER.size:
+            return None, offset
+        _, shooter, count = SALVO_RESULT_HEADER.unpack_from(buffer, offset)
+        start = offset + SALVO_RESULT_HEADER.size
+        end = start + count * SALVO_RESULT_CELL.size
+        if limit < end:
+            return None, offset
+        shots = [
+            [row, col, RESULTS[result], sunk]
+            for row, col, result, sunk in SALVO_RESULT_CELL.iter_unpack(buffer[start:end])
+        ]
+        message = {"type": "salvo_result", "shooter": f"player_{shooter}", "shots": shots}
+        return message, end
+
+    if frame_type == FRAME_STATE_DELTA:
+        if available < DELTA_HEADER.size:
+            return None, offset
+        _, seq, flags, phase, board_count, shot_count = DELTA_HEADER.unpack_from(
+            buffer, offset
+        )
+        end = offset + DELTA_HEADER.size + (board_count + shot_count) * DELTA_CELL.size
+        if limit < end:
+            return None, offset
+        delta = {
+            "seq": seq,
+            "current_turn": bool(flags & FLAG_CURRENT_TURN),
+            "game_phase": PHASES[phase],
+            "game_over": bool(flags & FLAG_GAME_OVER),
+        }
+        cells = [
+            [row, col, chr(value)]
+            for row, col, value in DELTA_CELL.iter_unpack(
+                buffer[offset + DELTA_HEADER.size : end]
+            )
+        ]
+        if board_count:
+            delta["board"] = cells[:board_count]
+        if shot_count:
+            delta["shots"] = cells[board_count:]
+        return {"type": "state_delta", "delta": delta}, end
+
+    if frame_type == FRAME_PLACEMENT_OK:
+        if available < PLACEMENT_HEADER.size:
+            return None, offset
+        _, size, ship_count = PLACEMENT_HEADER.unpack_from(buffer, offset)
+        ships_start = offset + PLACEMENT_HEADER.size
+        board_start = ships_start + ship_count * SHIP_LENGTH.size
+        end = board_start + (size * size + 7) // 8
+        if limit < end:
+            return None, offset
+        ships_left = [
+            length for (length,) in SHIP_LENGTH.iter_unpack(buffer[ships_start:board_start])
+        ]
+        ships = int.from_bytes(buffer[board_start:end], "little")
+        board = [
+            ["S" if ships >> (row * size + col) & 1 else "~" for col in range(size)]
+            for row in range(size)
+        ]
+        message = {"type": "placement_ok", "board": board, "ships_left": ships_left}
+        return message, end
+
+    raise ValueError(f"Tipo de quadro desconhecido: {frame_type}")
+
+
+class FrameReader:
+    # Camada de enquadramento usada por cliente e servidores. Os bytes são lidos
+    # direto para um bytearray pré-alocado (recv_into ou BufferedProtocol) e só
+    # os quadros completos são decodificados; um quadro parcial fica no buffer
+    # até o resto chegar, sem concatenar strings a cada leitura.
+    def __init__(self, capacity=65536):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Início do primeiro quadro ainda não decodificado
+        self.end = 0  # Fim dos bytes válidos
+        self.scan = 0  # Até aqui a linha JSON parcial já foi procurada por "\n"
+        self.binary = False
+
+    def writable(self):
+        capacity = len(self.buffer)
+        if capacity - self.end < capacity // 4:
+            pending = self.end - self.start
+            if pending > MAX_FRAME_SIZE:
+                raise ValueError("Quadro grande demais")
+            if pending > capacity // 2:
+                buffer = bytearray(capacity * 2)
+                buffer[:pending] = self.view[self.start : self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            else:
+                # Move o quadro parcial para o início do buffer.
+                self.buffer[:pending] = bytes(self.view[self.start : self.end])
+            self.scan = max(self.scan - self.start, 0)
+            self.start, self.end = 0, pending
+        return self.view[self.end :]
+
+    def commit(self, nbytes):
+        self.end += nbytes
+        messages = []
+        offset = self.start
+        while offset < self.end:
+            if self.binary:
+                message, offset = decode_frame(self.view, offset, self.end)
+                if message is None:
+                    break
+            else:
+                # Uma linha longa chega em várias leituras: só o trecho novo é
+                # procurado, para não percorrer a linha inteira a cada leitura.
+                newline = self.buffer.find(b"\n", max(offset, self.scan), self.end)
+                if newline < 0:
+                    self.scan = self.end
+                    break
+                line = bytes(self.view[offset:newline]).strip()
+                offset = newline + 1
+                if not line:
+                    continue
+                message = json.loads(line)
+                if is_encoding_switch(message):
+                    self.binary = True
+            messages.append(message)
+
+        if offset == self.end:
+            self.start = self.end = self.scan = 0
+        else:
+            self.start = offset
+        return messages
+
+    def recv_from(self, sock):
+        # Retorna as mensagens completas recebidas ou None se a conexão fechou.
+        nbytes = sock.recv_into(self.writable())
+        if not nbytes:
+            return None
+        return self.commit(nbytes)
+
+    def feed(self, data):
+        messages = []
+        data = memoryview(data)
+        while data:
+            target = self.writable()
+            nbytes = min(len(target), len(data))
+            target[:nbytes] = data[:nbytes]
+            data = data[nbytes:]
+            messages.extend(self.commit(nbytes))
+        return messages
@@ -0,0 +1,74 @@
+import shutil
+import sys
+
+# Desenho incremental no terminal. O renderizador guarda o último quadro
+# (lista de linhas a partir do topo da tela) e, no próximo, posiciona o cursor
+# com sequências ANSI só onde algo mudou. Linhas só com ASCII, como as dos
+# tabuleiros, são atualizadas casa a casa; as demais (com emojis, de largura
+# variável) são reescritas inteiras.
+
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+CLEAR_LINE_END = "\x1b[K"
+CLEAR_SCREEN_END = "\x1b[J"
+
+
+def move_to(row, col):
+    return f"\x1b[{row + 1};{col + 1}H"
+
+
+class TerminalRenderer:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.ansi = self.stream.isatty()
+        self.frame = None  # Linhas desenhadas por último; None força redesenho completo
+
+    def clear(self):
+        # Limpa a tela (ex.: antes de um menu); o próximo quadro sai inteiro.
+        self.frame = None
+        if self.ansi:
+            self.stream.write(CLEAR_SCREEN)
+            self.stream.flush()
+
+    def render(self, lines):
+        if not self.ansi:
+            # Saída redirecionada: sem posicionamento de cursor, quadro inteiro.
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+            return
+
+        height = shutil.get_terminal_size().lines
+        if self.frame is None or len(lines) >= height:
+            # Um quadro maior que a tela rolaria e desalinharia as posições.
+            parts = [CLEAR_SCREEN, "\n".join(lines), "\n"]
+        else:
+            parts = []
+            for row, line in enumerate(lines):
+                previous = self.frame[row] if row < len(self.frame) else ""
+                if line != previous:
+                    parts.append(self.line_update(row, previous, line))
+            parts.append(move_to(len(lines), 0))
+        # Apaga o que estava abaixo do quadro (avisos e prompts anteriores).
+        parts.append(CLEAR_SCREEN_END)
+        self.stream.write("".join(parts))
+        self.stream.flush()
+        self.frame = list(lines)
+
+    def line_update(self, row, previous, line):
+        if not (line.isascii() and previous.isascii()):
+            return move_to(row, 0) + line + CLEAR_LINE_END
+
+        start = 0
+        limit = min(len(previous), len(line))
+        while start < limit and previous[start] == line[start]:
+            start += 1
+        end = len(line)
+        old_end = len(previous)
+        while end > start and old_end > start and previous[old_end - 1] == line[end - 1]:
+            end -= 1
+            old_end -= 1
+
+        update = move_to(row, start) + line[start:end]
+        if len(line) != len(previous):
+            # O tamanho mudou: o resto da linha se desloca, então reescreve até o fim.
+            update = move_to(row, start) + line[start:] + CLEAR_LINE_END
+        return update
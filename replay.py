@@ -0,0 +1,57 @@
+import argparse
+import time
+from eventlog import LogReplayer
+
+# Reexecuta as partidas gravadas por --event-log: cada tiro passa de novo por
+# BattleshipGame.make_shot e o resultado é comparado com o registrado.
+
+
+def replay_logs(paths, use_snapshots=False):
+    replayer = LogReplayer(use_snapshots)
+    start = time.perf_counter()
+    for path in paths:
+        replayer.replay(path)
+    elapsed = time.perf_counter() - start
+
+    games = [room["game"] for room in replayer.finished + list(replayer.rooms.values())]
+    wins = {"player_1": 0, "player_2": 0}
+    winner_shots = []
+    for game in games:
+        if not game.game_over or len(game.players) < 2:
+            continue
+        # O vencedor é quem derrubou a frota do outro; partidas encerradas por
+        # desconexão não têm vencedor.
+        for player_id, player in game.players.items():
+            if game.check_win(game.players[game.opponents[player_id]]["board"]):
+                wins[player_id] += 1
+                shots = player["shots_made"]
+                winner_shots.append(len(shots.hit_cells()) + len(shots.miss_cells()))
+    return {
+        "elapsed": elapsed,
+        "rooms": len(games),
+        "games": len(winner_shots),
+        "in_progress": len(replayer.in_progress()),
+        "shots": replayer.shots,
+        "mismatches": replayer.mismatches,
+        "wins": wins,
+        "mean_shots_to_win": sum(winner_shots) / max(len(winner_shots), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reexecuta partidas de logs de eventos")
+    parser.add_argument("logs", nargs="+", help="arquivos gravados com --event-log")
+    parser.add_argument(
+        "--snapshots", action="store_true",
+        help="parte dos snapshots em vez de reexecutar todos os tiros",
+    )
+    args = parser.parse_args()
+
+    stats = replay_logs(args.logs, args.snapshots)
+    elapsed = max(stats["elapsed"], 1e-9)
+    print(f"Salas: {stats['rooms']} ({stats['games']} partidas terminadas, {stats['in_progress']} em andamento)")
+    print(f"Tiros reexecutados: {stats['shots']} em {stats['elapsed']:.2f}s ({stats['shots'] / elapsed:.0f} tiros/s)")
+    print(f"Partidas/s: {stats['games'] / elapsed:.1f}")
+    print(f"Divergências: {stats['mismatches']}")
+    print(f"Vitórias: player_1 {stats['wins']['player_1']}, player_2 {stats['wins']['player_2']}")
+    print(f"Tiros para vencer (média): {stats['mean_shots_to_win']:.1f}")
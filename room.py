@@ -0,0 +1,519 @@
+import hmac
+import secrets
+import threading
+import time
+from eventlog import (
+    EVENT_CLOSE, EVENT_JOIN, EVENT_LEAVE, EVENT_PHASE, EVENT_PLACE, EVENT_SHOT,
+    SNAPSHOT_EVERY, player_number,
+)
+from game import BattleshipGame
+from metrics import metrics
+from protocol import ENCODINGS, PHASES, RESULTS, encode_message, is_encoding_switch
+
+try:
+    from ai import ProbabilityAI, board_to_array
+except ImportError:  # Sem numpy: partidas contra a IA ficam indisponíveis
+    ProbabilityAI = None
+
+
+# Bytes ainda não enviados a um jogador acima dos quais a conexão é derrubada:
+# um cliente que parou de ler não pode acumular memória no servidor.
+PLAYER_WRITE_LIMIT = 1024 * 1024
+
+# Segundos que a vaga de quem caiu no meio da partida fica guardada para um
+# reconnect com o token de sessão recebido no welcome.
+RECONNECT_GRACE = 30
+
+# Tipos conhecidos para o contador de mensagens; o resto conta como "other".
+MESSAGE_TYPES = {
+    "encoding", "resync", "opponent", "placement_choice", "place_ship", "shot", "salvo",
+}
+
+
+class GameRoom:
+    # Uma sala hospeda um único BattleshipGame. As conexões em self.clients só
+    # precisam expor send(bytes) e disconnect(), seja um socket ou um
+    # transporte do asyncio.
+    #
+    # Espectadores recebem os mesmos shot_result dos jogadores e, nas mudanças
+    # de fase, um spectator_state com os dois tabuleiros vistos de fora (só
+    # acertos e erros; as frotas ficam ocultas). Cada mensagem é serializada
+    # uma vez por codificação e os mesmos bytes vão para todos. Eles precisam
+    # expor send(bytes) e send_update(bytes), que pode descartar a mensagem se
+    # o espectador estiver lento.
+    # `game`, `ai_players` e `sessions` vêm de uma partida recuperada do log de eventos.
+    def __init__(
+        self, room_id=None, board_size=10, ships=None, event_log=None, game=None, ai_players=(),
+        salvo=False, sessions=None,
+    ):
+        self.room_id = room_id
+        self.game = BattleshipGame(board_size, ships, salvo=salvo) if game is None else game
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.binary_players = set()  # Jogadores que negociaram o protocolo binário
+        self.ai_players = {}  # player_id -> ProbabilityAI dos jogadores controlados pelo servidor
+        self.spectators = {}  # conexão -> True se negociou o protocolo binário
+        self.sessions = dict(sessions or {})  # player_id -> token de sessão
+        self.suspended = {}  # player_id -> prazo para reconectar (time.monotonic)
+        for ai_id in ai_players:
+            ai = self.ai_players[ai_id] = ProbabilityAI(self.game.board_size, self.game.ships)
+            # Numa partida recuperada, a IA volta sabendo o que já afundou.
+            opponent = self.game.opponents.get(ai_id)
+            target = self.game.players[opponent]["board"] if opponent else None
+            for ship, placement in enumerate(target.placements if target else ()):
+                if target.is_sunk(ship):
+                    ai.ship_sunk(*placement)
+        self.event_log = event_log
+        self.logged_shots = 0
+        self.last_activity = time.monotonic()  # Última mensagem de um jogador (ver Lobby.reap)
+        if event_log is not None:
+            event_log.room_created(room_id, self.game)
+            if game is not None:
+                self.record_snapshot()
+
+    def add_player(self, player_id, connection):
+        self.clients[player_id] = connection # Adiciona o cliente ao dicionário de clientes, tal que o player_id é a chave e a conexão é o valor.
+        # Vaga já existente: reconnect ou partida recuperada do log.
+        resumed = player_id in self.game.players
+        if not resumed:
+            self.game.add_player(player_id)
+            self.record(EVENT_JOIN, player_number(player_id), 0)
+            self.sessions.pop(player_id, None)
+        self.binary_players.discard(player_id)  # A conexão nova começa em JSON
+        self.suspended.pop(player_id, None)
+        if player_id not in self.sessions:
+            # O id da sala no token permite achar a sala (e o worker) no reconnect.
+            self.sessions[player_id] = f"{self.room_id}/{secrets.token_urlsafe(16)}"
+            # O token vai para o log num snapshot, para valer depois de um reinício.
+            self.record_snapshot()
+
+        welcome_msg = {
+            "type": "welcome",
+            "player_id": player_id,
+            "message": f"Bem-vindo! Você é o {player_id}",
+            "board_size": self.game.board_size,
+            "ships_to_place": self.game.players[player_id]["ships_to_place"],
+            "encodings": ENCODINGS,
+            "salvo": self.game.salvo,
+            "session": self.sessions[player_id],
+            "resumed": resumed,
+        }
+        connection.send(encode_message(welcome_msg))
+        if resumed:
+            # Um único snapshot põe o cliente em dia, sem reenviar o histórico.
+            self.send_game_state(player_id)
+            self.send_message(
+                self.game.opponents.get(player_id), {"type": "opponent_status", "connected": True}
+            )
+            self.play_ai_turns()
+
+    def session_player(self, token):
+        for player_id, session in self.sessions.items():
+            valid = hmac.compare_digest(session.encode(), token.encode())
+            if valid and player_id in self.game.players:
+                return player_id
+        return None
+
+    def connection_lost(self, player_id, connection):
+        # Na partida em andamento a vaga fica suspensa por RECONNECT_GRACE
+        # segundos; fora dela o jogador sai da sala. Devolve o prazo da
+        # suspensão ou None.
+        if self.clients.get(player_id) is not connection:
+            return None  # Conexão antiga, já substituída por um reconnect
+        if self.game.game_phase != "playing":
+            self.remove_player(player_id)
+            return None
+        del self.clients[player_id]
+        self.binary_players.discard(player_id)
+        deadline = self.suspended[player_id] = time.monotonic() + RECONNECT_GRACE
+        self.send_message(
+            self.game.opponents.get(player_id),
+            {"type": "opponent_status", "connected": False, "grace": RECONNECT_GRACE},
+        )
+        return deadline
+
+    def record(self, kind, *fields):
+        if self.event_log is not None:
+            self.event_log.append(kind, self.room_id, *fields)
+
+    def record_placements(self, player_id, placements):
+        for row, col, length, direction in placements:
+            self.record(EVENT_PLACE, player_number(player_id), row, col, length, ord(direction))
+
+    def record_snapshot(self):
+        if self.event_log is not None:
+            self.event_log.snapshot(self.room_id, self.game, self.ai_players, self.sessions)
+
+    def record_phase(self):
+        self.record(
+            EVENT_PHASE, PHASES.index(self.game.game_phase), player_number(self.game.current_turn)
+        )
+
+    def record_shot(self, player_id, row, col, result):
+        if self.event_log is None:
+            return
+        self.record(EVENT_SHOT, player_number(player_id), row, col, RESULTS.index(result))
+        self.logged_shots += 1
+        if self.logged_shots % SNAPSHOT_EVERY == 0 and not self.game.game_over:
+            self.record_snapshot()
+
+    def record_salvo(self, player_id, results):
+        if self.event_log is None:
+            return
+        self.event_log.salvo(self.room_id, player_number(player_id), results)
+        before = self.logged_shots
+        self.logged_shots += len(results)
+        crossed = self.logged_shots // SNAPSHOT_EVERY > before // SNAPSHOT_EVERY
+        if crossed and not self.game.game_over:
+            self.record_snapshot()
+
+    def close(self):
+        # Devolve os espectadores para que o servidor os leve a outra sala.
+        self.record(EVENT_CLOSE)
+        spectators = list(self.spectators)
+        self.spectators.clear()
+        return spectators
+
+    def expire(self):
+        # Encerrada pelo lobby por inatividade: avisa e desconecta os jogadores.
+        self.broadcast_message({"type": "error", "message": "Sala encerrada por inatividade."})
+        if not self.game.game_over:
+            self.game.game_phase = "game_over"
+            self.game.game_over = True
+            self.record_phase()
+            self.send_game_state_to_all()
+        for connection in list(self.clients.values()):
+            connection.disconnect()
+
+    def add_spectator(self, connection, binary=False):
+        self.spectators[connection] = binary
+        connection.send(encode_message(self.spectator_message(), binary))
+
+    def remove_spectator(self, connection):
+        self.spectators.pop(connection, None)
+
+    def spectator_message(self):
+        boards = {}
+        for player_id in ("player_1", "player_2"):
+            # O tabuleiro de um jogador visto de fora são os tiros do oponente.
+            opponent = self.game.players.get("player_2" if player_id == "player_1" else "player_1")
+            shots = opponent["shots_made"] if opponent else self.game.create_empty_board()
+            boards[player_id] = shots.snapshot()
+        return {
+            "type": "spectator_state",
+            "room": self.room_id,
+            "state": {
+                "board_size": self.game.board_size,
+                "boards": boards,
+                "players": sorted(self.game.players),
+                "current_turn": self.game.current_turn,
+                "game_phase": self.game.game_phase,
+                "game_over": self.game.game_over,
+                "salvo": self.game.salvo,
+                "spectators": len(self.spectators),
+            },
+        }
+
+    def send_spectator_state(self, connection=None):
+        # Sem `connection`, envia a todos os espectadores.
+        targets = [connection] if connection else list(self.spectators)
+        if not targets:
+            return
+        message = self.spectator_message()
+        encoded = {}
+        for spectator in targets:
+            binary = self.spectators.get(spectator, False)
+            if binary not in encoded:
+                encoded[binary] = encode_message(message, binary)
+            spectator.send_update(encoded[binary])
+
+    def remove_player(self, player_id):
+        self.suspended.pop(player_id, None)
+        if player_id in self.clients:
+            del self.clients[player_id]
+        if player_id in self.game.players:
+            # Numa partida terminada os tabuleiros ficam até a sala fechar, para
+            # os espectadores verem o estado final.
+            if not self.game.game_over:
+                self.game.remove_player(player_id)
+            self.record(EVENT_LEAVE, player_number(player_id))
+        self.binary_players.discard(player_id)
+        if not self.clients:
+            self.ai_players.clear()
+
+        if self.game.game_phase == "playing" and len(self.clients) > 0:
+            error_msg = {
+                "type": "error",
+                "message": "O oponente desconectou. O jogo terminou.",
+            }
+            self.broadcast_message(error_msg)
+            self.game.game_phase = "game_over"
+            self.game.game_over = True
+            self.record_phase()
+            self.send_game_state_to_all()
+
+    def process_message(self, message, player_id):
+        msg_type = message.get("type")
+        metrics.increment(
+            "messages_total", label=msg_type if msg_type in MESSAGE_TYPES else "other"
+        )
+        with metrics.timer("process_message_seconds"):
+            wait_start = time.perf_counter()
+            with self.lock:
+                metrics.observe("lock_wait_seconds", time.perf_counter() - wait_start)
+                self.last_activity = time.monotonic()
+                self.handle_message(message, player_id, msg_type)
+
+    def handle_message(self, message, player_id, msg_type):
+        if is_encoding_switch(message):
+            # A confirmação ainda vai em JSON; depois dela, só binário.
+            self.send_message(player_id, message)
+            self.binary_players.add(player_id)
+
+        elif msg_type == "resync":
+            self.send_game_state(player_id)
+
+        elif self.game.game_phase == "setup":
+            player_ready = False
+            if msg_type == "opponent" and message.get("opponent") == "ai":
+                self.add_ai_player(player_id)
+
+            elif msg_type in ("placement_choice", "place_ship") and (
+                self.game.players[player_id]["ready"]
+            ):
+                self.send_error(player_id, "Sua frota já está posicionada.")
+
+            elif msg_type == "placement_choice" and message["choice"] == "auto":
+                player_board = self.game.players[player_id]["board"]
+                if player_board.placements:
+                    # Senão a frota automática se somaria aos navios já postos.
+                    self.send_error(
+                        player_id, "O posicionamento automático só vale com o tabuleiro vazio."
+                    )
+                elif self.game.auto_place_ships(player_board):
+                    self.game.players[player_id]["ships_to_place"] = []
+                    self.record_placements(player_id, player_board.placements)
+                    player_ready = True
+                    print(f"Servidor: {player_id} escolheu posicionamento automático.")
+                    self.send_game_state_to_all()
+                else:
+                    self.send_error(
+                        player_id, "Não foi possível posicionar a frota automaticamente."
+                    )
+
+            elif msg_type == "place_ship":
+                player = self.game.players[player_id]
+                if message["length"] not in player["ships_to_place"]:
+                    self.send_error(player_id, "Não há navio desse tamanho para posicionar.")
+                elif self.game.is_valid_placement(
+                    player["board"],
+                    message["row"],
+                    message["col"],
+                    message["length"],
+                    message["direction"],
+                ):
+                    self.game.place_ship(
+                        player["board"],
+                        message["row"],
+                        message["col"],
+                        message["length"],
+                        message["direction"],
+                    )
+                    player["ships_to_place"].remove(message["length"])
+                    self.record_placements(player_id, player["board"].placements[-1:])
+
+                    self.send_message(
+                        player_id,
+                        {
+                            "type": "placement_ok",
+                            "board": player["board"].snapshot(),
+                            "ships_left": player["ships_to_place"],
+                        },
+                    )
+
+                    if not player["ships_to_place"]:
+                        player_ready = True
+                        print(
+                            f"Servidor: {player_id} finalizou o posicionamento manual."
+                        )
+                else:
+                    self.send_error(
+                        player_id, "Posicionamento inválido. Tente novamente."
+                    )
+
+            if player_ready:
+                self.game.players[player_id]["ready"] = True
+                if self.game.check_all_players_ready():
+                    self.start_game()
+                else:
+                    print(
+                        f"Servidor: {player_id} está pronto. Aguardando o outro jogador."
+                    )
+
+        elif self.game.game_phase == "playing":
+            if msg_type == "shot":
+                with metrics.timer("make_shot_seconds"):
+                    success, result = self.game.make_shot(
+                        player_id, message["row"], message["col"]
+                    )
+                if success:
+                    self.shot_made(player_id, message["row"], message["col"], result)
+                    self.play_ai_turns()
+                else:
+                    self.send_error(player_id, result)
+
+            elif msg_type == "salvo":
+                # Todos os tiros resolvidos de uma vez, sob o mesmo lock, com um
+                # único salvo_result e um único state_delta por jogador.
+                cells = [(row, col) for row, col in message["shots"]]
+                with metrics.timer("make_shot_seconds"):
+                    success, results = self.game.make_salvo(player_id, cells)
+                if success:
+                    self.salvo_made(player_id, results)
+                    self.play_ai_turns()
+                else:
+                    self.send_error(player_id, results)
+
+    def start_game(self):
+        self.game.game_phase = "playing"
+        self.game.current_turn = "player_1"
+        self.record_phase()
+        print(
+            "Servidor: Ambos os jogadores estão prontos! Jogo iniciado. Vez do player_1."
+        )
+        self.broadcast_message(
+            {
+                "type": "game_start",
+                "message": "Todos os jogadores estão prontos! Jogo iniciado. Jogador 1 começa.",
+                "ai_players": sorted(self.ai_players),
+            }
+        )
+        self.send_game_state_to_all()
+        self.play_ai_turns()
+
+    def add_ai_player(self, player_id):
+        if ProbabilityAI is None:
+            self.send_error(player_id, "IA indisponível: o servidor precisa do numpy.")
+            return
+        if len(self.game.players) >= 2:
+            self.send_error(player_id, "A sala já tem um oponente.")
+            return
+
+        ai_board = self.game.create_empty_board()
+        if not self.game.auto_place_ships(ai_board):
+            self.send_error(player_id, "A IA não conseguiu posicionar a frota.")
+            return
+        ai_id = next(pid for pid in ("player_1", "player_2") if pid not in self.game.players)
+        self.game.add_player(ai_id)
+        self.record(EVENT_JOIN, player_number(ai_id), 1)
+        ai_player = self.game.players[ai_id]
+        ai_player["board"] = ai_board
+        self.record_placements(ai_id, ai_player["board"].placements)
+        ai_player["ships_to_place"] = []
+        ai_player["ready"] = True
+        self.ai_players[ai_id] = ProbabilityAI(self.game.board_size, self.game.ships)
+        print(f"Servidor: {player_id} vai jogar contra a IA ({ai_id}).")
+
+        if self.game.check_all_players_ready():
+            self.start_game()
+
+    def play_ai_turns(self):
+        # A IA joga imediatamente enquanto o turno for dela (acertos repetem a vez).
+        while self.game.game_phase == "playing" and self.game.current_turn in self.ai_players:
+            ai_id = self.game.current_turn
+            shots = self.game.players[ai_id]["shots_made"]
+            hits, misses = board_to_array(shots, shots.hits), board_to_array(shots, shots.misses)
+            if self.game.salvo:
+                cells = self.ai_players[ai_id].choose_salvo(
+                    hits, misses, self.game.salvo_size(ai_id)
+                )
+                with metrics.timer("make_shot_seconds"):
+                    success, results = self.game.make_salvo(ai_id, cells)
+                if not success:
+                    break
+                self.salvo_made(ai_id, results)
+                continue
+            row, col = self.ai_players[ai_id].choose_shot(hits, misses)
+            with metrics.timer("make_shot_seconds"):
+                success, result = self.game.make_shot(ai_id, row, col)
+            if not success:
+                break
+            self.shot_made(ai_id, row, col, result)
+
+    def shot_made(self, player_id, row, col, result):
+        self.record_shot(player_id, row, col, result)
+        shot_result = {
+            "type": "shot_result",
+            "result": result,
+            "row": row,
+            "col": col,
+            "shooter": player_id,
+        }
+        if result in ("sunk", "hit_win"):
+            placement = self.game.sunk_ship(player_id, row, col)
+            shot_result["sunk"] = placement[2]  # Tamanho do navio afundado
+            if player_id in self.ai_players:
+                self.ai_players[player_id].ship_sunk(*placement)
+        self.broadcast_message(shot_result)
+        self.send_state_delta_to_all()
+
+    def salvo_made(self, player_id, results):
+        self.record_salvo(player_id, results)
+        shots = []
+        for row, col, result in results:
+            sunk = 0
+            if result in ("sunk", "hit_win"):
+                placement = self.game.sunk_ship(player_id, row, col)
+                sunk = placement[2]
+                if player_id in self.ai_players:
+                    self.ai_players[player_id].ship_sunk(*placement)
+            shots.append([row, col, result, sunk])
+        self.broadcast_message({"type": "salvo_result", "shooter": player_id, "shots": shots})
+        self.send_state_delta_to_all()
+
+    def send_message(self, player_id, message):
+        if player_id in self.clients:
+            try:
+                self.clients[player_id].send(
+                    encode_message(message, player_id in self.binary_players)
+                )
+            except:
+                pass
+
+    def broadcast_message(self, message):
+        encoded = {}  # Serializa no máximo uma vez por codificação
+        for player_id, client_socket in list(self.clients.items()):
+            binary = player_id in self.binary_players
+            if binary not in encoded:
+                encoded[binary] = encode_message(message, binary)
+            try:
+                client_socket.send(encoded[binary])
+            except:
+                pass
+        for spectator, binary in list(self.spectators.items()):
+            if binary not in encoded:
+                encoded[binary] = encode_message(message, binary)
+            spectator.send_update(encoded[binary])
+
+    def send_game_state_to_all(self):
+        with metrics.timer("send_game_state_to_all_seconds"):
+            for player_id in list(self.clients.keys()):
+                self.send_game_state(player_id)
+            self.send_spectator_state()
+
+    def send_game_state(self, player_id):
+        if player_id in self.clients:
+            game_state = self.game.get_game_state(player_id)
+            if game_state:
+                self.send_message(player_id, {"type": "game_state", "state": game_state})
+
+    def send_state_delta_to_all(self):
+        with metrics.timer("send_state_delta_to_all_seconds"):
+            for player_id in list(self.clients.keys()):
+                delta = self.game.get_state_delta(player_id)
+                if delta:
+                    self.send_message(player_id, {"type": "state_delta", "delta": delta})
+
+    def send_error(self, player_id, error_message):
+        error_msg = {"type": "error", "message": error_message}
+        self.send_message(player_id, error_msg)
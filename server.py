@@ -1,218 +1,258 @@
+import argparse
 import socket
 import threading
-import json
-from game import BattleshipGame
+import time
+from eventlog import EventLog
+from game import BattleshipGame, fleet_template
+from lobby import HELLO_TIMEOUT, IDLE_TIMEOUT, REAP_INTERVAL, SETUP_TIMEOUT, Lobby
+from metrics import metrics, start_http_server, start_periodic_dump
+from protocol import FrameReader, encode_message
+from room import PLAYER_WRITE_LIMIT
 
 
+class SocketConnection:
+    # Socket de um jogador com contagem de bytes para as métricas. send() só
+    # acrescenta os bytes a uma fila limitada; uma thread por conexão a
+    # esvazia com sendall, juntando numa única escrita tudo o que se acumulou
+    # enquanto a anterior estava em andamento. Assim quem segura o lock da
+    # sala nunca espera pela rede, e um cliente que não lê é desconectado
+    # quando a fila passa de PLAYER_WRITE_LIMIT.
+    def __init__(self, sock, label):
+        self.sock = sock
+        # As mensagens já saem agrupadas; o Nagle só atrasaria a resposta do tiro.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stats = metrics.open_connection(label)
+        self.pending = bytearray()
+        self.ready = threading.Condition()
+        self.closing = False
+        self.last_seen = time.monotonic()  # Último dado recebido (ver Lobby.check_heartbeats)
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def recv_into(self, buffer):
+        nbytes = self.sock.recv_into(buffer)
+        self.stats.received(nbytes)
+        self.last_seen = time.monotonic()
+        return nbytes
+
+    def send(self, data):
+        with self.ready:
+            if self.closing:
+                raise ConnectionError("Conexão fechada")
+            if len(self.pending) + len(data) > PLAYER_WRITE_LIMIT:
+                metrics.increment("slow_disconnects_total")
+                self.abort_locked()
+                raise ConnectionError("Cliente lento demais")
+            self.pending += data
+            self.ready.notify()
+
+    def write_loop(self):
+        closing = False
+        while not closing:
+            with self.ready:
+                while not self.pending and not self.closing:
+                    self.ready.wait()
+                data = bytes(self.pending)
+                self.pending.clear()
+                closing = self.closing
+            if data:
+                try:
+                    self.sock.sendall(data)
+                except OSError:
+                    break
+                self.stats.sent(len(data))
+        # Fila esvaziada depois de disconnect(), ou conexão perdida: acorda a
+        # thread do jogador, bloqueada no recv; ela tira o jogador da sala.
+        self.shutdown()
+        self.sock.close()
+        metrics.close_connection(self.stats)
+
+    def shutdown(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def abort_locked(self):
+        # Descarta o que não foi enviado e derruba o socket já, mesmo com a
+        # thread de escrita presa num sendall.
+        self.closing = True
+        self.pending.clear()
+        self.ready.notify()
+        self.shutdown()
+
+    def disconnect(self):
+        # Envia o que está na fila (ex.: o aviso de sala encerrada) e fecha.
+        with self.ready:
+            self.closing = True
+            self.ready.notify()
+
+    def close(self):
+        with self.ready:
+            self.abort_locked()
+
+    abort = close
+
 
 class BattleshipServer:
-    def __init__(self, host="localhost", port=12345):
+    # Servidor clássico: uma thread por cliente. As conexões são aceitas
+    # indefinidamente e o Lobby as agrupa em salas de dois; uma thread
+    # encerra as salas abandonadas.
+    def __init__(
+        self, host="localhost", port=12345, board_size=10, ships=None, event_log=None,
+        setup_timeout=SETUP_TIMEOUT, idle_timeout=IDLE_TIMEOUT, salvo=False,
+    ):
         self.host = host
         self.port = port
-        self.game = BattleshipGame()
-        self.clients = {}
-        self.lock = threading.Lock()
+        self.lobby = Lobby(
+            board_size, ships, event_log,
+            setup_timeout=setup_timeout, idle_timeout=idle_timeout, salvo=salvo,
+        )
 
     def start_server(self):
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_socket.bind((self.host, self.port))
-        server_socket.listen(2)
+        server_socket.listen(128)
 
         print(f"Servidor Batalha Naval iniciado em {self.host}:{self.port}")
         print("Aguardando jogadores...")
+        threading.Thread(target=self.reap_periodically, daemon=True).start()
 
-        while len(self.clients) < 2:
+        while True:
             client_socket, addr = server_socket.accept()
-            player_id = f"player_{len(self.clients) + 1}"
-
-            self.clients[player_id] = client_socket # Adiciona o cliente ao dicionário de clientes, tal que o player_id é a chave e o client_socket é o valor.
-            self.game.players[player_id] = {
-                "board": self.game.create_empty_board(),               
-                "shots_made": self.game.create_empty_board(),
-                "ready": False,
-                "ships_to_place": self.game.ships,
-            }
-
-            print(f"Jogador {player_id} conectado de {addr}.")
-
-            welcome_msg = {
-                "type": "welcome",
-                "player_id": player_id,
-                "message": f"Bem-vindo! Você é o {player_id}",
-                "ships_to_place": self.game.ships,
-            }
-            client_socket.send((json.dumps(welcome_msg) + "\n").encode())
-
             threading.Thread(
-                target=self.handle_client, args=(client_socket, player_id)
+                target=self.handle_client, args=(client_socket, addr), daemon=True
             ).start()
 
-        print("Dois jogadores conectados. Fase de posicionamento iniciada.")
-        print("Servidor: Aguardando ambos os jogadores finalizarem o posicionamento...")
+    def update_gauges(self):
+        metrics.set_gauge("active_rooms", len(self.lobby.rooms))
+        metrics.set_gauge("active_players", self.lobby.players)
 
-    def handle_client(self, client_socket, player_id):
+    def reap_periodically(self):
         while True:
-            try:
-                data = client_socket.recv(4096).decode()
-                if not data:
-                    break
+            time.sleep(REAP_INTERVAL)
+            self.lobby.reap()
+            self.lobby.check_heartbeats()
+            self.update_gauges()
 
-                messages = data.strip().split("\n")
-                for msg_str in messages:
-                    if not msg_str:
-                        continue
-                    message = json.loads(msg_str)
-                    self.process_message(message, player_id)
+    def seat(self, connection, reader, addr):
+        # Espera até HELLO_TIMEOUT pela escolha do oponente e senta o jogador.
+        # Devolve (sala, player_id, mensagens já recebidas) ou None se a
+        # conexão fechou antes.
+        connection.sock.settimeout(HELLO_TIMEOUT)
+        try:
+            messages = reader.recv_from(connection)
+        except socket.timeout:
+            messages = []
+        except Exception:
+            messages = None
+        if messages is None:
+            connection.close()
+            return None
+        connection.sock.settimeout(None)
+        opponent = "human"
+        first = messages[0].get("type") if messages else None
+        if first == "reconnect":
+            # Retomada já na primeira mensagem: vai direto para a vaga suspensa.
+            seat, _ = self.lobby.reconnect(
+                messages.pop(0).get("session", ""), lambda room, player_id: connection
+            )
+            if seat is None:
+                error = {"type": "error", "message": "Sessão inválida ou expirada."}
+                connection.send(encode_message(error))
+                connection.disconnect()
+                return None
+            room, player_id = seat
+            connection.stats.label = f"{room.room_id}/{player_id}"
+            self.update_gauges()
+            print(f"Sala {room.room_id}: jogador {player_id} reconectado de {addr}.")
+            return room, player_id, messages
+        if first == "opponent":
+            opponent = messages.pop(0).get("opponent")
+        room, player_id = self.lobby.join(lambda room, player_id: connection, opponent)
+        connection.stats.label = f"{room.room_id}/{player_id}"
+        self.update_gauges()
+        print(f"Sala {room.room_id}: jogador {player_id} conectado de {addr}.")
+        return room, player_id, messages
 
+    def handle_client(self, client_socket, addr):
+        connection = SocketConnection(client_socket, f"novo/{id(client_socket):x}")
+        reader = FrameReader()
+        seat = self.seat(connection, reader, addr)
+        if seat is None:
+            return
+        room, player_id, messages = seat
+        while messages is not None:
+            try:
+                for message in messages:
+                    msg_type = message.get("type")
+                    if msg_type == "pong":
+                        continue  # Só atualiza last_seen; não conta como atividade na sala
+                    if msg_type == "reconnect":
+                        room, player_id = self.reconnect(room, connection, player_id, message)
+                        continue
+                    room.process_message(message, player_id)
+                messages = reader.recv_from(connection)
             except Exception:
                 break
 
-        with self.lock:
-            print(f"Jogador {player_id} desconectado.")
-            client_socket.close()
-            if player_id in self.clients:
-                del self.clients[player_id]
-            if player_id in self.game.players:
-                del self.game.players[player_id]
-
-            if self.game.game_phase != "setup" and len(self.clients) > 0:
-                error_msg = {
-                    "type": "error",
-                    "message": "O oponente desconectou. O jogo terminou.",
-                }
-                self.broadcast_message(error_msg)
-                self.game.game_phase = "game_over"
-                self.game.game_over = True
-                self.send_game_state_to_all()
-
-    def process_message(self, message, player_id):
-        with self.lock:
-            msg_type = message.get("type")
-
-            if self.game.game_phase == "setup":
-                player_ready = False
-                if msg_type == "placement_choice" and message["choice"] == "auto":
-                    player_board = self.game.players[player_id]["board"]
-                    self.game.auto_place_ships(player_board)
-                    self.game.players[player_id]["ships_to_place"] = []
-                    player_ready = True
-                    print(f"Servidor: {player_id} escolheu posicionamento automático.")
-                    self.send_game_state_to_all()
-
-                elif msg_type == "place_ship":
-                    player = self.game.players[player_id]
-                    if self.game.is_valid_placement(
-                        player["board"],
-                        message["row"],
-                        message["col"],
-                        message["length"],
-                        message["direction"],
-                    ):
-                        self.game.place_ship(
-                            player["board"],
-                            message["row"],
-                            message["col"],
-                            message["length"],
-                            message["direction"],
-                        )
-                        player["ships_to_place"].remove(message["length"])
-
-                        self.clients[player_id].send(
-                            (
-                                json.dumps(
-                                    {
-                                        "type": "placement_ok",
-                                        "board": player["board"],
-                                        "ships_left": player["ships_to_place"],
-                                    }
-                                )
-                                + "\n"
-                            ).encode()
-                        )
-
-                        if not player["ships_to_place"]:
-                            player_ready = True
-                            print(
-                                f"Servidor: {player_id} finalizou o posicionamento manual."
-                            )
-                    else:
-                        self.send_error(
-                            player_id, "Posicionamento inválido. Tente novamente."
-                        )
-
-                if player_ready:
-                    self.game.players[player_id]["ready"] = True
-                    if self.game.check_all_players_ready():
-                        self.start_game()
-                    else:
-                        print(
-                            f"Servidor: {player_id} está pronto. Aguardando o outro jogador."
-                        )
-
-            elif self.game.game_phase == "playing":
-                if msg_type == "shot":
-                    success, result = self.game.make_shot(
-                        player_id, message["row"], message["col"]
-                    )
-                    if success:
-                        self.broadcast_message(
-                            {
-                                "type": "shot_result",
-                                "result": result,
-                                "row": message["row"],
-                                "col": message["col"],
-                                "shooter": player_id,
-                            }
-                        )
-                        self.send_game_state_to_all()
-                    else:
-                        self.send_error(player_id, result)
-
-    def start_game(self):
-        self.game.game_phase = "playing"
-        self.game.current_turn = "player_1"
-        print(
-            "Servidor: Ambos os jogadores estão prontos! Jogo iniciado. Vez do player_1."
-        )
-        self.broadcast_message(
-            {
-                "type": "game_start",
-                "message": "Todos os jogadores estão prontos! Jogo iniciado. Jogador 1 começa.",
-            }
-        )
-        self.send_game_state_to_all()
+        print(f"Sala {room.room_id}: jogador {player_id} desconectado.")
+        connection.close()
+        self.lobby.leave(room, player_id, connection)
+        self.update_gauges()
 
-    def broadcast_message(self, message):
-        msg_json = json.dumps(message) + "\n"
-        for client_socket in list(self.clients.values()):
-            try:
-                client_socket.send(msg_json.encode())
-            except:
-                pass
-
-    def send_game_state_to_all(self):
-        for player_id in list(self.clients.keys()):
-            if player_id in self.clients:
-                game_state = self.game.get_game_state(player_id)
-                if game_state:
-                    message = {"type": "game_state", "state": game_state}
-                    try:
-                        self.clients[player_id].send(
-                            (json.dumps(message) + "\n").encode()
-                        )
-                    except:
-                        pass
-
-    def send_error(self, player_id, error_message):
-        error_msg = {"type": "error", "message": error_message}
-        if player_id in self.clients:
-            try:
-                self.clients[player_id].send((json.dumps(error_msg) + "\n").encode())
-            except:
-                pass
+    def reconnect(self, room, connection, player_id, message):
+        # Leva a conexão para a vaga suspensa do token e devolve a vaga em que
+        # ela ficou (a de antes, se o token não vale).
+        seat, _ = self.lobby.reconnect(
+            message.get("session", ""), lambda room, player_id: connection, room, player_id
+        )
+        if seat is None:
+            with room.lock:
+                room.send_error(player_id, "Sessão inválida ou expirada.")
+            return room, player_id
+        room, player_id = seat
+        connection.stats.label = f"{room.room_id}/{player_id}"
+        print(f"Sala {room.room_id}: jogador {player_id} reconectado.")
+        return seat
 
 
 if __name__ == "__main__":
-    server = BattleshipServer()
+    parser = argparse.ArgumentParser(description="Servidor de Batalha Naval (uma thread por jogador)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--metrics-port", type=int, default=None)
+    parser.add_argument("--metrics-interval", type=float, default=None)
+    parser.add_argument("--board-size", type=int, default=10)
+    parser.add_argument("--ships", type=int, nargs="+", default=None, help="tamanhos dos navios")
+    parser.add_argument("--event-log", default=None, help="arquivo do log de eventos")
+    parser.add_argument(
+        "--setup-timeout", type=float, default=SETUP_TIMEOUT,
+        help="segundos sem atividade no posicionamento antes de encerrar a sala",
+    )
+    parser.add_argument(
+        "--idle-timeout", type=float, default=IDLE_TIMEOUT,
+        help="segundos sem jogadas antes de encerrar uma partida",
+    )
+    parser.add_argument(
+        "--salvo", action="store_true",
+        help="modo salvo: a cada turno, um tiro por navio ainda à tona",
+    )
+    args = parser.parse_args()
+    try:
+        ships = BattleshipGame(args.board_size, args.ships).ships
+        # Uma vez aqui, e não no meio de uma partida com a sala travada.
+        fleet_template(args.board_size, tuple(ships))
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+    if args.metrics_interval:
+        start_periodic_dump(args.metrics_interval)
+    event_log = EventLog(args.event_log) if args.event_log else None
+    server = BattleshipServer(
+        args.host, args.port, args.board_size, args.ships, event_log,
+        args.setup_timeout, args.idle_timeout, args.salvo,
+    )
     server.start_server()
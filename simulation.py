@@ -0,0 +1,255 @@
+import argparse
+import random
+import numpy as np
+from ai import bitboard_to_array, placement_density
+from game import (
+    BattleshipGame, fleet_template, mask_placement, ship_cells, ship_segments, transform_fleet,
+)
+
+# Simulação offline em lote: K partidas guardadas como arrays empilhados e
+# avançadas um tiro por partida a cada passo. As regras são as de
+# BattleshipGame.make_shot e check_win: acerto repete a vez, erro passa a vez
+# e a partida acaba quando o atirador atinge a última casa da frota inimiga.
+# Cada casa de navio guarda o número do navio, então o motor sabe quando um
+# navio afunda e avisa a estratégia, como o servidor faz com ProbabilityAI.
+
+STRATEGIES = ("random", "density")
+# Disposições de frota: "uniform" sorteia entre todas as posições livres;
+# "edge" só entre as que encostam na borda do tabuleiro.
+LAYOUTS = ("uniform", "edge")
+
+
+class SimulationStats:
+    # Estatísticas agregadas de vários lotes.
+    def __init__(self, board_size):
+        self.board_size = board_size
+        self.games = 0
+        self.wins = np.zeros(2, dtype=np.int64)
+        self.shots_to_win = np.zeros(board_size * board_size + 1, dtype=np.int64)
+        self.cell_shots = np.zeros((board_size, board_size), dtype=np.int64)
+        self.cell_hits = np.zeros((board_size, board_size), dtype=np.int64)
+
+    def add_batch(self, winners, shots, cell_shots, cell_hits):
+        self.games += len(winners)
+        self.wins += np.bincount(winners, minlength=2)
+        winner_shots = shots[np.arange(len(winners)), winners]
+        self.shots_to_win += np.bincount(winner_shots, minlength=len(self.shots_to_win))
+        self.cell_shots += cell_shots
+        self.cell_hits += cell_hits
+
+    def shots_percentile(self, fraction):
+        cumulative = np.cumsum(self.shots_to_win)
+        return int(np.searchsorted(cumulative, fraction * cumulative[-1]))
+
+    def mean_shots_to_win(self):
+        counts = np.arange(len(self.shots_to_win))
+        return float((counts * self.shots_to_win).sum() / max(self.games, 1))
+
+    def hit_rates(self):
+        return self.cell_hits / np.maximum(self.cell_shots, 1)
+
+    def summary(self):
+        return {
+            "games": self.games,
+            "player_1_win_rate": float(self.wins[0] / max(self.games, 1)),
+            "mean_shots_to_win": self.mean_shots_to_win(),
+            "p50_shots_to_win": self.shots_percentile(0.50),
+            "p90_shots_to_win": self.shots_percentile(0.90),
+            "p99_shots_to_win": self.shots_percentile(0.99),
+        }
+
+
+class BatchSimulation:
+    def __init__(
+        self, board_size=10, ships=None, strategies=("density", "density"), seed=None,
+        layouts=("uniform", "uniform"),
+    ):
+        self.game = BattleshipGame(board_size, ships, sparse=False)
+        self.board_size = board_size
+        self.ships = self.game.ships
+        self.strategies = strategies
+        self.layouts = layouts
+        self.rng = np.random.default_rng(seed)
+        self.segments = {
+            length: np.stack(
+                [bitboard_to_array(mask, board_size) for mask in ship_segments(board_size, length)]
+            )
+            for length in set(self.ships)
+        }
+        self.edge_segments = {}
+        self.edge_masks = {}  # As mesmas posições, como máscaras para fleet_sampler
+        for length, segments in self.segments.items():
+            border = segments[:, [0, -1], :].any(axis=(1, 2))
+            border |= segments[:, :, [0, -1]].any(axis=(1, 2))
+            self.edge_segments[length] = segments[border]
+            self.edge_masks[length] = tuple(
+                mask for mask, edge in zip(ship_segments(board_size, length), border) if edge
+            )
+
+    def place_fleets(self, count, layout="uniform", max_rounds=1000):
+        # Cada navio sorteia uma posição entre todas as possíveis; as partidas em
+        # que ela colide com um navio já posto sorteiam de novo. Aceitar só as
+        # posições livres dá uma escolha uniforme entre elas, como em
+        # BattleshipGame.generate_fleet. Frotas que não couberem depois de
+        # max_rounds sorteios são montadas pela busca de generate_fleet.
+        # Devolve, por casa, 0 para água ou 1 + o índice do navio em self.ships.
+        size = self.board_size
+        occupied = np.zeros((count, size, size), dtype=bool)
+        # O menor inteiro que comporta o número de navios.
+        ship_id = np.min_scalar_type(len(self.ships)).type
+        fleets = np.zeros((count, size, size), dtype=ship_id)
+        stuck = np.zeros(count, dtype=bool)
+        for ship in sorted(range(len(self.ships)), key=lambda i: -self.ships[i]):
+            length = self.ships[ship]
+            segments = self.segments[length]
+            if layout == "edge":
+                segments = self.edge_segments[length]
+            pending = np.flatnonzero(~stuck)
+            for _ in range(max_rounds):
+                if not len(pending):
+                    break
+                candidates = segments[self.rng.integers(len(segments), size=len(pending))]
+                free = ~(candidates & occupied[pending]).any(axis=(1, 2))
+                occupied[pending[free]] |= candidates[free]
+                fleets[pending[free]] += candidates[free] * ship_id(ship + 1)
+                pending = pending[~free]
+            stuck[pending] = True
+
+        # O sorteio do fallback também sai de self.rng, para que a mesma
+        # semente sempre reproduza as mesmas frotas.
+        fallback_rng = random.Random(int(self.rng.integers(2**63)))
+        # A busca usa as mesmas posições do sorteio. Se ela esgotar o orçamento,
+        # vale a disposição de fleet_template, que não se restringe às bordas.
+        edge = layout == "edge"
+        sample = self.game.fleet_sampler(segments=self.edge_masks if edge else None)
+        for index in np.flatnonzero(stuck):
+            fleet = sample(fallback_rng)
+            if fleet is None:
+                if edge:
+                    raise ValueError("A frota não tem disposição só nas bordas.")
+                template = fleet_template(size, tuple(self.ships))
+                placements = transform_fleet(size, template, fallback_rng)
+            else:
+                placements = [mask_placement(size, mask) for mask in fleet]
+            cells = fleets[index].reshape(-1)
+            cells[:] = 0
+            for ship, placement in enumerate(placements):
+                cells[list(ship_cells(size, *placement))] = ship + 1
+        return fleets
+
+    def choose_cells(self, strategy, hits, misses, sunk, afloat):
+        # sunk: casas de navios já afundados; afloat: quais navios de self.ships
+        # ainda estão à tona. Como em ProbabilityAI.ship_sunk, as casas afundadas
+        # bloqueiam como erros e os navios afundados saem da contagem.
+        count = len(hits)
+        shot = (hits | misses).reshape(count, -1)
+        noise = self.rng.random(shot.shape)
+        if strategy == "random":
+            scores = noise
+        else:
+            # Ruído < 1 só desempata casas com a mesma densidade.
+            density = placement_density(
+                hits & ~sunk, misses | sunk, self.ships, afloat
+            ).reshape(count, -1)
+            scores = density + noise
+        scores[shot] = -1
+        return scores.argmax(axis=1)
+
+    def run_batch(self, count):
+        size = self.board_size
+        fleets = np.stack(
+            [self.place_fleets(count, self.layouts[0]), self.place_fleets(count, self.layouts[1])],
+            axis=1,
+        )
+        ships = fleets > 0
+        hits = np.zeros_like(ships)  # hits[k, p]: tiros certeiros do jogador p
+        misses = np.zeros_like(ships)
+        sunk = np.zeros_like(ships)  # sunk[k, p]: casas afundadas pelo jogador p
+        remaining = ships.sum(axis=(2, 3))  # Casas de navio ainda intactas de cada jogador
+        # ship_cells[k, p, i]: casas intactas do navio i de p
+        ship_cells = np.tile(np.array(self.ships, dtype=np.int64), (count, 2, 1))
+        current = np.zeros(count, dtype=np.int64)  # player_1 começa
+        active = np.ones(count, dtype=bool)
+        winners = np.full(count, -1, dtype=np.int64)
+        shots = np.zeros((count, 2), dtype=np.int64)
+        cell_shots = np.zeros(size * size, dtype=np.int64)
+        cell_hits = np.zeros(size * size, dtype=np.int64)
+
+        while active.any():
+            games = np.flatnonzero(active)
+            shooter = current[games]
+            cells = np.empty(len(games), dtype=np.int64)
+            for player in (0, 1):
+                turn = shooter == player
+                if turn.any():
+                    subset = games[turn]
+                    cells[turn] = self.choose_cells(
+                        self.strategies[player], hits[subset, player], misses[subset, player],
+                        sunk[subset, player], ship_cells[subset, 1 - player] > 0,
+                    )
+
+            target = 1 - shooter
+            rows, cols = np.divmod(cells, size)
+            hit = ships[games, target, rows, cols]
+            hits[games, shooter, rows, cols] = hit
+            misses[games, shooter, rows, cols] = ~hit
+            shots[games, shooter] += 1
+            remaining[games, target] -= hit
+            # O navio atingido perde uma casa; se era a última, o atirador fica
+            # sabendo das casas dele.
+            struck, owner, hitter = games[hit], target[hit], shooter[hit]
+            ship = fleets[struck, owner, rows[hit], cols[hit]] - 1
+            ship_cells[struck, owner, ship] -= 1
+            down = ship_cells[struck, owner, ship] == 0
+            struck, owner, hitter, ship = struck[down], owner[down], hitter[down], ship[down]
+            sunk[struck, hitter] |= fleets[struck, owner] == (ship + 1)[:, None, None]
+            cell_shots += np.bincount(cells, minlength=size * size)
+            cell_hits += np.bincount(cells[hit], minlength=size * size)
+
+            won = hit & (remaining[games, target] == 0)
+            winners[games[won]] = shooter[won]
+            active[games[won]] = False
+            current[games[~hit]] = target[~hit]
+
+        return winners, shots, cell_shots.reshape(size, size), cell_hits.reshape(size, size)
+
+    def run(self, games, batch_size=10000):
+        stats = SimulationStats(self.board_size)
+        while stats.games < games:
+            count = min(batch_size, games - stats.games)
+            stats.add_batch(*self.run_batch(count))
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulação de partidas em lote")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--board-size", type=int, default=10)
+    parser.add_argument("--ships", type=int, nargs="+", default=None, help="tamanhos dos navios")
+    parser.add_argument(
+        "--strategies", nargs=2, choices=STRATEGIES, default=["density", "density"],
+        help="estratégia do player_1 e do player_2",
+    )
+    parser.add_argument(
+        "--layouts", nargs=2, choices=LAYOUTS, default=["uniform", "uniform"],
+        help="disposição da frota do player_1 e do player_2",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    simulation = BatchSimulation(
+        args.board_size, args.ships, tuple(args.strategies), args.seed, tuple(args.layouts)
+    )
+    stats = simulation.run(args.games, args.batch_size)
+    summary = stats.summary()
+    print(f"Partidas: {summary['games']}")
+    print(f"Vitórias do player_1: {summary['player_1_win_rate']:.1%}")
+    print(
+        f"Tiros para vencer: média {summary['mean_shots_to_win']:.1f}, "
+        f"p50 {summary['p50_shots_to_win']}, p90 {summary['p90_shots_to_win']}, "
+        f"p99 {summary['p99_shots_to_win']}"
+    )
+    print("Taxa de acerto por casa:")
+    for row in stats.hit_rates():
+        print(" ".join(f"{rate:.2f}" for rate in row))
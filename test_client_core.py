@@ -0,0 +1,89 @@
+import unittest
+from client_core import ClientCore
+from protocol import FrameReader
+from test_room import place, setup_room
+
+
+class RecordingClient(ClientCore):
+    # Guarda o que o cliente envia ao servidor, já decodificado.
+    def __init__(self):
+        super().__init__(encoding="json")
+        self.reader = FrameReader()
+        self.sent = []
+
+    def write(self, data):
+        self.sent.extend(self.reader.feed(data))
+
+
+def playing_clients():
+    # Sala com as frotas postas e um cliente que recebeu tudo o que o
+    # player_1 recebeu até o início da partida.
+    room, connections = setup_room()
+    for player_id in ("player_1", "player_2"):
+        place(room, player_id, 0, 0, 3)
+        place(room, player_id, 2, 0, 2)
+    client = RecordingClient()
+    for message in connections["player_1"].messages:
+        client.handle_server_message(message)
+    connections["player_1"].messages.clear()
+    return room, connections["player_1"], client
+
+
+def deltas(connection):
+    messages = [message for message in connection.messages if message["type"] == "state_delta"]
+    connection.messages.clear()
+    return messages
+
+
+class DeltaTest(unittest.TestCase):
+    def test_deltas_follow_the_snapshot_seq(self):
+        room, connection, client = playing_clients()
+        seq = client.game_state["seq"]
+        room.process_message({"type": "shot", "row": 0, "col": 0}, "player_1")
+        room.process_message({"type": "shot", "row": 0, "col": 1}, "player_1")
+        received = deltas(connection)
+        self.assertEqual([m["delta"]["seq"] for m in received], [seq + 1, seq + 2])
+        for message in received:
+            client.handle_server_message(message)
+        self.assertEqual(client.game_state["seq"], seq + 2)
+        self.assertEqual(client.game_state["your_shots"][0][:2], ["X", "X"])
+        self.assertEqual(client.sent, [])
+
+    def test_gap_asks_for_one_resync(self):
+        room, connection, client = playing_clients()
+        seq = client.game_state["seq"]
+        for col in range(3):
+            room.process_message({"type": "shot", "row": 0, "col": col}, "player_1")
+        lost, *late = deltas(connection)
+        for message in late:
+            client.handle_server_message(message)
+        # Só um resync, e os deltas depois do buraco não são aplicados.
+        self.assertEqual(client.sent, [{"type": "resync"}])
+        self.assertEqual(client.game_state["seq"], seq)
+        self.assertEqual(client.game_state["your_shots"][0][0], "~")
+
+        room.process_message(client.sent.pop(), "player_1")
+        for message in connection.messages:
+            client.handle_server_message(message)
+        connection.messages.clear()
+        self.assertFalse(client.resync_requested)
+        self.assertEqual(client.game_state["your_shots"][0][:3], ["X", "X", "X"])
+
+        # Depois do snapshot, os deltas voltam a ser aplicados em sequência.
+        room.process_message({"type": "shot", "row": 2, "col": 0}, "player_1")
+        for message in deltas(connection):
+            client.handle_server_message(message)
+        self.assertEqual(client.sent, [])
+        self.assertEqual(client.game_state["your_shots"][2][0], "X")
+
+    def test_snapshot_drops_pending_changes(self):
+        room, _, _ = playing_clients()
+        room.game.make_shot("player_1", 5, 5)
+        state = room.game.get_game_state("player_1")
+        delta = room.game.get_state_delta("player_1")
+        self.assertEqual(delta["seq"], state["seq"] + 1)
+        self.assertNotIn("shots", delta)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from eventlog import EventLog, LogReplayer, recover
+from room import GameRoom
+from test_room import FakeConnection, place
+
+
+def logged_room(event_log, room_id="1"):
+    # Sala 10x10 com frota [3, 2], gravando em event_log.
+    room = GameRoom(room_id, 10, [3, 2], event_log=event_log)
+    for player_id in ("player_1", "player_2"):
+        room.add_player(player_id, FakeConnection())
+    return room
+
+
+def place_fleets(room):
+    for player_id in ("player_1", "player_2"):
+        place(room, player_id, 0, 0, 3)
+        place(room, player_id, 2, 0, 2)
+
+
+class CrashRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "eventos.log")
+        self.event_log = EventLog(self.path, flush_interval=0)
+        self.addCleanup(self.close_log)
+
+    def close_log(self):
+        if not self.event_log.closed:
+            self.event_log.close()
+
+    def crash(self):
+        # O que já foi gravado fica no arquivo; a sala nunca chega ao EVENT_CLOSE.
+        self.event_log.close()
+
+    def test_game_in_progress_is_recovered_with_its_sessions(self):
+        room = logged_room(self.event_log)
+        place_fleets(room)
+        room.process_message({"type": "shot", "row": 0, "col": 0}, "player_1")
+        room.process_message({"type": "shot", "row": 9, "col": 9}, "player_1")
+        self.crash()
+
+        recovered = recover(self.path)
+        self.assertEqual(len(recovered), 1)
+        self.assertFalse(os.path.exists(self.path))  # Arquivado com a data no nome
+        game = recovered[0]["game"]
+        self.assertEqual(game.game_phase, "playing")
+        self.assertEqual(game.current_turn, "player_2")
+        board = game.players["player_2"]["board"]
+        self.assertTrue(board.is_shot(0, 0))
+        self.assertEqual(board.hits_left, [2, 2])
+        self.assertEqual(recovered[0]["sessions"], room.sessions)
+
+    def test_setup_rooms_are_not_recovered(self):
+        room = logged_room(self.event_log)
+        place(room, "player_1", 0, 0, 3)
+        self.crash()
+        self.assertEqual(recover(self.path), [])
+
+    def test_truncated_record_is_ignored(self):
+        room = logged_room(self.event_log)
+        place_fleets(room)
+        self.crash()
+        with open(self.path, "ab") as file:
+            file.write(b"\x06\x00\x01")  # Cabeçalho cortado por uma queda
+        replayer = LogReplayer().replay(self.path)
+        self.assertEqual(replayer.mismatches, 0)
+        self.assertEqual(len(replayer.in_progress()), 1)
+
+    def test_replayed_shots_match_the_log(self):
+        room = logged_room(self.event_log)
+        place_fleets(room)
+        for col in range(3):
+            room.process_message({"type": "shot", "row": 0, "col": col}, "player_1")
+        self.crash()
+        replayer = LogReplayer(use_snapshots=False).replay(self.path)
+        self.assertEqual((replayer.shots, replayer.mismatches), (3, 0))
+        game = replayer.in_progress()[(self.path, "1")]["game"]
+        self.assertTrue(game.players["player_2"]["board"].is_sunk(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
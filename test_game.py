@@ -0,0 +1,133 @@
+import random
+import unittest
+from game import BattleshipGame, fleet_template, mask_placement, transform_fleet
+
+
+def playing_game(ships, sparse=False, salvo=False):
+    # player_2 tem navios posicionados em linhas separadas, a partir da (0, 0);
+    # player_1 tem um navio de 1 casa no canto, e começa atirando.
+    game = BattleshipGame(10, ships, sparse=sparse, salvo=salvo)
+    game.add_player("player_1")
+    game.add_player("player_2")
+    for row, length in enumerate(ships):
+        game.place_ship(game.players["player_2"]["board"], row * 2, 0, length, "H")
+    game.place_ship(game.players["player_1"]["board"], 9, 9, 1, "H")
+    game.game_phase = "playing"
+    game.current_turn = "player_1"
+    return game
+
+
+class ShipCounterTest(unittest.TestCase):
+    def check_sunk_and_win(self, sparse):
+        game = playing_game([2, 1], sparse=sparse)
+        board = game.players["player_2"]["board"]
+        self.assertEqual(board.ships_left, 2)
+
+        self.assertEqual(game.make_shot("player_1", 0, 0), (True, "hit"))
+        self.assertFalse(board.is_sunk(0))
+        self.assertEqual(game.make_shot("player_1", 0, 1), (True, "sunk"))
+        self.assertTrue(board.is_sunk(0))
+        self.assertEqual(board.ships_left, 1)
+        self.assertEqual(game.sunk_ship("player_1", 0, 1), (0, 0, 2, "H"))
+        self.assertFalse(game.check_win(board))
+
+        self.assertEqual(game.make_shot("player_1", 2, 0), (True, "hit_win"))
+        self.assertTrue(game.check_win(board))
+        self.assertTrue(game.game_over)
+        self.assertEqual(game.game_phase, "game_over")
+
+    def test_bitboard(self):
+        self.check_sunk_and_win(sparse=False)
+
+    def test_sparse_board(self):
+        self.check_sunk_and_win(sparse=True)
+
+    def test_repeated_shot_does_not_count_twice(self):
+        game = playing_game([3])
+        board = game.players["player_2"]["board"]
+        game.make_shot("player_1", 0, 0)
+        self.assertEqual(game.make_shot("player_1", 0, 0), (False, "Já atirou nesta posição"))
+        # A mesma casa recebida de novo (ex.: replay) não adianta o naufrágio.
+        board.receive_shot(0, 0)
+        self.assertEqual(board.hits_left[0], 2)
+
+    def test_miss_passes_the_turn(self):
+        game = playing_game([2])
+        self.assertEqual(game.make_shot("player_1", 5, 5), (True, "miss"))
+        self.assertEqual(game.current_turn, "player_2")
+        self.assertEqual(game.make_shot("player_1", 5, 6)[0], False)
+
+    def test_salvo_size_follows_ships_afloat(self):
+        game = playing_game([2, 1, 1], salvo=True)
+        self.assertEqual(game.salvo_size("player_1"), 1)
+        self.assertEqual(game.salvo_size("player_2"), 3)
+        game.current_turn = "player_2"
+        success, results = game.make_salvo("player_2", [(9, 9)])
+        self.assertTrue(success)
+        self.assertEqual(results, [(9, 9, "hit_win")])
+        self.assertEqual(game.salvo_size("player_1"), 0)
+
+
+class FleetTest(unittest.TestCase):
+    def test_generate_fleet_fills_every_ship(self):
+        game = BattleshipGame(10)
+        rng = random.Random(1)
+        for fleet in game.generate_fleets(200, rng):
+            occupied = 0
+            for mask, length in zip(fleet, game.ships):
+                self.assertEqual(mask.bit_count(), length)
+                self.assertFalse(mask & occupied)
+                occupied |= mask
+
+    def test_generate_fleet_respects_occupied_cells(self):
+        game = BattleshipGame(4, [4, 4, 4])
+        # Com a coluna 0 ocupada, os três navios só cabem em pé nas colunas 1 a 3.
+        occupied = sum(1 << (row * 4) for row in range(4))
+        fleet = game.generate_fleet(occupied, random.Random(2))
+        self.assertEqual(sorted(mask_placement(4, mask)[1] for mask in fleet), [1, 2, 3])
+
+    def test_generate_fleet_reports_impossible_fleets(self):
+        game = BattleshipGame(3, [3, 3, 2])
+        self.assertIsNone(game.generate_fleet(1 << 4, random.Random(3)))
+
+    def test_generate_fleet_gives_up_after_the_budget(self):
+        # A frota cabe (packed_fleet acha), mas não com 100 passos de busca.
+        game = BattleshipGame(10, [5] * 19)
+        self.assertIsNone(game.generate_fleet(rng=random.Random(4), budget=100))
+
+    def test_auto_place_marks_every_ship(self):
+        for sparse in (False, True):
+            game = BattleshipGame(10, sparse=sparse)
+            board = game.create_empty_board()
+            self.assertTrue(game.auto_place_ships(board, random.Random(4)))
+            self.assertEqual(board.ships_left, len(game.ships))
+            self.assertEqual(sorted(p[2] for p in board.placements), sorted(game.ships))
+
+    def test_dense_fleets_are_always_placed(self):
+        for ships in ([5] * 19, [3] * 33):
+            for sparse in (False, True):
+                game = BattleshipGame(10, ships, sparse=sparse)
+                for seed in range(5):
+                    board = game.create_empty_board()
+                    self.assertTrue(game.auto_place_ships(board, random.Random(seed)))
+                    self.assertEqual(board.ships_left, len(ships))
+                    self.assertEqual(len(board.ship_at), sum(ships))
+
+    def test_template_symmetries_fit_the_board(self):
+        game = BattleshipGame(10, [5, 5, 4, 4, 4, 3, 3, 3, 2, 2, 1])
+        template = fleet_template(10, tuple(game.ships))
+        rng = random.Random(5)
+        for _ in range(20):
+            board = game.create_empty_board()
+            for placement in transform_fleet(10, template, rng):
+                self.assertTrue(board.can_place(*placement))
+                board.place(*placement)
+
+    def test_fleet_template_rejects_impossible_fleets(self):
+        # 25 navios de 4 casas não ladrilham um tabuleiro 10x10.
+        with self.assertRaises(ValueError):
+            fleet_template(10, (4,) * 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+from unittest import mock
+import lobby
+from lobby import Lobby
+from test_room import FakeConnection
+
+
+def join(hall, opponent="human"):
+    connection = FakeConnection()
+    room, player_id = hall.join(lambda room, player_id: connection, opponent)
+    return room, player_id, connection
+
+
+class JoinTest(unittest.TestCase):
+    def test_ai_opponent_gets_a_private_room(self):
+        hall = Lobby()
+        room, _, _ = join(hall, "ai")
+        self.assertEqual(set(room.ai_players), {"player_2"})
+        self.assertFalse(hall.has_waiting())
+
+    def test_without_numpy_ai_request_joins_the_human_queue(self):
+        hall = Lobby()
+        with mock.patch.object(lobby, "ProbabilityAI", None):
+            room, player_id, connection = join(hall, "ai")
+        self.assertEqual(player_id, "player_1")
+        self.assertEqual(room.ai_players, {})
+        self.assertTrue(hall.has_waiting())
+        self.assertIn("IA indisponível", connection.errors()[0])
+        other, other_id, _ = join(hall)
+        self.assertIs(other, room)
+        self.assertEqual(other_id, "player_2")
+
+
+
+def playing_room(hall):
+    # Dois humanos pareados, com as frotas postas: a partida começa.
+    room, _, first = join(hall)
+    _, _, second = join(hall)
+    for player_id in ("player_1", "player_2"):
+        room.process_message({"type": "placement_choice", "choice": "auto"}, player_id)
+    return room, {"player_1": first, "player_2": second}
+
+
+class ReapTest(unittest.TestCase):
+    def test_idle_setup_room_is_closed(self):
+        hall = Lobby(setup_timeout=10)
+        room, _, first = join(hall)
+        _, _, second = join(hall)
+        hall.reap(room.last_activity + 9)
+        self.assertIn(room.room_id, hall.rooms)
+        hall.reap(room.last_activity + 11)
+        self.assertNotIn(room.room_id, hall.rooms)
+        self.assertTrue(first.closed and second.closed)
+        self.assertIn("Sala encerrada por inatividade.", first.errors())
+        self.assertTrue(room.game.game_over)
+
+    def test_room_waiting_for_an_opponent_is_kept(self):
+        hall = Lobby(setup_timeout=10)
+        room, _, connection = join(hall)
+        hall.reap(room.last_activity + 100)
+        self.assertIn(room.room_id, hall.rooms)
+        self.assertFalse(connection.closed)
+        self.assertTrue(hall.has_waiting())
+
+    def test_activity_moves_the_deadline(self):
+        hall = Lobby(setup_timeout=10, idle_timeout=10)
+        room, _ = playing_room(hall)
+        start = room.last_activity
+        room.last_activity = start + 8
+        hall.reap(start + 11)
+        self.assertIn(room.room_id, hall.rooms)
+        self.assertEqual(len(hall.deadlines), 1)  # Uma só entrada, com o prazo novo
+        self.assertEqual(hall.deadlines[0][0], start + 18)
+        hall.reap(start + 19)
+        self.assertNotIn(room.room_id, hall.rooms)
+        self.assertEqual(hall.deadlines, [])
+
+    def test_suspended_seat_expires_after_the_grace(self):
+        hall = Lobby()
+        room, connections = playing_room(hall)
+        hall.leave(room, "player_1", connections["player_1"])
+        deadline = room.suspended["player_1"]
+        self.assertEqual(len(hall.grace), 1)
+        hall.reap(deadline - 1)
+        self.assertIn("player_1", room.suspended)
+        hall.reap(deadline)
+        self.assertEqual(room.suspended, {})
+        self.assertEqual(hall.grace, [])
+        self.assertTrue(room.game.game_over)
+        self.assertIn("O oponente desconectou. O jogo terminou.", connections["player_2"].errors())
+
+    def test_stale_grace_entry_is_ignored(self):
+        # O jogador voltou e caiu de novo: vale só o prazo da segunda queda.
+        hall = Lobby()
+        room, connections = playing_room(hall)
+        hall.leave(room, "player_1", connections["player_1"])
+        first_deadline = room.suspended["player_1"]
+        token = room.sessions["player_1"]
+        again = FakeConnection()
+        hall.reconnect(token, lambda room, player_id: again)
+        hall.leave(room, "player_1", again)
+        self.assertEqual(len(hall.grace), 2)
+        self.assertGreater(room.suspended["player_1"], first_deadline)
+        hall.reap(first_deadline)
+        self.assertIn("player_1", room.suspended)
+        self.assertFalse(room.game.game_over)
+        hall.reap(room.suspended["player_1"])
+        self.assertNotIn("player_1", room.suspended)
+        self.assertTrue(room.game.game_over)
+
+
+
+class ReconnectTest(unittest.TestCase):
+    def test_suspended_seat_is_resumed(self):
+        hall = Lobby()
+        room, connections = playing_room(hall)
+        hall.leave(room, "player_1", connections["player_1"])
+        again = FakeConnection()
+        seat, spectators = hall.reconnect(room.sessions["player_1"], lambda room, pid: again)
+        self.assertEqual((seat, spectators), ((room, "player_1"), []))
+        self.assertEqual(room.suspended, {})
+        self.assertIs(room.clients["player_1"], again)
+        welcome, state = again.messages[:2]
+        self.assertTrue(welcome["resumed"])
+        self.assertEqual(state["type"], "game_state")
+        statuses = [m["connected"] for m in connections["player_2"].messages
+                    if m["type"] == "opponent_status"]
+        self.assertEqual(statuses, [False, True])
+
+    def test_half_open_connection_is_aborted(self):
+        # A conexão antiga nunca caiu do lado do servidor.
+        hall = Lobby()
+        room, connections = playing_room(hall)
+        again = FakeConnection()
+        hall.reconnect(room.sessions["player_1"], lambda room, pid: again)
+        self.assertTrue(connections["player_1"].aborted)
+        self.assertIs(room.clients["player_1"], again)
+        # A saída tardia da conexão antiga não suspende a vaga nova.
+        hall.leave(room, "player_1", connections["player_1"])
+        self.assertEqual(room.suspended, {})
+        self.assertFalse(room.game.game_over)
+
+    def test_seat_from_join_is_given_back(self):
+        hall = Lobby()
+        room, connections = playing_room(hall)
+        hall.leave(room, "player_1", connections["player_1"])
+        spare, spare_id, again = join(hall)  # O servidor sentou antes do reconnect
+        seat, _ = hall.reconnect(
+            room.sessions["player_1"], lambda room, pid: again, spare, spare_id
+        )
+        self.assertEqual(seat, (room, "player_1"))
+        self.assertNotIn(spare.room_id, hall.rooms)
+        self.assertEqual(hall.players, 2)
+
+    def test_unknown_token_is_refused(self):
+        hall = Lobby()
+        room, _ = playing_room(hall)
+        for token in (f"{room.room_id}/errado", "sem-sala", room.sessions["player_1"] + "x"):
+            self.assertEqual(hall.reconnect(token, lambda room, pid: FakeConnection()), (None, []))
+
+    def test_token_finds_a_recovered_room(self):
+        # A sala recuperada tem outro id; o token antigo é achado em restored.
+        old_hall = Lobby()
+        room, _ = playing_room(old_hall)
+        saved = {"game": room.game, "ai_players": set(), "sessions": room.sessions}
+        hall = Lobby(room_ids=iter([7]))
+        hall.resume([saved])
+        again = FakeConnection()
+        seat, _ = hall.reconnect(room.sessions["player_2"], lambda room, pid: again)
+        self.assertEqual(seat[0].room_id, 7)
+        self.assertEqual(seat[1], "player_2")
+        self.assertTrue(again.messages[0]["resumed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
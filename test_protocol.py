@@ -0,0 +1,120 @@
+import unittest
+from protocol import FrameReader, encode_message
+
+SWITCH = {"type": "encoding", "encoding": "binary"}
+
+
+class FrameReaderTest(unittest.TestCase):
+    def test_json_message_split_across_reads(self):
+        reader = FrameReader()
+        data = encode_message({"type": "shot", "row": 3, "col": 4})
+        for i in range(len(data) - 1):
+            self.assertEqual(reader.feed(data[i : i + 1]), [])
+        self.assertEqual(reader.feed(data[-1:]), [{"type": "shot", "row": 3, "col": 4}])
+
+    def test_several_json_messages_in_one_read(self):
+        reader = FrameReader()
+        messages = [{"type": "shot", "row": row, "col": row + 1} for row in range(5)]
+        data = b"".join(encode_message(message) for message in messages)
+        self.assertEqual(reader.feed(data), messages)
+
+    def test_blank_lines_are_skipped(self):
+        reader = FrameReader()
+        data = b"\n  \n" + encode_message({"type": "ping"})
+        self.assertEqual(reader.feed(data), [{"type": "ping"}])
+
+    def test_binary_frame_split_at_every_offset(self):
+        message = {"type": "salvo", "shots": [[0, 1], [2, 3], [9, 9]]}
+        data = encode_message(message, binary=True)
+        for cut in range(1, len(data)):
+            reader = FrameReader()
+            reader.binary = True
+            self.assertEqual(reader.feed(data[:cut]), [])
+            self.assertEqual(reader.feed(data[cut:]), [message])
+
+    def test_switch_to_binary_in_the_middle_of_a_read(self):
+        # O pedido de troca e os primeiros quadros binários chegam juntos: o
+        # que vem depois do "\n" já é binário.
+        reader = FrameReader()
+        shot = {"type": "shot", "row": 1, "col": 2}
+        salvo = {"type": "salvo", "shots": [[4, 5]]}
+        data = (
+            encode_message({"type": "placement_choice", "choice": "auto"})
+            + encode_message(SWITCH)
+            + encode_message(shot, binary=True)
+            + encode_message(salvo, binary=True)
+        )
+        self.assertEqual(
+            reader.feed(data),
+            [{"type": "placement_choice", "choice": "auto"}, SWITCH, shot, salvo],
+        )
+        self.assertTrue(reader.binary)
+
+    def test_switch_with_a_partial_binary_frame_after_it(self):
+        reader = FrameReader()
+        frame = encode_message({"type": "shot", "row": 7, "col": 8}, binary=True)
+        self.assertEqual(reader.feed(encode_message(SWITCH) + frame[:2]), [SWITCH])
+        self.assertEqual(reader.feed(frame[2:]), [{"type": "shot", "row": 7, "col": 8}])
+
+    def test_binary_json_fallback_frame(self):
+        reader = FrameReader()
+        reader.binary = True
+        message = {"type": "chat", "text": "olá"}
+        self.assertEqual(reader.feed(encode_message(message, binary=True)), [message])
+
+    def test_partial_frame_survives_compaction_and_growth(self):
+        # Buffer pequeno: o quadro parcial é movido para o início e, se não
+        # couber, o buffer dobra de tamanho.
+        reader = FrameReader(capacity=32)
+        messages = [{"type": "shot", "row": row, "col": row} for row in range(50)]
+        messages.append({"type": "chat", "text": "x" * 200})
+        data = b"".join(encode_message(message) for message in messages)
+        received = []
+        for start in range(0, len(data), 7):
+            received.extend(reader.feed(data[start : start + 7]))
+        self.assertEqual(received, messages)
+
+    def test_long_line_is_not_rescanned(self):
+        # Cada leitura só procura o "\n" nos bytes novos, mesmo depois de o
+        # buffer mover ou crescer.
+        reader = FrameReader(capacity=64)
+        message = {"type": "chat", "text": "y" * 5000}
+        data = encode_message(message)
+        for start in range(0, len(data) - 1, 10):
+            chunk = data[start : min(start + 10, len(data) - 1)]
+            self.assertEqual(reader.feed(chunk), [])
+            self.assertEqual(reader.scan, reader.end)
+        self.assertEqual(reader.feed(data[-1:]), [message])
+        self.assertEqual((reader.start, reader.end, reader.scan), (0, 0, 0))
+
+    def test_unknown_binary_frame_is_rejected(self):
+        reader = FrameReader()
+        reader.binary = True
+        with self.assertRaises(ValueError):
+            reader.feed(b"\xff")
+
+
+class BinaryEncodingTest(unittest.TestCase):
+    def roundtrip(self, message):
+        reader = FrameReader()
+        reader.binary = True
+        return reader.feed(encode_message(message, binary=True))
+
+    def test_shot_result(self):
+        message = {
+            "type": "shot_result", "result": "sunk", "row": 2, "col": 3,
+            "shooter": "player_2", "sunk": 4,
+        }
+        self.assertEqual(self.roundtrip(message), [message])
+
+    def test_state_delta(self):
+        delta = {
+            "seq": 12, "current_turn": True, "game_phase": "playing", "game_over": False,
+            "board": [[0, 0, "X"]], "shots": [[5, 6, "O"], [7, 8, "X"]],
+        }
+        message = {"type": "state_delta", "delta": delta}
+        self.assertEqual(self.roundtrip(message), [message])
+
+
+if __name__ == "__main__":
+    unittest.main()
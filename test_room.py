@@ -0,0 +1,117 @@
+import unittest
+from protocol import FrameReader
+from room import GameRoom
+
+
+class FakeConnection:
+    # Guarda as mensagens que a sala envia, já decodificadas.
+    def __init__(self):
+        self.reader = FrameReader()
+        self.messages = []
+        self.closed = False
+        self.aborted = False
+
+    def send(self, data):
+        self.messages.extend(self.reader.feed(data))
+
+    def send_update(self, data):
+        self.send(data)
+
+    def disconnect(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+    def errors(self):
+        return [message["message"] for message in self.messages if message["type"] == "error"]
+
+
+def setup_room(ships=(3, 2)):
+    room = GameRoom("1", 10, list(ships))
+    connections = {"player_1": FakeConnection(), "player_2": FakeConnection()}
+    for player_id, connection in connections.items():
+        room.add_player(player_id, connection)
+    return room, connections
+
+
+def place(room, player_id, row, col, length, direction="H"):
+    message = {
+        "type": "place_ship", "row": row, "col": col, "length": length, "direction": direction,
+    }
+    room.process_message(message, player_id)
+
+
+class PlacementTest(unittest.TestCase):
+    def test_auto_twice_does_not_add_a_second_fleet(self):
+        room, connections = setup_room()
+        board = room.game.players["player_1"]["board"]
+        room.process_message({"type": "placement_choice", "choice": "auto"}, "player_1")
+        self.assertEqual(board.ships_left, 2)
+        room.process_message({"type": "placement_choice", "choice": "auto"}, "player_1")
+        self.assertEqual(board.ships_left, 2)
+        self.assertEqual(connections["player_1"].errors(), ["Sua frota já está posicionada."])
+
+    def test_auto_after_a_manual_ship_is_rejected(self):
+        room, connections = setup_room()
+        place(room, "player_1", 0, 0, 3)
+        room.process_message({"type": "placement_choice", "choice": "auto"}, "player_1")
+        board = room.game.players["player_1"]["board"]
+        self.assertEqual(board.ships_left, 1)
+        self.assertEqual(room.game.players["player_1"]["ships_to_place"], [2])
+        self.assertEqual(
+            connections["player_1"].errors(),
+            ["O posicionamento automático só vale com o tabuleiro vazio."],
+        )
+
+    def test_ship_not_in_the_fleet_is_not_placed(self):
+        room, connections = setup_room()
+        place(room, "player_1", 0, 0, 4)
+        place(room, "player_1", 2, 0, 3)
+        place(room, "player_1", 4, 0, 3)
+        board = room.game.players["player_1"]["board"]
+        self.assertEqual(board.placements, [(2, 0, 3, "H")])
+        self.assertEqual(
+            connections["player_1"].errors(), ["Não há navio desse tamanho para posicionar."] * 2
+        )
+
+    def test_manual_placement_after_ready_is_rejected(self):
+        room, connections = setup_room()
+        place(room, "player_1", 0, 0, 3)
+        place(room, "player_1", 2, 0, 2)
+        self.assertTrue(room.game.players["player_1"]["ready"])
+        place(room, "player_1", 4, 0, 2)
+        self.assertEqual(room.game.players["player_1"]["board"].ships_left, 2)
+        self.assertEqual(connections["player_1"].errors(), ["Sua frota já está posicionada."])
+
+    def test_game_starts_when_both_fleets_are_placed(self):
+        room, _ = setup_room()
+        place(room, "player_1", 0, 0, 3)
+        place(room, "player_1", 2, 0, 2)
+        room.process_message({"type": "placement_choice", "choice": "auto"}, "player_2")
+        self.assertEqual(room.game.game_phase, "playing")
+
+
+class SpectatorTest(unittest.TestCase):
+    def test_final_boards_survive_the_winner_leaving(self):
+        room, connections = setup_room()
+        for player_id in ("player_1", "player_2"):
+            place(room, player_id, 0, 0, 3)
+            place(room, player_id, 2, 0, 2)
+        for row, col in ((0, 0), (0, 1), (0, 2), (2, 0), (2, 1)):
+            room.process_message({"type": "shot", "row": row, "col": col}, "player_1")
+        self.assertTrue(room.game.game_over)
+
+        room.connection_lost("player_1", connections["player_1"])
+        spectator = FakeConnection()
+        room.add_spectator(spectator)
+        state = spectator.messages[-1]["state"]
+        self.assertEqual(state["players"], ["player_1", "player_2"])
+        hits = sum(row.count("X") for row in state["boards"]["player_2"])
+        self.assertEqual(hits, 5)
+        # O perdedor não recebe um "oponente desconectou" depois do fim.
+        self.assertEqual(connections["player_2"].errors(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from ai import placement_density
+from simulation import BatchSimulation
+
+
+class BatchSimulationTest(unittest.TestCase):
+    def test_ship_ids_for_large_fleets(self):
+        # Mais navios do que cabe num int8.
+        simulation = BatchSimulation(40, [2] * 130, seed=1)
+        fleets = simulation.place_fleets(3)
+        self.assertEqual(fleets.max(), 130)
+        for fleet in fleets:
+            self.assertEqual(sorted(np.bincount(fleet.ravel())[1:]), [2] * 130)
+        self.assertEqual(simulation.run(4).games, 4)
+
+    def test_edge_fallback_keeps_ships_on_the_edge(self):
+        # max_rounds=0: todas as frotas vêm da busca do fallback.
+        simulation = BatchSimulation(10, [5, 4, 3, 3, 2], seed=3)
+        fleets = simulation.place_fleets(20, layout="edge", max_rounds=0)
+        for fleet in fleets:
+            for ship in range(1, 6):
+                cells = fleet == ship
+                self.assertEqual(cells.sum(), simulation.ships[ship - 1])
+                self.assertTrue(cells[[0, -1], :].any() or cells[:, [0, -1]].any())
+
+    def test_edge_layout_that_does_not_fit_is_an_error(self):
+        # 3x3: nove navios de 1 casa só cabem usando o centro.
+        simulation = BatchSimulation(3, [1] * 9, seed=4)
+        self.assertEqual(simulation.place_fleets(2, max_rounds=0).min(), 1)
+        with self.assertRaises(ValueError):
+            simulation.place_fleets(2, layout="edge", max_rounds=0)
+
+    def test_sunk_lengths_leave_the_density_count(self):
+        rng = np.random.default_rng(4)
+        hits = rng.random((6, 8, 8)) < 0.1
+        misses = ~hits & (rng.random((6, 8, 8)) < 0.2)
+        afloat = np.array([[True, False, True]] * 6)
+        self.assertTrue(
+            (placement_density(hits, misses, [2, 3, 4], afloat)
+             == placement_density(hits, misses, [2, 4])).all()
+        )
+
+    def test_sunk_ship_stops_pulling_shots(self):
+        # Dois acertos num navio de 2: sem o aviso de naufrágio o modo alvo
+        # atira ao lado deles; afundado, as casas bloqueiam como erros.
+        simulation = BatchSimulation(5, [2, 2], seed=2)
+        hits = np.zeros((1, 5, 5), dtype=bool)
+        hits[0, 0, 0:2] = True
+        misses = np.zeros_like(hits)
+        neighbours = {2, 5, 6}  # (0, 2), (1, 0) e (1, 1)
+        cell = simulation.choose_cells(
+            "density", hits, misses, np.zeros_like(hits), np.array([[True, True]])
+        )[0]
+        self.assertIn(cell, neighbours)
+        counts = np.zeros(25, dtype=int)
+        for _ in range(200):
+            counts[simulation.choose_cells(
+                "density", hits, misses, hits, np.array([[False, True]])
+            )[0]] += 1
+        self.assertLess(counts[list(neighbours)].sum(), 200)
+
+    def test_density_beats_random(self):
+        simulation = BatchSimulation(strategies=("density", "random"), seed=3)
+        self.assertGreater(simulation.run(200).summary()["player_1_win_rate"], 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+from game import BattleshipGame
+from simulation import LAYOUTS, STRATEGIES, BatchSimulation
+
+# Torneio todos contra todos entre bots, sem rede. Cada participante é uma
+# estratégia de tiro com uma disposição de frota ("density/edge"), e cada
+# confronto é jogado em lotes pela BatchSimulation, metade com cada um como
+# player_1. Os lotes vão para um pool de processos em blocos (chunksize), e a
+# semente de cada lote deriva só de (--seed, confronto, lado, lote): o
+# resultado não depende de qual worker jogou o quê, e a mesma linha de comando
+# reproduz o torneio. Cada lote devolve só contadores, somados assim que chegam.
+
+Z_95 = 1.96
+
+# Estado de cada processo do pool, preenchido por init_worker.
+worker_config = {}
+worker_simulations = {}  # (estratégias, disposições) -> BatchSimulation
+
+
+def parse_entrant(name):
+    strategy, _, layout = name.partition("/")
+    layout = layout or "uniform"
+    if strategy not in STRATEGIES or layout not in LAYOUTS:
+        raise ValueError(f"Participante inválido: {name}")
+    return strategy, layout
+
+
+def pairings(count):
+    # Confrontos como pares de índices de participantes, numa ordem fixa.
+    return list(itertools.combinations(range(count), 2))
+
+
+def init_worker(board_size, ships, entrants, seed):
+    worker_config.update(
+        board_size=board_size, ships=ships, entrants=entrants, seed=seed,
+        pairings=pairings(len(entrants)),
+    )
+    worker_simulations.clear()
+
+
+def play_chunk(task):
+    # Joga `count` partidas de um confronto e devolve, por lado (player_1,
+    # player_2): vitórias, soma e soma dos quadrados dos tiros até vencer.
+    pairing, swapped, chunk, count = task
+    entrants = worker_config["entrants"]
+    first, second = worker_config["pairings"][pairing]
+    if swapped:
+        first, second = second, first
+    seats = (parse_entrant(entrants[first]), parse_entrant(entrants[second]))
+    key = tuple(zip(*seats))
+    simulation = worker_simulations.get(key)
+    if simulation is None:
+        simulation = worker_simulations[key] = BatchSimulation(
+            worker_config["board_size"], worker_config["ships"], key[0], layouts=key[1]
+        )
+    simulation.rng = np.random.default_rng([worker_config["seed"], pairing, swapped, chunk])
+
+    winners, shots, _, _ = simulation.run_batch(count)
+    winner_shots = shots[np.arange(count), winners]
+    wins = np.bincount(winners, minlength=2)
+    shots_sum = np.bincount(winners, weights=winner_shots, minlength=2)
+    shots_sq = np.bincount(winners, weights=winner_shots.astype(np.float64) ** 2, minlength=2)
+    return pairing, swapped, count, wins.tolist(), shots_sum.tolist(), shots_sq.tolist()
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    if not trials:
+        return 0.0, 0.0
+    rate = successes / trials
+    center = (rate + z * z / (2 * trials)) / (1 + z * z / trials)
+    margin = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    margin /= 1 + z * z / trials
+    return center - margin, center + margin
+
+
+class EntrantStats:
+    def __init__(self, name):
+        self.name = name
+        self.games = 0
+        self.wins = 0
+        self.shots = 0.0  # Tiros até vencer, somados sobre as vitórias
+        self.shots_sq = 0.0
+
+    def add(self, games, wins, shots, shots_sq):
+        self.games += games
+        self.wins += wins
+        self.shots += shots
+        self.shots_sq += shots_sq
+
+    def win_rate(self):
+        return self.wins / max(self.games, 1)
+
+    def mean_shots(self):
+        return self.shots / max(self.wins, 1)
+
+    def shots_margin(self, z=Z_95):
+        # Meia largura do intervalo de confiança da média (aproximação normal).
+        if self.wins < 2:
+            return 0.0
+        variance = (self.shots_sq - self.shots * self.shots / self.wins) / (self.wins - 1)
+        return z * math.sqrt(max(variance, 0.0) / self.wins)
+
+
+class Tournament:
+    def __init__(self, entrants, board_size=10, ships=None, games=10000, batch_size=5000, seed=0):
+        for name in entrants:
+            parse_entrant(name)
+        if len(entrants) < 2:
+            raise ValueError("O torneio precisa de pelo menos dois participantes.")
+        self.entrants = list(entrants)
+        self.board_size = board_size
+        self.ships = BattleshipGame(board_size, ships).ships
+        self.games = games  # Partidas por confronto
+        self.batch_size = batch_size
+        self.seed = seed
+        self.pairings = pairings(len(self.entrants))
+        self.stats = {name: EntrantStats(name) for name in self.entrants}
+        self.head_to_head = {}  # (vencedor, perdedor) -> vitórias
+        self.played = 0
+
+    def tasks(self):
+        for pairing in range(len(self.pairings)):
+            for swapped in (0, 1):
+                # Metade das partidas com cada participante começando.
+                total = self.games // 2 + (self.games % 2 if not swapped else 0)
+                for chunk, start in enumerate(range(0, total, self.batch_size)):
+                    yield pairing, swapped, chunk, min(self.batch_size, total - start)
+
+    def add_result(self, result):
+        pairing, swapped, count, wins, shots_sum, shots_sq = result
+        first, second = self.pairings[pairing]
+        seats = (first, second) if not swapped else (second, first)
+        for seat, entrant in enumerate(seats):
+            name = self.entrants[entrant]
+            opponent = self.entrants[seats[1 - seat]]
+            self.stats[name].add(count, wins[seat], shots_sum[seat], shots_sq[seat])
+            key = (name, opponent)
+            self.head_to_head[key] = self.head_to_head.get(key, 0) + wins[seat]
+        self.played += count
+
+    def run(self, workers=None, chunksize=4, progress=None):
+        tasks = list(self.tasks())
+        args = (self.board_size, self.ships, self.entrants, self.seed)
+        if workers == 1:
+            init_worker(*args)
+            results = map(play_chunk, tasks)
+            self.collect(results, progress)
+        else:
+            with multiprocessing.Pool(workers, initializer=init_worker, initargs=args) as pool:
+                self.collect(pool.imap_unordered(play_chunk, tasks, chunksize), progress)
+        return self
+
+    def collect(self, results, progress):
+        for result in results:
+            self.add_result(result)
+            if progress:
+                progress(self)
+
+    def ranking(self):
+        return sorted(self.stats.values(), key=lambda stats: stats.win_rate(), reverse=True)
+
+
+def print_report(tournament, elapsed):
+    print(f"Partidas: {tournament.played} em {elapsed:.1f}s ({tournament.played / elapsed:.0f}/s)")
+    print(f"{'participante':<18} {'vitórias':>9} {'IC 95%':>15} {'tiros p/ vencer':>20}")
+    for stats in tournament.ranking():
+        low, high = wilson_interval(stats.wins, stats.games)
+        print(
+            f"{stats.name:<18} {stats.win_rate():>9.1%} {f'{low:.1%}–{high:.1%}':>15} "
+            f"{f'{stats.mean_shots():.2f} ± {stats.shots_margin():.2f}':>20}"
+        )
+    print("\nConfrontos (vitórias da linha contra a coluna):")
+    names = tournament.entrants
+    print(" " * 18 + "".join(f"{name:>18}" for name in names))
+    for name in names:
+        cells = []
+        for opponent in names:
+            if name == opponent:
+                cells.append(f"{'-':>18}")
+                continue
+            wins = tournament.head_to_head.get((name, opponent), 0)
+            games = wins + tournament.head_to_head.get((opponent, name), 0)
+            cells.append(f"{wins / max(games, 1):>18.1%}")
+        print(f"{name:<18}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    default_entrants = [f"{strategy}/{layout}" for strategy in STRATEGIES for layout in LAYOUTS]
+    parser = argparse.ArgumentParser(description="Torneio todos contra todos entre bots")
+    parser.add_argument(
+        "entrants", nargs="*", default=default_entrants,
+        help="participantes estratégia/disposição (padrão: todas as combinações)",
+    )
+    parser.add_argument("--games", type=int, default=10000, help="partidas por confronto")
+    parser.add_argument("--batch-size", type=int, default=5000, help="partidas por lote")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=4, help="lotes por envio a um worker")
+    parser.add_argument("--board-size", type=int, default=10)
+    parser.add_argument("--ships", type=int, nargs="+", default=None, help="tamanhos dos navios")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        tournament = Tournament(
+            args.entrants, args.board_size, args.ships, args.games, args.batch_size, args.seed
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    start = time.perf_counter()
+    last_report = [start]
+    total = args.games * len(tournament.pairings)
+
+    def progress(tournament):
+        now = time.perf_counter()
+        if now - last_report[0] >= 5:
+            last_report[0] = now
+            print(f"... {tournament.played}/{total} partidas", flush=True)
+
+    tournament.run(args.workers, args.chunksize, progress)
+    print_report(tournament, time.perf_counter() - start)